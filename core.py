@@ -0,0 +1,4536 @@
+"""Shared setup and helpers for The Brain App, imported once per process"""
+import streamlit as st
+import re
+import bcrypt
+import firebase_admin
+from firebase_admin import credentials, firestore, auth
+from google.api_core import exceptions as google_exceptions
+import smtplib
+from email.message import EmailMessage
+import time
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+import pickle
+from datetime import datetime, timedelta, date
+import json
+from fpdf import FPDF
+import base64
+from io import BytesIO
+import traceback
+import secrets
+import hashlib
+import socket
+import sqlite3
+import zlib
+from urllib.parse import urlparse
+import hmac
+import os
+import sys
+import random
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Tracing
+@st.cache_resource
+def get_tracing_config():
+    tracing_config = st.secrets.get("tracing", {})
+    return {
+        'enabled': str(tracing_config.get("ENABLED", "false")).lower() == "true",
+        'sample_rate': float(tracing_config.get("SAMPLE_RATE", 0.1)),
+        'export_path': tracing_config.get("EXPORT_PATH", "traces/spans.jsonl"),
+        'max_bytes': int(tracing_config.get("MAX_BYTES", 50 * 1024 * 1024)),
+        'service_name': tracing_config.get("SERVICE_NAME", "brain-app")
+    }
+
+class SpanExporter:
+    """Append finished traces as OTLP/JSON lines to a local file.
+
+    Once the file reaches max_bytes it is moved to <path>.1, replacing the
+    previous one, so at most two files are kept.
+    """
+    def __init__(self, path, service_name, max_bytes):
+        self.path = path
+        self.service_name = service_name
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": "brain-app.rerun"}, "spans": spans}]
+            }]
+        }
+        line = json.dumps(payload, default=str)
+        try:
+            with self.lock:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) + 1 > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            pass
+
+@st.cache_resource
+def get_span_exporter():
+    config = get_tracing_config()
+    return SpanExporter(config['export_path'], config['service_name'], config['max_bytes'])
+
+def otlp_attributes(attributes):
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            result.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            result.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            result.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            result.append({"key": key, "value": {"stringValue": str(value)}})
+    return result
+
+def get_session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else ""
+    except Exception as e:
+        return ""
+
+class RerunTrace:
+    """Spans collected during a single script rerun"""
+    def __init__(self, sampled):
+        self.trace_id = secrets.token_hex(16)
+        self.root_span_id = secrets.token_hex(8)
+        self.sampled = sampled
+        self.thread_id = threading.get_ident()
+        self.session_id = get_session_id()
+        self.start_ns = time.time_ns()
+        self.stack = [self.root_span_id]
+        self.spans = []
+
+def start_rerun_trace():
+    config = get_tracing_config()
+    sampled = config['enabled'] and random.random() < config['sample_rate']
+    return RerunTrace(sampled)
+
+@contextmanager
+def trace_span(name, **attributes):
+    trace = getattr(rerun_context, 'trace', None)
+    if trace is None or not trace.sampled or trace.thread_id != threading.get_ident():
+        yield
+        return
+    span_id = secrets.token_hex(8)
+    parent_span_id = trace.stack[-1]
+    trace.stack.append(span_id)
+    start_ns = time.time_ns()
+    status = {"code": 1}
+    try:
+        yield
+    except Exception as e:
+        status = {"code": 2, "message": str(e)}
+        raise
+    finally:
+        trace.stack.pop()
+        trace.spans.append({
+            "traceId": trace.trace_id,
+            "spanId": span_id,
+            "parentSpanId": parent_span_id,
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(time.time_ns()),
+            "attributes": attributes,
+            "status": status
+        })
+
+def finish_rerun_trace(trace):
+    if trace is None or not trace.sampled:
+        return
+    try:
+        user = st.session_state.get('user') or {}
+        common = {
+            "session.id": trace.session_id,
+            "user.id": user.get('username', ''),
+            "app.page": st.session_state.get('page', '')
+        }
+        spans = [{
+            "traceId": trace.trace_id,
+            "spanId": trace.root_span_id,
+            "parentSpanId": "",
+            "name": "rerun",
+            "kind": 2,
+            "startTimeUnixNano": str(trace.start_ns),
+            "endTimeUnixNano": str(time.time_ns()),
+            "attributes": {},
+            "status": {"code": 1}
+        }] + trace.spans
+        for span in spans:
+            span["attributes"] = otlp_attributes({**common, **span["attributes"]})
+        get_span_exporter().export(spans)
+    except Exception as e:
+        pass
+
+# State of the rerun running on the current thread; app.py sets the trace each rerun
+rerun_context = threading.local()
+
+# Profiling
+@st.cache_resource
+def get_profiling_config():
+    profiling_config = st.secrets.get("profiling", {})
+    return {
+        'query_key': profiling_config.get("QUERY_KEY", ""),
+        'default_reruns': int(profiling_config.get("DEFAULT_RERUNS", 5)),
+        'max_reruns': int(profiling_config.get("MAX_RERUNS", 20)),
+        'interval': float(profiling_config.get("INTERVAL_MS", 5)) / 1000,
+        'max_samples': int(profiling_config.get("MAX_SAMPLES", 5000)),
+        'output_dir': profiling_config.get("OUTPUT_DIR", "profiles")
+    }
+
+class SamplingProfiler:
+    """Sample the call stack of a single script thread into collapsed stacks"""
+    def __init__(self, thread_id, interval, max_samples):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_samples = max_samples
+        self.samples = 0
+        self.stacks = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="brain-app-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval) and self.samples < self.max_samples:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+def arm_profiler_from_query():
+    try:
+        config = get_profiling_config()
+        key = st.query_params.get("profile")
+        if not config['query_key'] or not key:
+            return
+        if secrets.compare_digest(key, config['query_key']):
+            reruns = int(st.query_params.get("profile_reruns", config['default_reruns']))
+            st.session_state.profile_reruns_remaining = max(0, min(reruns, config['max_reruns']))
+        del st.query_params["profile"]
+        if "profile_reruns" in st.query_params:
+            del st.query_params["profile_reruns"]
+    except Exception as e:
+        pass
+
+def start_rerun_profiler():
+    if st.session_state.get('profile_reruns_remaining', 0) <= 0:
+        return None
+    config = get_profiling_config()
+    profiler = SamplingProfiler(threading.get_ident(), config['interval'], config['max_samples'])
+    profiler.start()
+    return profiler
+
+def finish_rerun_profiler(profiler, page):
+    if profiler is None:
+        return
+    try:
+        profiler.stop()
+        st.session_state.profile_reruns_remaining = max(0, st.session_state.get('profile_reruns_remaining', 1) - 1)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        profiler.write(os.path.join(get_profiling_config()['output_dir'], f"{page}_{timestamp}.folded"))
+    except Exception as e:
+        pass
+
+# Session memory accounting
+@st.cache_resource
+def get_session_memory_config():
+    memory_config = st.secrets.get("session_memory", {})
+    return {
+        'idle_seconds': float(memory_config.get("IDLE_SECONDS", 900)),
+        'max_total_bytes': float(memory_config.get("MAX_TOTAL_MB", 256)) * 1024 * 1024,
+        'sweep_interval': float(memory_config.get("SWEEP_INTERVAL_SECONDS", 60))
+    }
+
+# Session state keys that can be dropped from idle sessions and reloaded on demand; prediction_results
+# is kept because nothing can rebuild it
+EVICTABLE_SESSION_KEYS = ['challenge_data', 'user_profile']
+
+def estimate_size(obj, seen=None):
+    """Approximate deep size of an object in bytes"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += estimate_size(vars(obj), seen)
+    elif hasattr(type(obj), '__slots__'):
+        size += sum(estimate_size(getattr(obj, slot), seen) for slot in type(obj).__slots__ if hasattr(obj, slot))
+    return size
+
+def session_state_sizes():
+    sizes = {}
+    for key in list(st.session_state.keys()):
+        try:
+            sizes[key] = estimate_size(st.session_state[key])
+        except Exception as e:
+            sizes[key] = 0
+    return sizes
+
+@st.cache_resource
+def get_runtime_session_manager():
+    """Streamlit's session manager, or None when this version does not expose it.
+
+    It is a private API; idle session eviction and live document pushes are
+    switched off without it and the admin panel says so.
+    """
+    try:
+        from streamlit.runtime import Runtime
+        manager = Runtime.instance()._session_mgr
+    except Exception as e:
+        return None
+    if not all(callable(getattr(manager, name, None)) for name in ('get_session_info', 'get_active_session_info')):
+        return None
+    return manager
+
+def session_exists(session_id):
+    """Whether the runtime still holds this session (connected or not); None without a session manager to ask"""
+    manager = get_runtime_session_manager()
+    if manager is None:
+        return None
+    return manager.get_session_info(session_id) is not None
+
+class SessionMemoryRegistry:
+    """Process-wide view of session_state memory with idle-session eviction"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.last_sweep = time.time()
+        self.evictions = 0
+
+    def begin_rerun(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return []
+            entry['running'] += 1
+            evicted_keys = entry['evicted_keys']
+            entry['evicted_keys'] = []
+            return evicted_keys
+
+    def finish_rerun(self, session_id, username, key_sizes, objects):
+        with self.lock:
+            self.sessions[session_id] = {
+                'username': username,
+                'last_seen': time.time(),
+                'running': 0,
+                'key_sizes': key_sizes,
+                'total_bytes': sum(key_sizes.values()),
+                'objects': objects,
+                'evicted_keys': []
+            }
+
+    def finish_fragment(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return
+            entry['running'] = max(entry['running'] - 1, 0)
+            entry['last_seen'] = time.time()
+
+    def evict(self, entry):
+        evicted_keys = []
+        for key, obj in entry['objects'].items():
+            if obj:
+                obj.clear()
+                evicted_keys.append(key)
+                entry['total_bytes'] -= entry['key_sizes'].get(key, 0)
+                entry['key_sizes'][key] = 0
+        entry['objects'] = {}
+        entry['evicted_keys'] = evicted_keys
+        if evicted_keys:
+            self.evictions += 1
+
+    def sweep(self, idle_seconds, max_total_bytes):
+        with self.lock:
+            now = time.time()
+            self.last_sweep = now
+            for session_id in list(self.sessions):
+                if session_exists(session_id) is False:
+                    del self.sessions[session_id]
+            idle = sorted(
+                (entry for entry in self.sessions.values() if not entry['running'] and entry['objects']),
+                key=lambda entry: entry['last_seen']
+            )
+            total_bytes = sum(entry['total_bytes'] for entry in self.sessions.values())
+            for entry in idle:
+                if now - entry['last_seen'] < idle_seconds and total_bytes <= max_total_bytes:
+                    break
+                before = entry['total_bytes']
+                self.evict(entry)
+                total_bytes -= before - entry['total_bytes']
+
+    def snapshot(self):
+        with self.lock:
+            now = time.time()
+            return [{
+                'Session': session_id[:8],
+                'User': entry['username'] or '-',
+                'Idle (s)': round(now - entry['last_seen']),
+                'Total (KB)': round(entry['total_bytes'] / 1024, 1),
+                'Evicted': ", ".join(entry['evicted_keys'])
+            } for session_id, entry in self.sessions.items() if session_exists(session_id) is not False]
+
+@st.cache_resource
+def get_session_memory_registry():
+    return SessionMemoryRegistry()
+
+def begin_session_memory_tracking():
+    try:
+        return get_session_memory_registry().begin_rerun(get_session_id())
+    except Exception as e:
+        return []
+
+def finish_session_memory_tracking():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return
+        user = st.session_state.get('user') or {}
+        objects = {}
+        for key in EVICTABLE_SESSION_KEYS:
+            value = st.session_state.get(key)
+            if isinstance(value, dict):
+                objects[key] = value
+        registry = get_session_memory_registry()
+        registry.finish_rerun(ctx.session_id, user.get('username'), session_state_sizes(), objects)
+        config = get_session_memory_config()
+        if get_runtime_session_manager() is not None and time.time() - registry.last_sweep >= config['sweep_interval']:
+            registry.sweep(config['idle_seconds'], config['max_total_bytes'])
+    except Exception as e:
+        pass
+
+def reload_evicted_session_data(evicted_keys):
+    """Mark data dropped from this session while it was idle for a lazy reload"""
+    for key in evicted_keys or ():
+        st.session_state.loaded_user_data.discard(key)
+
+@contextmanager
+def fragment_rerun():
+    """Fragment reruns skip app.py: reload evicted data and keep the session running until the fragment ends"""
+    session_id = get_session_id()
+    reload_evicted_session_data(begin_session_memory_tracking())
+    load_user_data()
+    try:
+        yield
+    finally:
+        try:
+            get_session_memory_registry().finish_fragment(session_id)
+        except Exception as e:
+            pass
+
+# Unit of work
+def merge_write_fields(target, fields, dotted=False):
+    """Fold fields into target the way Firestore applies them (dotted paths only for updates)"""
+    for key, value in fields.items():
+        path = key.split('.') if dotted else [key]
+        node = target
+        for part in path[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        if isinstance(value, dict) and isinstance(node.get(path[-1]), dict) and not dotted:
+            merge_write_fields(node[path[-1]], value)
+        else:
+            node[path[-1]] = value
+
+def plain_write_fields(fields):
+    """True when no field is a dotted path or a map, so update and merge-set write the same thing"""
+    return all('.' not in key and not isinstance(value, dict) for key, value in fields.items())
+
+class UnitOfWork:
+    """Writes collected during one handler and committed atomically in a single batch.
+
+    Writes to the same document are folded together when that is
+    equivalent, and the batch pays one round-trip instead of one per write.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.writes = []
+        self.latest = {}
+        self.requested = 0
+
+    def add(self, doc_ref, kind, data):
+        self.latest[doc_ref.path] = len(self.writes)
+        self.writes.append((doc_ref, kind, dict(data)))
+
+    def set(self, doc_ref, data, merge=False):
+        self.requested += 1
+        index = self.latest.get(doc_ref.path)
+        if index is not None and not merge:
+            self.writes[index] = (doc_ref, 'set', dict(data))
+        elif index is not None and self.writes[index][1] != 'update':
+            merge_write_fields(self.writes[index][2], data)
+        else:
+            self.add(doc_ref, 'merge' if merge else 'set', data)
+
+    def update(self, doc_ref, data):
+        self.requested += 1
+        index = self.latest.get(doc_ref.path)
+        if index is None:
+            self.add(doc_ref, 'update', data)
+            return
+        _, kind, queued = self.writes[index]
+        if kind == 'set':
+            # The whole document is known, so the update can be applied to it
+            merge_write_fields(queued, data, dotted=True)
+        elif plain_write_fields(data) and (kind == 'merge' or plain_write_fields(queued)):
+            queued.update(data)
+        else:
+            # An update replaces maps that a merge would combine, and dotted
+            # paths can clash with queued fields, so it stays a separate write
+            self.add(doc_ref, 'update', data)
+
+    def commit(self):
+        """Commit all collected writes and return the number of round-trips saved"""
+        if not self.writes:
+            return 0
+        batch = db.batch()
+        for doc_ref, kind, data in self.writes:
+            if kind == 'update':
+                batch.update(doc_ref, data)
+            else:
+                batch.set(doc_ref, data, merge=(kind == 'merge'))
+        saved = self.requested - 1
+        with trace_span("firestore.batch_commit", unit=self.name, writes=len(self.writes), round_trips_saved=saved):
+            batch.commit()
+        get_unit_of_work_stats().record(self.name, self.requested, saved)
+        self.writes = []
+        self.latest = {}
+        return saved
+
+class UnitOfWorkStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.units = {}
+
+    def record(self, name, writes, saved):
+        with self.lock:
+            stats = self.units.setdefault(name, {'Commits': 0, 'Writes': 0, 'Round-trips Saved': 0})
+            stats['Commits'] += 1
+            stats['Writes'] += writes
+            stats['Round-trips Saved'] += saved
+
+    def snapshot(self):
+        with self.lock:
+            return [{'Handler': name, **stats} for name, stats in sorted(self.units.items())]
+
+@st.cache_resource
+def get_unit_of_work_stats():
+    return UnitOfWorkStats()
+
+@contextmanager
+def unit_of_work(name):
+    """Collect writes made in the block and commit them together if it completes"""
+    unit = UnitOfWork(name)
+    yield unit
+    unit.commit()
+
+# Hashing passwords 
+def hash_password(password):
+    try:
+        with trace_span("bcrypt.hashpw"):
+            return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    except Exception as e:
+        st.error("Password hashing failed")
+        return None
+
+def check_password(password, hashed):
+    try:
+        with trace_span("bcrypt.checkpw"):
+            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except Exception as e:
+        return False
+
+def generate_reset_token():
+    """Generate a secure random token for password reset"""
+    return secrets.token_urlsafe(32)
+
+def store_reset_token(username, token):
+    """Store reset token in Firebase with expiration"""
+    try:
+        expires_at = datetime.now() + timedelta(hours=24)
+        
+        reset_data = {
+            'token': token,
+            'username': username,
+            'expires_at': expires_at,
+            'created_at': datetime.now(),
+            'used': False
+        }
+        with trace_span("firestore.set", collection="password_resets"):
+            db.collection('password_resets').document(token).set(reset_data)
+        return True
+    except Exception as e:
+        st.error(f"Error storing token: {str(e)}")
+        return False
+
+def validate_reset_token(token):
+    """Validate reset token and return username if valid"""
+    try:
+        doc_ref = db.collection('password_resets').document(token)
+        with trace_span("firestore.get", collection="password_resets"):
+            doc = doc_ref.get()
+        
+        if not doc.exists:
+            return None
+            
+        reset_data = doc.to_dict()
+        
+        if reset_data.get('used', False):
+            return None
+            
+        expires_at = reset_data.get('expires_at')
+        if not expires_at:
+            return None
+            
+        if hasattr(expires_at, 'timestamp'):
+            expires_at = expires_at.replace(tzinfo=None)
+        
+        if expires_at < datetime.now():
+            return None
+            
+        return reset_data.get('username')
+        
+    except Exception as e:
+        return None
+
+def mark_token_used(token, unit=None):
+    """Mark reset token as used"""
+    try:
+        token_update = {
+            'used': True,
+            'used_at': datetime.now()
+        }
+        if unit is not None:
+            unit.update(db.collection('password_resets').document(token), token_update)
+            return True
+        with trace_span("firestore.update", collection="password_resets"):
+            db.collection('password_resets').document(token).update(token_update)
+        return True
+    except Exception as e:
+        return False
+
+def send_password_reset_email(to_email, reset_token):
+    try:
+        email_config = st.secrets.get("email", {})
+        email_address = email_config.get("EMAIL_ADDRESS", "")
+        email_password = email_config.get("EMAIL_PASSWORD", "")
+        
+        if not email_address or not email_password:
+            return True, "development", reset_token
+            
+        msg = EmailMessage()
+        msg['Subject'] = 'Your Brain App , Password Reset'
+        msg['From'] = email_address
+        msg['To'] = to_email
+        msg.set_content(f"""
+Hello,
+
+You requested a password reset for your Brain App account.
+
+Use this reset token to reset your password:
+
+{reset_token}
+
+You can enter this token on the password reset page.
+
+This token will expire in 24 hours.
+
+If you did not request this, please ignore this email.
+
+Best regards,
+The Brain App Team
+""")
+        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
+            smtp.login(email_address, email_password)
+            smtp.send_message(msg)
+        return True, "sent", reset_token
+    except Exception as e:
+        return False, f"Email service temporarily unavailable. Please try again later.", None
+
+def validate_password(password):
+    if len(password) < 7:
+        return False, "Password must be at least 7 characters long"
+    if not re.search(r"[A-Z]", password):
+        return False, "Password must contain at least one uppercase letter"
+    if not re.search(r"[a-z]", password):
+        return False, "Password must contain at least one lowercase letter"
+    if not re.search(r"[0-9]", password):
+        return False, "Password must contain at least one number"
+    return True, "Password is valid"
+
+def get_user_by_email(email):
+    try:
+        users_ref = db.collection('users')
+        with trace_span("firestore.query", collection="users"):
+            query = users_ref.where('email', '==', email).limit(1).get()
+        if query:
+            for doc in query:
+                return doc.id, doc.to_dict()
+        return None, None
+    except Exception as e:
+        return None, None
+
+def sanitize_input(text):
+    return re.sub(r'[<>"\']', '', text.strip())
+
+# Signed session tokens
+SESSION_QUERY_KEY = "session"
+LEGACY_LOGIN_QUERY_KEYS = ("username", "logged_in")
+
+def get_session_token_config():
+    session_config = st.secrets.get("session", {})
+    return {
+        'secret_key': str(session_config.get("SECRET_KEY", "")),
+        'ttl_hours': float(session_config.get("TTL_HOURS", 168))
+    }
+
+@st.cache_resource
+def get_session_signing_key():
+    """SECRET_KEY from secrets, else a random per-process key; the key is never written anywhere"""
+    configured = get_session_token_config()['secret_key']
+    if configured:
+        return configured.encode('utf-8')
+    return secrets.token_bytes(32)
+
+def persistent_login_enabled():
+    """Sessions in a shared store need SECRET_KEY; without it no tokens are issued"""
+    return bool(get_session_token_config()['secret_key']) or not get_session_store_config()['backend']
+
+def b64url_encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def b64url_decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def sign_session_payload(body):
+    return hmac.new(get_session_signing_key(), body.encode('ascii'), hashlib.sha256).digest()
+
+def issue_session_token(user):
+    """HMAC-signed token carrying the username, email, role and expiry"""
+    payload = {
+        'u': user['username'],
+        'm': user.get('email', ''),
+        'r': user.get('role', 'student'),
+        'x': int(time.time() + get_session_token_config()['ttl_hours'] * 3600)
+    }
+    body = b64url_encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    return f"{body}.{b64url_encode(sign_session_payload(body))}"
+
+def verify_session_token(token):
+    """Return the user for a valid, unexpired token without touching the datastore, else None"""
+    try:
+        body, signature = token.split('.')
+        if not hmac.compare_digest(b64url_decode(signature), sign_session_payload(body)):
+            return None
+        payload = json.loads(b64url_decode(body))
+        if payload['x'] < time.time():
+            return None
+        return {
+            "username": payload['u'],
+            "email": payload.get('m', ''),
+            "role": payload.get('r', 'student')
+        }
+    except Exception as e:
+        return None
+
+def set_persistent_login(user):
+    try:
+        for key in LEGACY_LOGIN_QUERY_KEYS:
+            if key in st.query_params:
+                del st.query_params[key]
+        if persistent_login_enabled():
+            st.query_params[SESSION_QUERY_KEY] = issue_session_token(user)
+    except Exception as e:
+        pass
+
+def clear_persistent_login():
+    try:
+        delete_external_session(st.query_params.get(SESSION_QUERY_KEY))
+        st.query_params.clear()
+    except Exception as e:
+        pass
+
+# External session store
+SESSION_STORE_KEYS = ('user_profile', 'challenge_data')
+SESSION_RECORD_FORMAT = 1
+
+def get_session_store_config():
+    store_config = st.secrets.get("session_store", {})
+    return {
+        'backend': str(store_config.get("BACKEND", "")).lower(),
+        'path': store_config.get("PATH", "sessions/sessions.db"),
+        'redis_url': store_config.get("REDIS_URL", "redis://localhost:6379/0"),
+        'ttl_seconds': float(store_config.get("TTL_HOURS", 168)) * 3600,
+        'purge_seconds': float(store_config.get("PURGE_SECONDS", 300))
+    }
+
+class SqliteSessionStore:
+    """Session records in a local SQLite file, shared by every process on the host"""
+    def __init__(self, path, purge_seconds):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.purge_seconds = purge_seconds
+        self.last_purge = 0
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl_seconds):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sessions (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl_seconds))
+            if now - self.last_purge >= self.purge_seconds:
+                self.conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+                self.last_purge = now
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def take_token(self, key, capacity, refill_rate):
+        """Take one token from a shared bucket; returns seconds to wait, 0 if taken"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT value FROM sessions WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+                tokens, updated = json.loads(row[0]) if row else (capacity, now)
+                tokens, wait = refill_bucket(tokens, updated, now, capacity, refill_rate)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sessions (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps([tokens, now]), now + capacity / refill_rate)
+                )
+                self.conn.execute("COMMIT")
+            except Exception as e:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+class RedisSessionStore:
+    """Session records on any server speaking the Redis protocol (RESP), expired by the server"""
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int(parsed.path.strip('/') or 0)
+        self.prefix = "brain-app:session:"
+        self.lock = threading.Lock()
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=5)
+        self.reader = self.sock.makefile('rb')
+        if self.password:
+            self.send('AUTH', self.password)
+        if self.database:
+            self.send('SELECT', self.database)
+
+    def send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return self.read_reply()
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Session store closed the connection")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body
+        if kind == b'-':
+            raise RuntimeError(body.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            return self.reader.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(body)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise RuntimeError(f"Unexpected reply from session store: {line!r}")
+
+    def command(self, *args):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self.connect()
+                    return self.send(*args)
+                except (OSError, ConnectionError) as e:
+                    self.close()
+                    if attempt:
+                        raise
+
+    def close(self):
+        try:
+            if self.sock is not None:
+                self.sock.close()
+        except Exception as e:
+            pass
+        self.sock = None
+        self.reader = None
+
+    def get(self, key):
+        return self.command('GET', self.prefix + key)
+
+    def set(self, key, value, ttl_seconds):
+        self.command('SET', self.prefix + key, value, 'PX', int(ttl_seconds * 1000))
+
+    def delete(self, key):
+        self.command('DEL', self.prefix + key)
+
+    def take_token(self, key, capacity, refill_rate):
+        """Take one token from a shared bucket atomically on the server; returns seconds to wait, 0 if taken"""
+        wait = self.command('EVAL', REDIS_TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, capacity, refill_rate, repr(time.time()))
+        return float(wait)
+
+@st.cache_resource
+def get_session_store():
+    """The configured external session store, or None to keep sessions in process only"""
+    config = get_session_store_config()
+    try:
+        if config['backend'] == "sqlite":
+            return SqliteSessionStore(config['path'], config['purge_seconds'])
+        if config['backend'] == "redis":
+            return RedisSessionStore(config['redis_url'])
+    except Exception as e:
+        pass
+    return None
+
+def session_store_key(token):
+    """Records are keyed by a hash of the token so the store never holds usable tokens"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+def encode_session_value(value):
+    if isinstance(value, datetime):
+        return {'$t': value.isoformat()}
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__} in a session record")
+
+def decode_session_value(value):
+    if len(value) == 1 and '$t' in value:
+        return datetime.fromisoformat(value['$t'])
+    return value
+
+def encode_session_record(record):
+    """Compact JSON, zlib-compressed behind a one-byte format version"""
+    body = json.dumps(record, separators=(',', ':'), default=encode_session_value).encode('utf-8')
+    return bytes([SESSION_RECORD_FORMAT]) + zlib.compress(body, 6)
+
+def decode_session_record(raw):
+    if not raw or raw[0] != SESSION_RECORD_FORMAT:
+        return None
+    return json.loads(zlib.decompress(raw[1:]), object_hook=decode_session_value)
+
+def restore_external_session(token, user):
+    """Apply the stored page and cached user data for a verified token; returns True on a hit"""
+    store = get_session_store()
+    if store is None:
+        return False
+    try:
+        record = decode_session_record(store.get(session_store_key(token)))
+        if not record or record['u'].get('username') != user['username']:
+            return False
+        st.session_state.page = record.get('p') or "life_vision"
+        for key, value in record.get('d', {}).items():
+            if key in SESSION_STORE_KEYS:
+                st.session_state[key] = value
+                st.session_state.loaded_user_data.add(key)
+        return True
+    except Exception as e:
+        return False
+
+def save_external_session():
+    """Write this session's record when it changed or half its TTL has passed"""
+    store = get_session_store()
+    if store is None or not st.session_state.get('user'):
+        return
+    try:
+        token = st.query_params.get(SESSION_QUERY_KEY)
+        if not token:
+            return
+        data = {}
+        for key in SESSION_STORE_KEYS:
+            if key in st.session_state.loaded_user_data and st.session_state.get(key):
+                value = st.session_state[key]
+                data[key] = serializable_challenge_data(value) if key == 'challenge_data' else value
+        raw = encode_session_record({'u': st.session_state.user, 'p': st.session_state.page, 'd': data})
+        digest = hashlib.sha256(raw).digest()
+        ttl_seconds = get_session_store_config()['ttl_seconds']
+        saved = st.session_state.get('session_store_saved')
+        if saved and saved[0] == digest and time.time() - saved[1] < ttl_seconds / 2:
+            return
+        with trace_span("session_store.set", bytes=len(raw)):
+            store.set(session_store_key(token), raw, ttl_seconds)
+        st.session_state.session_store_saved = (digest, time.time(), len(raw))
+    except Exception as e:
+        pass
+
+def delete_external_session(token):
+    store = get_session_store()
+    if store is None or not token:
+        return
+    try:
+        store.delete(session_store_key(token))
+    except Exception as e:
+        pass
+
+# Rate limiting
+# Burst size and refill period per operation as "tokens/seconds"; override in [rate_limits]
+RATE_LIMIT_DEFAULTS = {
+    'predict': "20/60",
+    'certificate': "5/300",
+    'signin': "10/300",
+    'password_reset': "3/900"
+}
+RATE_LIMIT_MESSAGES = {
+    'predict': "You're predicting too quickly.",
+    'certificate': "Your certificate has been regenerated too many times.",
+    'signin': "Too many sign-in attempts.",
+    'password_reset': "Too many password reset requests."
+}
+
+# Token bucket for the Redis session store, run atomically on the server.
+# Returns the seconds to wait as a string, "0" when a token was taken.
+REDIS_TOKEN_BUCKET_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+def get_rate_limit_config():
+    limit_config = st.secrets.get("rate_limits", {})
+    limits = {}
+    for operation, default in RATE_LIMIT_DEFAULTS.items():
+        tokens, seconds = str(limit_config.get(operation.upper(), default)).split("/")
+        limits[operation] = (float(tokens), float(tokens) / float(seconds))
+    return {
+        'enabled': str(limit_config.get("ENABLED", "true")).lower() == "true",
+        'shared': str(limit_config.get("SHARED", "false")).lower() == "true",
+        'trust_forwarded_for': str(limit_config.get("TRUST_FORWARDED_FOR", "false")).lower() == "true",
+        'max_buckets': int(limit_config.get("MAX_BUCKETS", 10000)),
+        'limits': limits
+    }
+
+def refill_bucket(tokens, updated, now, capacity, refill_rate):
+    """Refill a bucket up to now and take one token; returns (tokens left, seconds to wait)"""
+    tokens = min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / refill_rate
+
+class LocalTokenBuckets:
+    """In-process token buckets, dropping the least recently used past max_buckets"""
+    def __init__(self, max_buckets):
+        self.max_buckets = max_buckets
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def take_token(self, key, capacity, refill_rate):
+        now = time.time()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens, wait = refill_bucket(tokens, updated, now, capacity, refill_rate)
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return wait
+
+class RateLimitStats:
+    """Allowed and throttled requests per operation in this process"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.shared_errors = 0
+
+    def record(self, operation, throttled_by=None):
+        with self.lock:
+            stats = self.operations.setdefault(operation, {'allowed': 0, 'user': 0, 'ip': 0})
+            stats[throttled_by or 'allowed'] += 1
+
+    def record_shared_error(self):
+        with self.lock:
+            self.shared_errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            limits = get_rate_limit_config()['limits']
+            return [{
+                'Operation': operation,
+                'Limit': f"{limits[operation][0]:g} per {limits[operation][0] / limits[operation][1]:g}s",
+                'Allowed': stats['allowed'],
+                'Throttled (user)': stats['user'],
+                'Throttled (IP)': stats['ip']
+            } for operation, stats in sorted(self.operations.items())]
+
+@st.cache_resource
+def get_local_token_buckets():
+    return LocalTokenBuckets(get_rate_limit_config()['max_buckets'])
+
+@st.cache_resource
+def get_rate_limit_stats():
+    return RateLimitStats()
+
+def client_ip():
+    try:
+        if get_rate_limit_config()['trust_forwarded_for']:
+            forwarded = st.context.headers.get("X-Forwarded-For", "")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return st.context.ip_address or ""
+    except Exception as e:
+        return ""
+
+def take_rate_limit(operation, subject=None):
+    """Take a token from the operation's per-user and per-IP buckets; returns seconds to wait, 0 if allowed.
+
+    subject is the signed-in username, or the username/email being tried
+    before sign-in. Buckets live in this process unless SHARED is set and
+    an external session store is configured; if that store fails the local
+    buckets are used.
+    """
+    config = get_rate_limit_config()
+    if not config['enabled'] or operation not in config['limits']:
+        return 0
+    capacity, refill_rate = config['limits'][operation]
+    stats = get_rate_limit_stats()
+    buckets = get_local_token_buckets()
+    store = get_session_store() if config['shared'] else None
+    for dimension, value in (('user', subject), ('ip', client_ip())):
+        if not value:
+            continue
+        key = f"bucket:{operation}:{dimension}:{hashlib.sha256(str(value).lower().encode('utf-8')).hexdigest()[:24]}"
+        try:
+            wait = store.take_token(key, capacity, refill_rate) if store is not None else buckets.take_token(key, capacity, refill_rate)
+        except Exception as e:
+            stats.record_shared_error()
+            wait = buckets.take_token(key, capacity, refill_rate)
+        if wait > 0:
+            stats.record(operation, dimension)
+            return wait
+    stats.record(operation)
+    return 0
+
+def show_rate_limit_error(operation, wait):
+    st.error(f"⏳ {RATE_LIMIT_MESSAGES[operation]} Please try again in {max(1, int(np.ceil(wait)))} seconds.")
+
+class RateLimitExceeded(Exception):
+    def __init__(self, operation, wait):
+        super().__init__(operation)
+        self.operation = operation
+        self.wait = wait
+
+# Challenge Functions
+def get_stage_days(stage):
+    stage_days = {
+        "Silver (15 Days - Easy)": 15,
+        "Platinum (30 Days - Medium)": 30,
+        "Gold (60 Days - Hard)": 60
+    }
+    return stage_days.get(stage, 15)
+#All Stages 
+def get_stage_tasks(stage):
+    tasks = {
+        "Silver (15 Days - Easy)": [
+            "Do 2 hours of work in your field",
+            "No distractions today",
+            "Fill daily routine form"
+        ],
+        "Platinum (30 Days - Medium)": [
+            "Do 4 hours of work in your field",
+            "No distractions today",
+            "Do 30 pushups exercise",
+            "Drink 5 liters of water",
+            "Avoid junk food",
+            "Fill daily routine form"
+        ],
+        "Gold (60 Days - Hard)": [
+            "Do 6 hours of work in your field",
+            "No distractions today",
+            "Do 50 pushups exercise",
+            "Drink 5 liters of water",
+            "Avoid junk food",
+            "Avoid sugar",
+            "Wake up before 7 AM",
+            "Sleep before 11 PM",
+            "Fill daily routine form"
+        ]
+    }
+    return tasks.get(stage, [])
+
+# Compact challenge history
+CHALLENGE_STAGES = ["Silver (15 Days - Easy)", "Platinum (30 Days - Medium)", "Gold (60 Days - Hard)"]
+
+CHECKIN_PERFECT_DAY = 1
+CHECKIN_PENALTY_PAID = 2
+
+# Stored challenge_progress layout. Version 1 keeps full task names per day,
+# version 2 stores each day as {'m': task bitmask, 'x': missed tasks,
+# 's': savings, 'f': flag bits, 'e': tasks missing from the catalogue}.
+CHALLENGE_SCHEMA_VERSION = 2
+
+# Task catalogues are frozen once released so stored bitmasks stay decodable.
+# Add a new version here when get_stage_tasks changes.
+TASK_CATALOGUE_VERSION = 1
+TASK_CATALOGUES = {
+    1: {stage: tuple(get_stage_tasks(stage)) for stage in CHALLENGE_STAGES}
+}
+
+def get_task_catalogue(version, stage):
+    if version == TASK_CATALOGUE_VERSION and stage not in TASK_CATALOGUES[version]:
+        return tuple(get_stage_tasks(stage))
+    return TASK_CATALOGUES.get(version, {}).get(stage, ())
+
+def count_bits(masks):
+    masks = np.asarray(masks, dtype=np.uint32)
+    if masks.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.unpackbits(masks.view(np.uint8)).reshape(masks.size, 32).sum(axis=1)
+
+class ChallengeHistory:
+    """Column-oriented daily check-ins indexed by day ordinal.
+
+    Completed tasks are a bitmask against the versioned task catalogue for the
+    stage. Behaves like the daily_checkins dict for lookups so existing
+    callers keep working.
+    """
+    __slots__ = ('stage', 'catalogue_version', 'tasks', 'ordinals', 'task_masks', 'missed', 'savings', 'flags', 'extra_tasks')
+
+    def __init__(self, stage, ordinals=None, task_masks=None, missed=None, savings=None, flags=None, extra_tasks=None, catalogue_version=TASK_CATALOGUE_VERSION):
+        self.stage = stage
+        self.catalogue_version = catalogue_version
+        self.tasks = get_task_catalogue(catalogue_version, stage)
+        self.ordinals = np.asarray(ordinals if ordinals is not None else [], dtype=np.int32)
+        self.task_masks = np.asarray(task_masks if task_masks is not None else [], dtype=np.uint32)
+        self.missed = np.asarray(missed if missed is not None else [], dtype=np.int8)
+        self.savings = np.asarray(savings if savings is not None else [], dtype=np.float64)
+        self.flags = np.asarray(flags if flags is not None else [], dtype=np.uint8)
+        self.extra_tasks = extra_tasks or {}
+
+    @classmethod
+    def from_checkins(cls, daily_checkins, stage, catalogue_version=TASK_CATALOGUE_VERSION):
+        tasks = get_task_catalogue(catalogue_version, stage)
+        task_bits = {task: 1 << i for i, task in enumerate(tasks)}
+        rows = []
+        extra_tasks = {}
+        for day, checkin in daily_checkins.items():
+            ordinal = date.fromisoformat(day).toordinal()
+            mask = 0
+            for task in checkin.get('tasks_completed', []):
+                if task in task_bits:
+                    mask |= task_bits[task]
+                else:
+                    extra_tasks.setdefault(ordinal, []).append(task)
+            flags = 0
+            if checkin.get('perfect_day', False):
+                flags |= CHECKIN_PERFECT_DAY
+            if checkin.get('penalty_paid', False):
+                flags |= CHECKIN_PENALTY_PAID
+            rows.append((ordinal, mask, checkin.get('missed_tasks', 0), checkin.get('savings_added', 0), flags))
+        rows.sort()
+        columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+        return cls(stage, *columns, extra_tasks=extra_tasks, catalogue_version=catalogue_version)
+
+    @classmethod
+    def from_stored(cls, stored_checkins, stage, catalogue_version):
+        rows = []
+        extra_tasks = {}
+        for day, checkin in stored_checkins.items():
+            ordinal = date.fromisoformat(day).toordinal()
+            rows.append((ordinal, checkin.get('m', 0), checkin.get('x', 0), checkin.get('s', 0), checkin.get('f', 0)))
+            if checkin.get('e'):
+                extra_tasks[ordinal] = list(checkin['e'])
+        rows.sort()
+        columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+        return cls(stage, *columns, extra_tasks=extra_tasks, catalogue_version=catalogue_version)
+
+    def copy(self):
+        return ChallengeHistory(
+            self.stage, self.ordinals.copy(), self.task_masks.copy(), self.missed.copy(),
+            self.savings.copy(), self.flags.copy(), {day: list(tasks) for day, tasks in self.extra_tasks.items()},
+            catalogue_version=self.catalogue_version
+        )
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def __bool__(self):
+        return len(self.ordinals) > 0
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, day):
+        return self.index_of(day) is not None
+
+    def __getitem__(self, day):
+        index = self.index_of(day)
+        if index is None:
+            raise KeyError(day)
+        return self.checkin_at(index)
+
+    def __setitem__(self, day, checkin):
+        row = ChallengeHistory.from_checkins({day: checkin}, self.stage, self.catalogue_version)
+        ordinal = int(row.ordinals[0])
+        index = self.index_of(day)
+        if index is not None:
+            self.task_masks[index] = row.task_masks[0]
+            self.missed[index] = row.missed[0]
+            self.savings[index] = row.savings[0]
+            self.flags[index] = row.flags[0]
+        else:
+            index = int(np.searchsorted(self.ordinals, ordinal))
+            self.ordinals = np.insert(self.ordinals, index, ordinal)
+            self.task_masks = np.insert(self.task_masks, index, row.task_masks[0])
+            self.missed = np.insert(self.missed, index, row.missed[0])
+            self.savings = np.insert(self.savings, index, row.savings[0])
+            self.flags = np.insert(self.flags, index, row.flags[0])
+        self.extra_tasks.pop(ordinal, None)
+        if ordinal in row.extra_tasks:
+            self.extra_tasks[ordinal] = row.extra_tasks[ordinal]
+
+    def index_of(self, day):
+        try:
+            ordinal = date.fromisoformat(day).toordinal()
+        except (TypeError, ValueError):
+            return None
+        index = int(np.searchsorted(self.ordinals, ordinal))
+        if index < len(self.ordinals) and self.ordinals[index] == ordinal:
+            return index
+        return None
+
+    def get(self, day, default=None):
+        index = self.index_of(day)
+        return self.checkin_at(index) if index is not None else default
+
+    def keys(self):
+        return [date.fromordinal(int(ordinal)).strftime("%Y-%m-%d") for ordinal in self.ordinals]
+
+    def items(self):
+        return [(day, self.checkin_at(i)) for i, day in enumerate(self.keys())]
+
+    def checkin_at(self, index):
+        mask = int(self.task_masks[index])
+        flags = int(self.flags[index])
+        tasks_completed = [task for i, task in enumerate(self.tasks) if mask & (1 << i)]
+        tasks_completed += self.extra_tasks.get(int(self.ordinals[index]), [])
+        checkin = {
+            'tasks_completed': tasks_completed,
+            'missed_tasks': int(self.missed[index]),
+            'savings_added': float(self.savings[index]),
+            'perfect_day': bool(flags & CHECKIN_PERFECT_DAY)
+        }
+        if flags & CHECKIN_PENALTY_PAID:
+            checkin['penalty_paid'] = True
+        return checkin
+
+    def to_checkins(self):
+        return dict(self.items())
+
+    def to_stored(self):
+        stored = {}
+        for i, day in enumerate(self.keys()):
+            checkin = {
+                'm': int(self.task_masks[i]),
+                'x': int(self.missed[i]),
+                's': float(self.savings[i]),
+                'f': int(self.flags[i])
+            }
+            extra = self.extra_tasks.get(int(self.ordinals[i]))
+            if extra:
+                checkin['e'] = list(extra)
+            stored[day] = checkin
+        return stored
+
+    def task_bit(self, task):
+        return 1 << self.tasks.index(task) if task in self.tasks else 0
+
+    def completed_counts(self):
+        counts = count_bits(self.task_masks)
+        for ordinal, tasks in self.extra_tasks.items():
+            counts[np.searchsorted(self.ordinals, ordinal)] += len(tasks)
+        return counts
+
+    def completion_rates(self):
+        completed = self.completed_counts()
+        total = completed + self.missed
+        return np.divide(completed * 100.0, total, out=np.zeros(len(total)), where=total > 0)
+
+    def distraction_days(self):
+        bit = self.task_bit("No distractions today")
+        return ((self.task_masks & bit) == 0).astype(np.int64)
+
+    def perfect_days(self):
+        return ((self.flags & CHECKIN_PERFECT_DAY) != 0).astype(np.int64)
+
+    def penalty_days(self):
+        return ((self.flags & CHECKIN_PENALTY_PAID) != 0).astype(np.int64)
+
+    def cumulative_savings(self):
+        return np.cumsum(self.savings)
+
+    def streak_runs(self):
+        """Lengths of runs of consecutive check-in days, oldest first"""
+        if len(self.ordinals) == 0:
+            return np.zeros(0, dtype=np.int64)
+        breaks = np.flatnonzero(np.diff(self.ordinals) != 1) + 1
+        boundaries = np.concatenate(([0], breaks, [len(self.ordinals)]))
+        return np.diff(boundaries)
+
+def read_challenge_history(challenge_data):
+    """Decode daily_checkins from either stored schema version"""
+    daily_checkins = challenge_data.get('daily_checkins') or {}
+    # Histories kept in session state can outlive a reload of this module,
+    # so they are matched by interface, not class
+    if hasattr(daily_checkins, 'to_stored'):
+        return daily_checkins
+    if challenge_data.get('schema_version', 1) >= 2:
+        return ChallengeHistory.from_stored(
+            daily_checkins,
+            challenge_data.get('task_catalogue_stage', challenge_data.get('current_stage', '')),
+            challenge_data.get('task_catalogue_version', TASK_CATALOGUE_VERSION)
+        )
+    return ChallengeHistory.from_checkins(daily_checkins, challenge_data.get('current_stage', ''))
+
+def get_challenge_history(challenge_data):
+    """Return the compact history for challenge_data, converting it in place"""
+    history = read_challenge_history(challenge_data)
+    challenge_data['daily_checkins'] = history
+    return history
+
+def serializable_challenge_data(data):
+    """Encode challenge data in the current stored schema"""
+    history = read_challenge_history(data)
+    data = dict(data)
+    data['daily_checkins'] = history.to_stored()
+    data['schema_version'] = CHALLENGE_SCHEMA_VERSION
+    data['task_catalogue_version'] = history.catalogue_version
+    data['task_catalogue_stage'] = history.stage
+    return data
+
+# Streaks and calendar
+CALENDAR_WEEKS = 53
+
+def day_runs(history):
+    """Run-length encode check-in days into (first ordinal, length, perfect days) per run"""
+    lengths = history.streak_runs()
+    if len(lengths) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    starts = history.ordinals[offsets].astype(np.int64)
+    perfect = np.add.reduceat(history.perfect_days(), offsets)
+    return starts, lengths, perfect
+
+def streak_summary(history, today=None):
+    """Current and longest streak plus the gaps between check-in runs.
+    
+    A streak is the number of perfect days in a run of consecutive check-in
+    days; penalty days keep the run alive without adding to it and any
+    missed calendar day ends it. The current streak survives until the end
+    of the day after the latest check-in.
+    """
+    today = (today or date.today()).toordinal()
+    starts, lengths, perfect = day_runs(history)
+    if len(starts) == 0:
+        return {
+            'current_streak': 0,
+            'longest_streak': 0,
+            'active_days': 0,
+            'gap_starts': starts,
+            'gap_lengths': lengths,
+            'longest_gap': 0,
+            'days_since_checkin': None
+        }
+    ends = starts + lengths - 1
+    gap_starts = ends[:-1] + 1
+    gap_lengths = starts[1:] - gap_starts
+    days_since_checkin = today - int(ends[-1])
+    return {
+        'current_streak': int(perfect[-1]) if days_since_checkin <= 1 else 0,
+        'longest_streak': int(perfect.max()),
+        'active_days': int(lengths.sum()),
+        'gap_starts': gap_starts,
+        'gap_lengths': gap_lengths,
+        'longest_gap': int(gap_lengths.max()) if len(gap_lengths) else 0,
+        'days_since_checkin': days_since_checkin
+    }
+
+def calendar_grid(history, first_day, last_day):
+    """Completion rate per day as a weekday x week grid (NaN where there is no check-in)"""
+    first = first_day.toordinal() - first_day.weekday()
+    last = last_day.toordinal()
+    weeks = (last - first) // 7 + 1
+    grid = np.full(weeks * 7, np.nan)
+    in_range = (history.ordinals >= first_day.toordinal()) & (history.ordinals <= last)
+    grid[history.ordinals[in_range] - first] = history.completion_rates()[in_range]
+    return grid.reshape(weeks, 7).T, date.fromordinal(first)
+
+def firestore_document_size(value):
+    """Approximate stored size in bytes using Firestore's documented rules"""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, dict):
+        return sum(len(str(k).encode('utf-8')) + 1 + firestore_document_size(v) for k, v in value.items()) + 32
+    if isinstance(value, (list, tuple)):
+        return sum(firestore_document_size(v) for v in value)
+    return 8
+
+# Check-in storage migration
+CHECKIN_MIGRATION_ID = "checkins_bitmask_v2"
+
+def migrate_challenge_documents(batch_size=100, max_batches=None):
+    """Rewrite version 1 challenge documents in the bitmask schema.
+
+    Resumable: the cursor and running size/latency totals are kept in the
+    migrations collection after every committed batch.
+    """
+    batch_size = max(1, min(batch_size, 500))
+    state_ref = db.collection('migrations').document(CHECKIN_MIGRATION_ID)
+    state_doc = state_ref.get()
+    state = state_doc.to_dict() if state_doc.exists else {
+        'cursor': None,
+        'done': False,
+        'migrated': 0,
+        'skipped': 0,
+        'bytes_before': 0,
+        'bytes_after': 0,
+        'decode_ms_before': 0.0,
+        'decode_ms_after': 0.0,
+        'started_at': datetime.now()
+    }
+    batches = 0
+    while not state['done'] and (max_batches is None or batches < max_batches):
+        query = db.collection('challenge_progress').order_by('__name__').limit(batch_size)
+        if state['cursor']:
+            cursor_doc = db.collection('challenge_progress').document(state['cursor']).get()
+            query = query.start_after(cursor_doc)
+        with trace_span("firestore.query", collection="challenge_progress"):
+            docs = list(query.stream())
+        if not docs:
+            state['done'] = True
+            state['finished_at'] = datetime.now()
+            state_ref.set(state)
+            break
+        batch = db.batch()
+        for doc in docs:
+            data = doc.to_dict()
+            if data.get('schema_version', 1) >= CHALLENGE_SCHEMA_VERSION:
+                state['skipped'] += 1
+                continue
+            started = time.perf_counter()
+            read_challenge_history(data)
+            state['decode_ms_before'] += (time.perf_counter() - started) * 1000
+            migrated = serializable_challenge_data(data)
+            started = time.perf_counter()
+            read_challenge_history(migrated)
+            state['decode_ms_after'] += (time.perf_counter() - started) * 1000
+            state['bytes_before'] += firestore_document_size(data)
+            state['bytes_after'] += firestore_document_size(migrated)
+            state['migrated'] += 1
+            batch.set(doc.reference, migrated)
+        state['cursor'] = docs[-1].id
+        batch.set(state_ref, state)
+        with trace_span("firestore.batch_commit", collection="challenge_progress"):
+            batch.commit()
+        batches += 1
+    return state
+
+def reset_challenge_migration():
+    db.collection('migrations').document(CHECKIN_MIGRATION_ID).delete()
+
+def load_challenge_data(username):
+    try:
+        doc = cached_live_document('challenge_progress', username)
+        if doc is None:
+            doc_ref = db.collection('challenge_progress').document(username)
+            with trace_span("firestore.get", collection="challenge_progress"):
+                doc = doc_ref.get()
+        if doc.exists:
+            data = doc.to_dict()
+            data['streak_days'] = streak_summary(get_challenge_history(data))['current_streak']
+            return data
+        else:
+            initial_data = {
+                'current_stage': '',
+                'start_date': datetime.now(),
+                'current_day': 1,
+                'streak_days': 0,
+                'total_savings': 0,
+                'completed_days': 0,
+                'penalty_history': [],
+                'daily_checkins': {},
+                'badges': []
+            }
+            return initial_data
+    except Exception as e:
+        return {}
+
+def save_challenge_data(username, data, unit=None):
+    try:
+        note_local_write('challenge_progress', username)
+        if unit is not None:
+            unit.set(db.collection('challenge_progress').document(username), serializable_challenge_data(data))
+            return True
+        with trace_span("firestore.set", collection="challenge_progress"):
+            db.collection('challenge_progress').document(username).set(serializable_challenge_data(data))
+        return True
+    except Exception as e:
+        return False
+
+# Live document listeners
+LISTENED_COLLECTIONS = ('challenge_progress', 'user_profiles')
+
+def get_listener_config():
+    listener_config = st.secrets.get("listeners", {})
+    return {
+        'enabled': str(listener_config.get("ENABLED", "true")).lower() == "true",
+        'max_listeners': int(listener_config.get("MAX_LISTENERS", 200)),
+        'idle_seconds': float(listener_config.get("IDLE_SECONDS", 900)),
+        'local_write_seconds': float(listener_config.get("LOCAL_WRITE_SECONDS", 10))
+    }
+
+def live_documents_enabled():
+    return get_listener_config()['enabled'] and get_runtime_session_manager() is not None
+
+def active_session(session_id):
+    manager = get_runtime_session_manager()
+    if manager is None:
+        return None
+    return manager.get_active_session_info(session_id)
+
+def request_session_rerun(session_id):
+    """Ask another live session to rerun its script (best effort; relies on Streamlit runtime internals)"""
+    session_info = active_session(session_id)
+    if session_info is None:
+        return False
+    try:
+        session_info.session.request_rerun(None)
+        return True
+    except Exception as e:
+        return False
+
+class LiveDocumentHub:
+    """Snapshot listeners on the documents of users with live sessions.
+
+    Each watched document gets one on_snapshot listener per process however
+    many sessions show it. Updates are stored with a process-wide version and
+    the other sessions showing that user are asked to rerun; each session
+    applies newer versions at the top of its script instead of rereading
+    Firestore. At most MAX_LISTENERS listeners are open at once, closing the
+    least recently seen user's first.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.users = OrderedDict()
+        self.documents = {}
+        self.local_writes = {}
+        self.version = 0
+        self.stats = {'opened': 0, 'closed': 0, 'updates': 0, 'reruns_requested': 0}
+
+    def listeners_per_user(self):
+        return len(LISTENED_COLLECTIONS)
+
+    def watch(self, username, session_id):
+        with self.lock:
+            entry = self.users.get(username)
+            if entry is not None:
+                entry['sessions'].add(session_id)
+                entry['last_seen'] = time.time()
+                self.users.move_to_end(username)
+                return
+            if self.config['max_listeners'] < self.listeners_per_user():
+                return
+            closing = self.expired_users()
+            while (len(self.users) - len(closing) + 1) * self.listeners_per_user() > self.config['max_listeners']:
+                closing.append(next(name for name in self.users if name not in closing))
+            entries = [self.users.pop(name) for name in closing]
+            for name in closing:
+                for collection in LISTENED_COLLECTIONS:
+                    self.documents.pop((collection, name), None)
+            entry = self.users[username] = {'sessions': {session_id}, 'last_seen': time.time(), 'watches': [], 'primed': set()}
+        
+        for closed in entries:
+            self.close(closed)
+        for collection in LISTENED_COLLECTIONS:
+            doc_ref = db.collection(collection).document(username)
+            watch = doc_ref.on_snapshot(lambda docs, changes, read_time, collection=collection: self.on_snapshot(collection, username, docs))
+            with self.lock:
+                entry['watches'].append(watch)
+                self.stats['opened'] += 1
+
+    def expired_users(self):
+        cutoff = time.time() - self.config['idle_seconds']
+        expired = []
+        for name, entry in self.users.items():
+            entry['sessions'] = {session_id for session_id in entry['sessions'] if active_session(session_id) is not None}
+            if not entry['sessions'] and entry['last_seen'] < cutoff:
+                expired.append(name)
+        return expired
+
+    def close(self, entry):
+        for watch in entry['watches']:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                pass
+        with self.lock:
+            self.stats['closed'] += len(entry['watches'])
+
+    def on_snapshot(self, collection, username, docs):
+        snapshot = docs[0] if docs else None
+        with self.lock:
+            entry = self.users.get(username)
+            if entry is None:
+                return
+            self.version += 1
+            self.documents[(collection, username)] = (self.version, snapshot)
+            self.stats['updates'] += 1
+            if collection not in entry['primed']:
+                entry['primed'].add(collection)
+                return
+            writer, written_at = self.local_writes.get((collection, username), (None, 0))
+            if time.time() - written_at > self.config['local_write_seconds']:
+                writer = None
+            sessions = [session_id for session_id in entry['sessions'] if session_id != writer]
+        for session_id in sessions:
+            if request_session_rerun(session_id):
+                with self.lock:
+                    self.stats['reruns_requested'] += 1
+
+    def note_local_write(self, collection, username, session_id):
+        with self.lock:
+            self.local_writes[(collection, username)] = (session_id, time.time())
+
+    def latest(self, collection, username):
+        with self.lock:
+            return self.documents.get((collection, username))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'users': len(self.users),
+                'listeners': sum(len(entry['watches']) for entry in self.users.values()),
+                'sessions': sum(len(entry['sessions']) for entry in self.users.values()),
+                **self.stats
+            }
+
+@st.cache_resource
+def get_live_document_hub():
+    return LiveDocumentHub(get_listener_config())
+
+def cached_live_document(collection, username):
+    """Latest listener snapshot for a watched document, or None if it is not watched"""
+    if not live_documents_enabled():
+        return None
+    latest = get_live_document_hub().latest(collection, username)
+    return latest[1] if latest is not None else None
+
+def note_local_write(collection, username):
+    """Record that this session wrote the document so its own listener echo does not rerun it"""
+    try:
+        if live_documents_enabled():
+            get_live_document_hub().note_local_write(collection, username, get_session_id())
+    except Exception as e:
+        pass
+
+def sync_live_documents():
+    """Keep this session's user watched and apply any newer listener snapshots"""
+    if not st.session_state.user or not live_documents_enabled():
+        return
+    username = st.session_state.user['username']
+    try:
+        hub = get_live_document_hub()
+        hub.watch(username, get_session_id())
+        seen = st.session_state.setdefault('live_document_versions', {})
+        for collection in LISTENED_COLLECTIONS:
+            latest = hub.latest(collection, username)
+            if latest is None or latest[0] <= seen.get(collection, 0):
+                continue
+            seen[collection] = latest[0]
+            if latest[1] is None or not latest[1].exists:
+                continue
+            data = latest[1].to_dict()
+            if collection == 'challenge_progress':
+                data['streak_days'] = streak_summary(get_challenge_history(data))['current_streak']
+                st.session_state.challenge_data = data
+                st.session_state.loaded_user_data.add('challenge_data')
+            else:
+                st.session_state.user_profile = data
+                st.session_state.loaded_user_data.add('user_profile')
+    except Exception as e:
+        pass
+
+# Leaderboards
+LEADERBOARD_METRICS = {
+    'streak_days': 'Streak Days',
+    'completed_days': 'Completed Days',
+    'total_savings': 'Total Savings'
+}
+LEADERBOARD_TOP_K = 100
+LEADERBOARD_PAGE_SIZE = 25
+LEADERBOARD_EXPIRE_LIMIT = 200
+LEADERBOARD_EXPIRE_ATTEMPTS = 5
+
+def leaderboard_bucket(metric, value):
+    """Histogram bucket for a metric value; day counts get one bucket per day"""
+    value = max(0, value or 0)
+    if metric == 'total_savings':
+        return int(np.floor(np.log2(value + 1) * 4))
+    return int(min(value, 10000))
+
+def leaderboard_sort_key(entry):
+    """Highest value first, ties by username; leaderboard_entries_query pages in the same order"""
+    return (-entry['value'], entry['username'])
+
+def leaderboard_entries_query(metric):
+    return db.collection('leaderboard_entries').order_by(metric, direction=firestore.Query.DESCENDING).order_by('__name__')
+
+class LeaderboardStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.top_writes = 0
+        self.failures = 0
+        self.last_error = None
+
+    def record(self, top_writes=0, error=None):
+        with self.lock:
+            self.updates += 1
+            self.top_writes += top_writes
+            if error is not None:
+                self.failures += 1
+                self.last_error = f"{type(error).__name__}: {error}"
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'updates': self.updates,
+                'top_writes': self.top_writes,
+                'failures': self.failures,
+                'last_error': self.last_error
+            }
+
+@st.cache_resource
+def get_leaderboard_stats():
+    return LeaderboardStats()
+
+def leaderboard_values(challenge_data):
+    return {metric: challenge_data.get(metric, 0) for metric in LEADERBOARD_METRICS}
+
+def streak_expiry(challenge_data):
+    """Ordinal of the first day the current streak no longer holds (see streak_summary), or None without one"""
+    history = read_challenge_history(challenge_data)
+    if not challenge_data.get('streak_days') or not len(history):
+        return None
+    return int(history.ordinals[-1]) + 2
+
+def leaderboard_entry(challenge_data):
+    """Fields of a leaderboard_entries document; streak_expires lets expire_leaderboard_streaks find stale streaks"""
+    return {**leaderboard_values(challenge_data), 'streak_expires': streak_expiry(challenge_data), 'updated_at': datetime.now()}
+
+def add_histogram_deltas(deltas, old_values, values):
+    """Accumulate per-metric bucket counts for one entry moving from old_values (None if new) to values"""
+    for metric, value in values.items():
+        counts = deltas.setdefault(metric, {})
+        new_key = f"b{leaderboard_bucket(metric, value)}"
+        if old_values is None:
+            counts['total'] = counts.get('total', 0) + 1
+        else:
+            old_key = f"b{leaderboard_bucket(metric, old_values.get(metric, 0))}"
+            if old_key == new_key:
+                continue
+            counts[old_key] = counts.get(old_key, 0) - 1
+        counts[new_key] = counts.get(new_key, 0) + 1
+    return deltas
+
+def histogram_increments(counts):
+    """Merge-set fields applying accumulated counts to a histogram document, or None if nothing changes"""
+    buckets = {key: firestore.Increment(count) for key, count in counts.items() if key != 'total' and count}
+    update = {'buckets': buckets} if buckets else {}
+    if counts.get('total'):
+        update['total'] = firestore.Increment(counts['total'])
+    return update or None
+
+def update_leaderboard_tops(username, values, old_values):
+    """Apply changed values to the top-K lists; returns the number of list documents written"""
+    top_writes = 0
+    for metric, value in values.items():
+        old_value = old_values.get(metric, 0) if old_values is not None else None
+        if old_value != value:
+            top_writes += update_leaderboard_top(metric, username, value, old_value)
+    return top_writes
+
+def update_leaderboards(username, challenge_data):
+    """Apply a user's new totals to their entry and the rank histograms, then to
+    any top-K list the user is on or now qualifies for"""
+    values = leaderboard_values(challenge_data)
+    entry_ref = db.collection('leaderboard_entries').document(username)
+
+    @firestore.transactional
+    def apply_in_transaction(transaction):
+        entry_doc = entry_ref.get(transaction=transaction)
+        old_values = entry_doc.to_dict() if entry_doc.exists else None
+        for metric, counts in add_histogram_deltas({}, old_values, values).items():
+            histogram_update = histogram_increments(counts)
+            if histogram_update is not None:
+                transaction.set(db.collection('leaderboard_histograms').document(metric), histogram_update, merge=True)
+        transaction.set(entry_ref, leaderboard_entry(challenge_data))
+        return old_values
+
+    top_writes = 0
+    try:
+        with trace_span("firestore.transaction", collection="leaderboard_entries"):
+            old_values = apply_in_transaction(db.transaction())
+        top_writes = update_leaderboard_tops(username, values, old_values)
+        get_leaderboard_stats().record(top_writes)
+        return True
+    except Exception as e:
+        get_leaderboard_stats().record(top_writes, e)
+        return False
+
+def update_leaderboard_top(metric, username, value, old_value):
+    """Move one user within a top-K list; returns 1 if the list document was written.
+
+    The cached list decides whether the list is touched at all, so most
+    check-ins never contend on it. A user who drops out of a full list is
+    replaced by the next entry from leaderboard_entries.
+    """
+    cached = load_leaderboard_top(metric)
+    candidate = {'username': username, 'value': value}
+    
+    def qualifies(entry, entries):
+        return len(entries) < LEADERBOARD_TOP_K or leaderboard_sort_key(entry) < leaderboard_sort_key(entries[-1])
+    
+    listed = any(entry['username'] == username for entry in cached)
+    was_listed = old_value is not None and qualifies({'username': username, 'value': old_value}, cached)
+    if not (listed or was_listed or qualifies(candidate, cached)):
+        return 0
+    
+    top_ref = db.collection('leaderboards').document(metric)
+
+    @firestore.transactional
+    def apply_in_transaction(transaction):
+        top_doc = top_ref.get(transaction=transaction)
+        current = top_doc.to_dict().get('entries', []) if top_doc.exists else []
+        entries = [entry for entry in current if entry['username'] != username]
+        if len(entries) == len(current):
+            if not qualifies(candidate, entries):
+                return 0
+            entries.append(candidate)
+        elif len(current) >= LEADERBOARD_TOP_K and entries and leaderboard_sort_key(candidate) > leaderboard_sort_key(entries[-1]):
+            # The user fell below the last remaining entry, so the free slot goes
+            # to the best entry after it, which may still be this user
+            cursor = db.collection('leaderboard_entries').document(entries[-1]['username']).get(transaction=transaction)
+            query = leaderboard_entries_query(metric).start_after(cursor).limit(1)
+            entries.extend({'username': doc.id, 'value': doc.to_dict().get(metric, 0)} for doc in query.stream(transaction=transaction))
+        else:
+            entries.append(candidate)
+        entries.sort(key=leaderboard_sort_key)
+        transaction.set(top_ref, {'entries': entries[:LEADERBOARD_TOP_K], 'updated_at': datetime.now()})
+        return 1
+
+    with trace_span("firestore.transaction", collection="leaderboards"):
+        return apply_in_transaction(db.transaction())
+
+def refresh_leaderboard_top(metric):
+    """Reload a whole top-K list from leaderboard_entries"""
+    top_ref = db.collection('leaderboards').document(metric)
+
+    @firestore.transactional
+    def apply_in_transaction(transaction):
+        query = leaderboard_entries_query(metric).limit(LEADERBOARD_TOP_K)
+        entries = [{'username': doc.id, 'value': doc.to_dict().get(metric, 0)} for doc in query.stream(transaction=transaction)]
+        transaction.set(top_ref, {'entries': entries, 'updated_at': datetime.now()})
+
+    with trace_span("firestore.transaction", collection="leaderboards"):
+        apply_in_transaction(db.transaction())
+
+@st.cache_data(ttl=300, show_spinner=False)
+def expire_leaderboard_streaks(today):
+    """Zero the streak of entries whose streak ran out on or before today (an ordinal).
+
+    Entries only change on check-in, import or setup, so a user who stops
+    checking in keeps their last streak until this runs. Leaderboard reads
+    call it, at most every few minutes per process. Expired entries are
+    written in batches with the histogram changes, each entry guarded by
+    the update time it was read at; a batch that loses to a check-in is
+    queried again. The streak top-K list is then reloaded. Returns the
+    number of entries expired.
+    """
+    query = db.collection('leaderboard_entries').where('streak_expires', '<=', today).limit(LEADERBOARD_EXPIRE_LIMIT)
+    expired = 0
+    failures = 0
+    while failures < LEADERBOARD_EXPIRE_ATTEMPTS:
+        with trace_span("firestore.query", collection="leaderboard_entries"):
+            docs = list(query.stream())
+        if not docs:
+            break
+        batch = db.batch()
+        deltas = {}
+        for doc in docs:
+            batch.update(doc.reference, {'streak_days': 0, 'streak_expires': None}, option=db.write_option(last_update_time=doc.update_time))
+            add_histogram_deltas(deltas, {'streak_days': doc.to_dict().get('streak_days', 0)}, {'streak_days': 0})
+        for metric, counts in deltas.items():
+            histogram_update = histogram_increments(counts)
+            if histogram_update is not None:
+                batch.set(db.collection('leaderboard_histograms').document(metric), histogram_update, merge=True)
+        try:
+            with trace_span("firestore.batch_commit", collection="leaderboard_entries"):
+                batch.commit()
+        except google_exceptions.FailedPrecondition as e:
+            failures += 1
+            continue
+        expired += len(docs)
+        if len(docs) < LEADERBOARD_EXPIRE_LIMIT:
+            break
+    if expired:
+        refresh_leaderboard_top('streak_days')
+        load_leaderboard_top.clear()
+        load_leaderboard_histogram.clear()
+    return expired
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_leaderboard_top(metric):
+    with trace_span("firestore.get", collection="leaderboards"):
+        doc = db.collection('leaderboards').document(metric).get()
+    return doc.to_dict().get('entries', []) if doc.exists else []
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_leaderboard_histogram(metric):
+    with trace_span("firestore.get", collection="leaderboard_histograms"):
+        doc = db.collection('leaderboard_histograms').document(metric).get()
+    return doc.to_dict() if doc.exists else {}
+
+def get_leaderboard_page(metric, cursor=None, page_size=LEADERBOARD_PAGE_SIZE):
+    """Return one page of entries after the cursor username, and the next cursor"""
+    top_entries = load_leaderboard_top(metric)
+    start = 0
+    if cursor is not None:
+        usernames = [entry['username'] for entry in top_entries]
+        start = usernames.index(cursor) + 1 if cursor in usernames else None
+    
+    if start is not None and (start + page_size <= len(top_entries) or len(top_entries) < LEADERBOARD_TOP_K):
+        page = top_entries[start:start + page_size]
+    else:
+        entries_ref = db.collection('leaderboard_entries')
+        query = leaderboard_entries_query(metric).limit(page_size)
+        if cursor is not None:
+            with trace_span("firestore.get", collection="leaderboard_entries"):
+                query = query.start_after(entries_ref.document(cursor).get())
+        with trace_span("firestore.query", collection="leaderboard_entries"):
+            page = [{'username': doc.id, 'value': doc.to_dict().get(metric, 0)} for doc in query.stream()]
+    
+    next_cursor = page[-1]['username'] if len(page) == page_size else None
+    return page, next_cursor
+
+def get_leaderboard_rank(metric, value):
+    """Rank from the bucket histogram: 1 + number of users in higher buckets"""
+    histogram = load_leaderboard_histogram(metric)
+    bucket = leaderboard_bucket(metric, value)
+    above = sum(count for key, count in histogram.get('buckets', {}).items() if int(key[1:]) > bucket)
+    return above + 1, histogram.get('total', 0)
+
+def rebuild_leaderboards(page_size=300):
+    """Recompute entries, histograms and top-K lists from every challenge document"""
+    histograms = {metric: {} for metric in LEADERBOARD_METRICS}
+    top_entries = {metric: [] for metric in LEADERBOARD_METRICS}
+    total = 0
+    cursor = None
+    while True:
+        query = db.collection('challenge_progress').order_by('__name__').limit(page_size)
+        if cursor is not None:
+            query = query.start_after(cursor)
+        with trace_span("firestore.query", collection="challenge_progress"):
+            docs = list(query.stream())
+        if not docs:
+            break
+        batch = db.batch()
+        for doc in docs:
+            data = doc.to_dict()
+            data['streak_days'] = streak_summary(read_challenge_history(data))['current_streak']
+            values = leaderboard_values(data)
+            batch.set(db.collection('leaderboard_entries').document(doc.id), leaderboard_entry(data))
+            for metric, value in values.items():
+                key = f"b{leaderboard_bucket(metric, value)}"
+                histograms[metric][key] = histograms[metric].get(key, 0) + 1
+                top_entries[metric].append({'username': doc.id, 'value': value})
+                if len(top_entries[metric]) > 2 * LEADERBOARD_TOP_K:
+                    top_entries[metric].sort(key=leaderboard_sort_key)
+                    del top_entries[metric][LEADERBOARD_TOP_K:]
+            total += 1
+        batch.commit()
+        cursor = docs[-1]
+    
+    batch = db.batch()
+    for metric in LEADERBOARD_METRICS:
+        top_entries[metric].sort(key=leaderboard_sort_key)
+        batch.set(db.collection('leaderboards').document(metric), {
+            'entries': top_entries[metric][:LEADERBOARD_TOP_K],
+            'updated_at': datetime.now()
+        })
+        batch.set(db.collection('leaderboard_histograms').document(metric), {
+            'buckets': histograms[metric],
+            'total': total
+        })
+    batch.commit()
+    load_leaderboard_top.clear()
+    load_leaderboard_histogram.clear()
+    return total
+
+# Badges
+# Each rule awards its badge once metric(state) >= at_least; optional keys
+# limit it to one stage or require a minimum number of counted days.
+BADGE_RULES = [
+    {'badge': 'Silver Achiever', 'metric': 'days', 'at_least': get_stage_days(CHALLENGE_STAGES[0]), 'stage': CHALLENGE_STAGES[0]},
+    {'badge': 'Platinum Performer', 'metric': 'longest_streak', 'at_least': 30},
+    {'badge': 'Gold Master', 'metric': 'days', 'at_least': get_stage_days(CHALLENGE_STAGES[2]), 'stage': CHALLENGE_STAGES[2]},
+    {'badge': 'Distraction Slayer', 'metric': 'focus_rate', 'at_least': 0.9, 'min_days': 15}
+]
+BADGE_METRICS = {
+    'days': lambda state: state['days'],
+    'longest_streak': lambda state: state['longest_streak'],
+    'focus_rate': lambda state: state['focus_days'] / state['days'] if state['days'] else 0.0
+}
+BADGE_BACKFILL_CHUNK = 200
+BADGE_BACKFILL_ATTEMPTS = 5
+
+def new_badge_state():
+    return {'days': 0, 'perfect_days': 0, 'focus_days': 0, 'run_streak': 0, 'longest_streak': 0, 'last_ordinal': None}
+
+def advance_badge_state(state, ordinal, perfect, focused):
+    """Fold one counted check-in into the running badge counters.
+
+    Streaks follow streak_summary: perfect days in a run of consecutive
+    check-in days. Days at or before the last folded one are ignored.
+    """
+    last = state['last_ordinal']
+    if last is not None and ordinal <= last:
+        return state
+    if last is None or ordinal != last + 1:
+        state['run_streak'] = 0
+    state['days'] += 1
+    state['perfect_days'] += int(perfect)
+    state['focus_days'] += int(focused)
+    state['run_streak'] += int(perfect)
+    state['longest_streak'] = max(state['longest_streak'], state['run_streak'])
+    state['last_ordinal'] = ordinal
+    return state
+
+def replay_badge_state(history):
+    """Badge counters for a whole history, for documents without stored state"""
+    state = new_badge_state()
+    perfect = history.perfect_days()
+    focused = 1 - history.distraction_days()
+    for ordinal, is_perfect, is_focused in zip(history.ordinals.tolist(), perfect.tolist(), focused.tolist()):
+        advance_badge_state(state, ordinal, is_perfect, is_focused)
+    return state
+
+def evaluate_badges(state, stage, badges):
+    """Badges whose rules now hold and that are not in badges yet"""
+    earned = []
+    for rule in BADGE_RULES:
+        if rule['badge'] in badges or rule.get('stage', stage) != stage:
+            continue
+        if state['days'] < rule.get('min_days', 0):
+            continue
+        if BADGE_METRICS[rule['metric']](state) >= rule['at_least']:
+            earned.append(rule['badge'])
+    return earned
+
+def award_checkin_badges(challenge_data, history, day, completed_tasks, perfect, stage):
+    """Update badge state for the check-in just added on day (YYYY-MM-DD) and return new badges.
+
+    stage is the user's profile stage, which stage-scoped rules are checked against.
+    """
+    state = challenge_data.get('badge_state')
+    if state is None:
+        state = replay_badge_state(history)
+    else:
+        state = advance_badge_state(dict(state), date.fromisoformat(day).toordinal(), perfect, "No distractions today" in completed_tasks)
+    challenge_data['badge_state'] = state
+    earned = evaluate_badges(state, stage, challenge_data.get('badges', []))
+    challenge_data['badges'] = list(challenge_data.get('badges', [])) + earned
+    return earned
+
+def backfill_badges(page_size=300, chunk_size=BADGE_BACKFILL_CHUNK, workers=4):
+    """Recompute badge state for every challenge document and award missing badges.
+
+    Chunks of users are read with one get_all, evaluated and committed as
+    one batch, in parallel. Each update carries the update time of the
+    snapshot it was computed from, so a check-in that advanced badge_state
+    meanwhile fails the commit and only that chunk is read and evaluated
+    again. Badges are added with ArrayUnion. Stage-scoped rules use the
+    profile stage, falling back to the challenge document's.
+    """
+    chunk_size = max(1, min(chunk_size, IMPORT_BATCH_WRITE_LIMIT))
+    
+    def backfill_chunk(usernames):
+        refs = [db.collection('challenge_progress').document(username) for username in usernames]
+        with trace_span("firestore.get_all", collection="user_profiles"):
+            profiles = db.get_all([db.collection('user_profiles').document(username) for username in usernames], field_paths=['stage'])
+            stages = {doc.id: doc.to_dict().get('stage') for doc in profiles if doc.exists}
+        retries = 0
+        while True:
+            with trace_span("firestore.get_all", collection="challenge_progress"):
+                docs = [doc for doc in db.get_all(refs) if doc.exists]
+            batch = db.batch()
+            writes = 0
+            awards = {}
+            for doc in docs:
+                data = doc.to_dict()
+                state = replay_badge_state(read_challenge_history(data))
+                earned = evaluate_badges(state, stages.get(doc.id) or data.get('current_stage', ''), data.get('badges', []))
+                if not earned and data.get('badge_state') == state:
+                    continue
+                update = {'badge_state': state}
+                if earned:
+                    update['badges'] = firestore.ArrayUnion(earned)
+                batch.update(doc.reference, update, option=db.write_option(last_update_time=doc.update_time))
+                writes += 1
+                for badge in earned:
+                    awards[badge] = awards.get(badge, 0) + 1
+            if not writes:
+                break
+            try:
+                with trace_span("firestore.batch_commit", collection="challenge_progress"):
+                    batch.commit()
+                break
+            except google_exceptions.FailedPrecondition as e:
+                retries += 1
+                if retries >= BADGE_BACKFILL_ATTEMPTS:
+                    raise
+        return len(docs), writes, awards, retries
+    
+    result = {'users': 0, 'updated': 0, 'commits': 0, 'retries': 0, 'awards': {rule['badge']: 0 for rule in BADGE_RULES}}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for usernames in iter_document_ids('challenge_progress', page_size):
+            for i in range(0, len(usernames), chunk_size):
+                pending.append(executor.submit(backfill_chunk, usernames[i:i + chunk_size]))
+        for future in pending:
+            users, writes, awards, retries = future.result()
+            result['users'] += users
+            result['updated'] += writes
+            result['commits'] += int(writes > 0)
+            result['retries'] += retries
+            for badge, count in awards.items():
+                result['awards'][badge] += count
+    return result
+
+# Accountability partners
+# partners/<username> holds the user's links and feed:
+#   partners: linked usernames, invites: usernames waiting for an answer,
+#   fan_out: whether their check-ins are pushed to partner inboxes,
+#   pulled: partners who are not pushed and are read from their outbox,
+#   inbox / outbox: feed items keyed by feed_slot.
+# A slot is reused after FEED_DAYS, so an inbox never holds more than
+# MAX_PARTNERS * FEED_DAYS items and needs no read before each write.
+STREAK_MILESTONES = (7, 14, 30, 60, 100)
+
+@st.cache_resource
+def get_partner_config():
+    partner_config = st.secrets.get("partners", {})
+    return {
+        'max_partners': int(partner_config.get("MAX_PARTNERS", 100)),
+        'fan_out_limit': int(partner_config.get("FAN_OUT_LIMIT", 25)),
+        'feed_days': int(partner_config.get("FEED_DAYS", 14)),
+        'page_size': int(partner_config.get("PAGE_SIZE", 20))
+    }
+
+def feed_slot(author, ordinal, feed_days):
+    return f"{ordinal % feed_days:03d}:{author}"
+
+def partner_activity_item(username, ordinal, perfect, streak, badges):
+    """One feed item per user and day: the check-in, its streak and any badges it earned"""
+    return {'u': username, 'o': ordinal, 'p': bool(perfect), 's': int(streak), 'b': list(badges)}
+
+def assemble_feed(items, partners, today_ordinal, feed_days):
+    """Current partners' items from the last feed_days days, newest first"""
+    partners = set(partners)
+    oldest = today_ordinal - feed_days
+    feed = [item for item in items.values() if item['u'] in partners and item['o'] > oldest]
+    feed.sort(key=lambda item: (-item['o'], item['u']))
+    return feed
+
+def partner_activity_lines(item):
+    lines = [f"**{item['u']}** {'completed a perfect day' if item['p'] else 'checked in with a penalty'}"]
+    if item['p'] and item['s'] in STREAK_MILESTONES:
+        lines.append(f"**{item['u']}** reached a {item['s']}-day streak")
+    for badge in item['b']:
+        lines.append(f"**{item['u']}** earned the {badge} badge")
+    return lines
+
+def publish_partner_activity(username, day, perfect, streak, badges):
+    """Write a check-in to the user's outbox and, in fan-out mode, to every partner's inbox"""
+    try:
+        config = get_partner_config()
+        ref = db.collection('partners').document(username)
+        with trace_span("firestore.get", collection="partners"):
+            doc = ref.get(field_paths=['partners', 'fan_out'])
+        data = doc.to_dict() if doc.exists else {}
+        partners = data.get('partners', [])
+        if not partners:
+            return 0
+        ordinal = date.fromisoformat(day).toordinal()
+        slot = feed_slot(username, ordinal, config['feed_days'])
+        item = partner_activity_item(username, ordinal, perfect, streak, badges)
+        writes = [(ref, 'outbox')]
+        if data.get('fan_out', True):
+            writes.extend((db.collection('partners').document(partner), 'inbox') for partner in partners)
+        for start in range(0, len(writes), IMPORT_BATCH_WRITE_LIMIT):
+            batch = db.batch()
+            for target, field in writes[start:start + IMPORT_BATCH_WRITE_LIMIT]:
+                batch.set(target, {field: {slot: item}}, merge=True)
+            with trace_span("firestore.batch_commit", collection="partners"):
+                batch.commit()
+        return len(writes)
+    except Exception as e:
+        return 0
+
+def switch_fan_out(transaction, username, data, partners, fan_out, skip):
+    """Move a user between pushing to inboxes and being pulled from their outbox.
+
+    Partners other than skip are updated here; the caller writes the two
+    documents it already holds.
+    """
+    if fan_out == data.get('fan_out', True):
+        return
+    for partner in partners:
+        if partner in skip:
+            continue
+        ref = db.collection('partners').document(partner)
+        if fan_out:
+            # Copy the outbox so the recent days stay in the feed after switching back
+            transaction.set(ref, {'pulled': firestore.ArrayRemove([username]), 'inbox': data.get('outbox', {})}, merge=True)
+        else:
+            transaction.set(ref, {'pulled': firestore.ArrayUnion([username])}, merge=True)
+
+def change_partner_link(username, other, link):
+    """Link or unlink two users in one transaction; returns 'linked', 'unlinked' or 'full'"""
+    config = get_partner_config()
+    refs = {name: db.collection('partners').document(name) for name in (username, other)}
+
+    @firestore.transactional
+    def apply_in_transaction(transaction):
+        docs = {name: ref.get(transaction=transaction) for name, ref in refs.items()}
+        data = {name: docs[name].to_dict() if docs[name].exists else {} for name in refs}
+        if link and other in data[username].get('partners', []):
+            return 'linked'
+        if link and any(len(data[name].get('partners', [])) >= config['max_partners'] for name in refs):
+            return 'full'
+        
+        updates = {}
+        for name, partner in ((username, other), (other, username)):
+            partners = [p for p in data[name].get('partners', []) if p != partner]
+            if link:
+                partners.append(partner)
+            fan_out = len(partners) <= config['fan_out_limit']
+            switch_fan_out(transaction, name, data[name], partners, fan_out, (username, other))
+            updates[name] = {
+                'partners': sorted(partners),
+                'invites': [p for p in data[name].get('invites', []) if p != partner],
+                'fan_out': fan_out,
+                'pulled': [p for p in data[name].get('pulled', []) if p != partner],
+                'inbox': {slot: item for slot, item in data[name].get('inbox', {}).items() if item['u'] != partner}
+            }
+        for name, partner in ((username, other), (other, username)):
+            if link and not updates[partner]['fan_out']:
+                updates[name]['pulled'].append(partner)
+            elif link:
+                updates[name]['inbox'].update(data[partner].get('outbox', {}))
+            transaction.set(refs[name], {**data[name], **updates[name], 'updated_at': datetime.now()})
+        return 'linked' if link else 'unlinked'
+
+    with trace_span("firestore.transaction", collection="partners"):
+        result = apply_in_transaction(db.transaction())
+    load_partner_feed.clear()
+    return result
+
+def invite_partner(username, other):
+    """Send an invite, or link straight away when other already invited username"""
+    other = other.strip()
+    if not other or other == username:
+        return 'invalid'
+    with trace_span("firestore.get", collection="users"):
+        if not db.collection('users').document(other).get().exists:
+            return 'unknown'
+    with trace_span("firestore.get", collection="partners"):
+        doc = db.collection('partners').document(username).get(field_paths=['partners', 'invites'])
+    data = doc.to_dict() if doc.exists else {}
+    if other in data.get('partners', []):
+        return 'already'
+    if other in data.get('invites', []):
+        return change_partner_link(username, other, True)
+    with trace_span("firestore.set", collection="partners"):
+        db.collection('partners').document(other).set({'invites': firestore.ArrayUnion([username])}, merge=True)
+    return 'invited'
+
+def decline_partner_invite(username, other):
+    with trace_span("firestore.set", collection="partners"):
+        db.collection('partners').document(username).set({'invites': firestore.ArrayRemove([other])}, merge=True)
+    load_partner_feed.clear()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_partner_feed(username):
+    """Partners, invites and the assembled feed: one document read, plus one
+    batched read of outboxes when some partners are over the fan-out limit"""
+    config = get_partner_config()
+    with trace_span("firestore.get", collection="partners"):
+        doc = db.collection('partners').document(username).get()
+    data = doc.to_dict() if doc.exists else {}
+    partners = data.get('partners', [])
+    items = dict(data.get('inbox', {}))
+    pulled = [partner for partner in data.get('pulled', []) if partner in partners]
+    if pulled:
+        refs = [db.collection('partners').document(partner) for partner in pulled]
+        with trace_span("firestore.get_all", collection="partners"):
+            for partner_doc in db.get_all(refs, field_paths=['outbox']):
+                if partner_doc.exists:
+                    items.update(partner_doc.to_dict().get('outbox', {}))
+    return {
+        'partners': partners,
+        'invites': data.get('invites', []),
+        'pulled': pulled,
+        'feed': assemble_feed(items, partners, date.today().toordinal(), config['feed_days'])
+    }
+
+def synthetic_partner_graph(users, kind, max_partners, rng, links_per_user=4):
+    """Random partner sets; 'Power-law' uses preferential attachment so a few users collect many partners"""
+    partners = [set() for _ in range(users)]
+    endpoints = []
+    for user in range(users):
+        for _ in range(links_per_user):
+            if kind == 'Power-law' and endpoints:
+                other = endpoints[int(rng.integers(len(endpoints)))]
+            else:
+                other = int(rng.integers(users))
+            if other == user or other in partners[user]:
+                continue
+            if len(partners[user]) >= max_partners or len(partners[other]) >= max_partners:
+                continue
+            partners[user].add(other)
+            partners[other].add(user)
+            endpoints.extend((user, other))
+    return partners
+
+def benchmark_partner_feeds(users=5000, days=14, checkin_rate=0.8):
+    """Simulate a fortnight of check-ins on synthetic partner graphs, with and without the fan-out limit"""
+    config = get_partner_config()
+    rng = np.random.default_rng(0)
+    today = date.today().toordinal()
+    results = []
+    for kind in ('Uniform', 'Power-law'):
+        graph = synthetic_partner_graph(users, kind, config['max_partners'], rng)
+        names = [f"user{i}" for i in range(users)]
+        for fan_out_limit in (config['max_partners'], config['fan_out_limit']):
+            fan_out = [len(partners) <= fan_out_limit for partners in graph]
+            inboxes = [{} for _ in range(users)]
+            outboxes = [{} for _ in range(users)]
+            writes = []
+            for ordinal in range(today - days + 1, today + 1):
+                for user in np.flatnonzero(rng.random(users) < checkin_rate).tolist():
+                    if not graph[user]:
+                        continue
+                    slot = feed_slot(names[user], ordinal, config['feed_days'])
+                    item = partner_activity_item(names[user], ordinal, True, ordinal % 31, [])
+                    outboxes[user][slot] = item
+                    if fan_out[user]:
+                        for partner in graph[user]:
+                            inboxes[partner][slot] = item
+                    writes.append(1 + (len(graph[user]) if fan_out[user] else 0))
+            
+            docs_read = []
+            build_ms = []
+            for user in range(users):
+                started = time.perf_counter()
+                items = dict(inboxes[user])
+                pulled = [partner for partner in graph[user] if not fan_out[partner]]
+                for partner in pulled:
+                    items.update(outboxes[partner])
+                assemble_feed(items, [names[partner] for partner in graph[user]], today, config['feed_days'])
+                build_ms.append((time.perf_counter() - started) * 1000)
+                docs_read.append(1 + len(pulled))
+            
+            degrees = np.array([len(partners) for partners in graph])
+            results.append({
+                'Graph': kind,
+                'Fan-out Limit': fan_out_limit,
+                'Users': users,
+                'Links': int(degrees.sum() // 2),
+                'Max Partners': int(degrees.max()),
+                'Pulled Users': users - sum(fan_out),
+                'Writes/Check-in': round(float(np.mean(writes)), 1),
+                'Max Writes/Check-in': int(max(writes)),
+                'Max Inbox (KB)': round(max(firestore_document_size(inbox) for inbox in inboxes) / 1024, 1),
+                'Docs/Feed Read': round(float(np.mean(docs_read)), 2),
+                'Max Docs/Feed Read': int(max(docs_read)),
+                'Feed Build p99 (ms)': round(float(np.percentile(build_ms, 99)), 3)
+            })
+    return results
+
+# Check-in snapshot
+@st.cache_resource
+def get_snapshot_config():
+    snapshot_config = st.secrets.get("snapshot", {})
+    return {
+        'path': snapshot_config.get("PATH", "snapshots/checkins.parquet"),
+        'refresh_minutes': float(snapshot_config.get("REFRESH_MINUTES", 60)),
+        'page_size': int(snapshot_config.get("PAGE_SIZE", 300)),
+        'fetch_chunk': int(snapshot_config.get("FETCH_CHUNK", 50)),
+        'workers': int(snapshot_config.get("WORKERS", 4))
+    }
+
+def iter_document_ids(collection, page_size):
+    """Yield pages of document ids using keys-only queries and a cursor"""
+    cursor = None
+    while True:
+        query = db.collection(collection).select([]).order_by('__name__').limit(page_size)
+        if cursor is not None:
+            query = query.start_after(cursor)
+        with trace_span("firestore.query", collection=collection):
+            docs = list(query.stream())
+        if not docs:
+            return
+        yield [doc.id for doc in docs]
+        cursor = docs[-1]
+
+def flatten_challenge_documents(usernames):
+    """Fetch challenge and profile documents for usernames and flatten their check-ins"""
+    challenge_refs = [db.collection('challenge_progress').document(username) for username in usernames]
+    profile_refs = [db.collection('user_profiles').document(username) for username in usernames]
+    challenges = {doc.id: doc.to_dict() for doc in db.get_all(challenge_refs) if doc.exists}
+    profiles = {doc.id: doc.to_dict() for doc in db.get_all(profile_refs) if doc.exists}
+    
+    frames = []
+    for username, data in challenges.items():
+        history = read_challenge_history(data)
+        if not history:
+            continue
+        completed = history.completed_counts()
+        frames.append(pd.DataFrame({
+            'username': username,
+            'field': profiles.get(username, {}).get('field', 'Unknown'),
+            'stage': data.get('current_stage', '') or 'Unknown',
+            'day_ordinal': history.ordinals,
+            'day_index': history.ordinals - history.ordinals[0],
+            'tasks_completed': completed.astype(np.int16),
+            'missed_tasks': history.missed,
+            'savings': history.savings,
+            'perfect_day': history.perfect_days().astype(bool),
+            'penalty_paid': history.penalty_days().astype(bool),
+            'distraction_day': history.distraction_days().astype(bool)
+        }))
+    return frames
+
+def materialize_checkin_snapshot():
+    """Page through all challenge documents and write a columnar Parquet snapshot"""
+    config = get_snapshot_config()
+    started = time.perf_counter()
+    frames = []
+    with ThreadPoolExecutor(max_workers=config['workers']) as executor:
+        futures = []
+        for usernames in iter_document_ids('challenge_progress', config['page_size']):
+            for i in range(0, len(usernames), config['fetch_chunk']):
+                futures.append(executor.submit(flatten_challenge_documents, usernames[i:i + config['fetch_chunk']]))
+        for future in futures:
+            frames.extend(future.result())
+    
+    if frames:
+        snapshot = pd.concat(frames, ignore_index=True)
+    else:
+        snapshot = pd.DataFrame(columns=[
+            'username', 'field', 'stage', 'day_ordinal', 'day_index', 'tasks_completed',
+            'missed_tasks', 'savings', 'perfect_day', 'penalty_paid', 'distraction_day'
+        ])
+    for column in ('username', 'field', 'stage'):
+        snapshot[column] = snapshot[column].astype('category')
+    
+    path = config['path']
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    snapshot.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+    return {
+        'rows': len(snapshot),
+        'users': snapshot['username'].nunique(),
+        'seconds': time.perf_counter() - started
+    }
+
+class SnapshotScheduler:
+    """Rebuild the check-in snapshot in the background every REFRESH_MINUTES"""
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last_result = None
+        self.last_error = None
+        self.thread = threading.Thread(target=self.run, name="brain-app-snapshot", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            path = get_snapshot_config()['path']
+            age = time.time() - os.path.getmtime(path) if os.path.exists(path) else None
+            if age is None or age >= self.interval:
+                self.refresh()
+                age = 0
+            time.sleep(max(1, self.interval - age))
+
+    def refresh(self):
+        if not self.lock.acquire(blocking=False):
+            return self.last_result
+        try:
+            self.last_result = materialize_checkin_snapshot()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            self.lock.release()
+        return self.last_result
+
+@st.cache_resource
+def get_snapshot_scheduler():
+    return SnapshotScheduler(get_snapshot_config()['refresh_minutes'] * 60)
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def load_checkin_snapshot(path, modified_time):
+    """modified_time only busts the cache; one entry keeps a single snapshot in memory"""
+    return pd.read_parquet(path)
+
+def cohort_completion_by_stage(snapshot):
+    total_tasks = snapshot['tasks_completed'] + snapshot['missed_tasks']
+    frame = snapshot.assign(completion=np.where(total_tasks > 0, snapshot['tasks_completed'] / total_tasks.where(total_tasks > 0, 1), 0.0))
+    grouped = frame.groupby('stage', observed=True).agg(
+        users=('username', 'nunique'),
+        check_ins=('completion', 'size'),
+        completion_rate=('completion', 'mean'),
+        perfect_day_rate=('perfect_day', 'mean')
+    )
+    grouped[['completion_rate', 'perfect_day_rate']] *= 100
+    return grouped.round(1).reset_index()
+
+def cohort_distraction_by_field(snapshot):
+    grouped = snapshot.groupby('field', observed=True).agg(
+        users=('username', 'nunique'),
+        check_ins=('distraction_day', 'size'),
+        distraction_day_rate=('distraction_day', 'mean')
+    )
+    grouped['distraction_day_rate'] *= 100
+    return grouped.round(1).sort_values('distraction_day_rate', ascending=False).reset_index()
+
+def cohort_retention(snapshot, max_days=60):
+    """Share of users still checking in at each day since their first check-in"""
+    retention = {}
+    for stage, frame in snapshot.groupby('stage', observed=True):
+        last_day = frame.groupby('username', observed=True)['day_index'].max().to_numpy()
+        if len(last_day) == 0:
+            continue
+        counts = np.bincount(np.minimum(last_day, max_days), minlength=max_days + 1)
+        retention[stage] = (1 - np.concatenate(([0], np.cumsum(counts)[:-1])) / len(last_day)) * 100
+    return pd.DataFrame(retention, index=pd.RangeIndex(max_days + 1, name='day'))
+
+# Check-in export
+EXPORT_COLUMNS = [
+    'username', 'date', 'tasks_completed', 'completed_count', 'missed_tasks',
+    'savings', 'perfect_day', 'penalty_paid', 'distraction_day'
+]
+EXPORT_CHUNK_ROWS = 5000
+
+def checkin_export_frame(username, history, start=0, stop=None):
+    ordinals = history.ordinals[start:stop]
+    masks = history.task_masks[start:stop]
+    task_names = []
+    for ordinal, mask in zip(ordinals.tolist(), masks.tolist()):
+        names = [task for i, task in enumerate(history.tasks) if mask & (1 << i)]
+        names += history.extra_tasks.get(ordinal, [])
+        task_names.append("; ".join(names))
+    return pd.DataFrame({
+        'username': username,
+        'date': [date.fromordinal(ordinal).strftime("%Y-%m-%d") for ordinal in ordinals.tolist()],
+        'tasks_completed': task_names,
+        'completed_count': history.completed_counts()[start:stop].astype(np.int64),
+        'missed_tasks': history.missed[start:stop].astype(np.int64),
+        'savings': history.savings[start:stop],
+        'perfect_day': history.perfect_days()[start:stop].astype(bool),
+        'penalty_paid': history.penalty_days()[start:stop].astype(bool),
+        'distraction_day': history.distraction_days()[start:stop].astype(bool)
+    }, columns=EXPORT_COLUMNS)
+
+def iter_user_checkin_frames(username, history, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(history), chunk_rows):
+        yield checkin_export_frame(username, history, start, start + chunk_rows)
+
+def load_challenge_histories(usernames):
+    refs = [db.collection('challenge_progress').document(username) for username in usernames]
+    with trace_span("firestore.get_all", collection="challenge_progress"):
+        docs = list(db.get_all(refs))
+    return [(doc.id, read_challenge_history(doc.to_dict())) for doc in docs if doc.exists]
+
+def iter_all_checkin_frames(page_size=300, fetch_chunk=50, workers=4):
+    """Yield export frames for every user while keeping only a few chunks in flight"""
+    def fetch(usernames):
+        frames = []
+        for username, history in load_challenge_histories(usernames):
+            frames.extend(iter_user_checkin_frames(username, history))
+        return frames
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for usernames in iter_document_ids('challenge_progress', page_size):
+            for i in range(0, len(usernames), fetch_chunk):
+                pending.append(executor.submit(fetch, usernames[i:i + fetch_chunk]))
+                while len(pending) >= workers * 2:
+                    yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+def write_csv_stream(frames, output):
+    rows = 0
+    for i, frame in enumerate(frames):
+        frame.to_csv(output, header=(i == 0), index=False)
+        rows += len(frame)
+    if rows == 0:
+        pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(output, index=False)
+    return rows
+
+def write_parquet_stream(frames, output):
+    """Write each frame as its own Parquet row group"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([
+        ('username', pa.string()),
+        ('date', pa.string()),
+        ('tasks_completed', pa.string()),
+        ('completed_count', pa.int64()),
+        ('missed_tasks', pa.int64()),
+        ('savings', pa.float64()),
+        ('perfect_day', pa.bool_()),
+        ('penalty_paid', pa.bool_()),
+        ('distraction_day', pa.bool_())
+    ])
+    rows = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        for frame in frames:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            rows += len(frame)
+    return rows
+
+def export_user_checkins(username, history, export_format):
+    output = BytesIO()
+    frames = iter_user_checkin_frames(username, history)
+    if export_format == "Parquet":
+        write_parquet_stream(frames, output)
+    else:
+        write_csv_stream(frames, output)
+    return output.getvalue()
+
+def export_all_checkins(export_format, directory="exports"):
+    """Stream every user's check-ins to a file on disk"""
+    os.makedirs(directory, exist_ok=True)
+    extension = "parquet" if export_format == "Parquet" else "csv"
+    path = os.path.join(directory, f"checkins_{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}")
+    started = time.perf_counter()
+    with open(path, "wb") as output:
+        if export_format == "Parquet":
+            rows = write_parquet_stream(iter_all_checkin_frames(), output)
+        else:
+            rows = write_csv_stream(iter_all_checkin_frames(), output)
+    return {'path': path, 'rows': rows, 'bytes': os.path.getsize(path), 'seconds': time.perf_counter() - started}
+
+def iter_synthetic_checkin_frames(total_rows, chunk_rows=50000, users=1000):
+    tasks = get_stage_tasks("Gold (60 Days - Hard)")
+    rng = np.random.default_rng(0)
+    base_ordinal = date(2024, 1, 1).toordinal()
+    for start in range(0, total_rows, chunk_rows):
+        rows = min(chunk_rows, total_rows - start)
+        index = np.arange(start, start + rows)
+        completed = rng.integers(len(tasks) - 2, len(tasks) + 1, rows)
+        yield pd.DataFrame({
+            'username': [f"user{i % users}" for i in index.tolist()],
+            'date': [date.fromordinal(base_ordinal + i // users).strftime("%Y-%m-%d") for i in index.tolist()],
+            'tasks_completed': ["; ".join(tasks[:count]) for count in completed.tolist()],
+            'completed_count': completed.astype(np.int64),
+            'missed_tasks': (len(tasks) - completed).astype(np.int64),
+            'savings': rng.uniform(0, 20, rows),
+            'perfect_day': completed == len(tasks),
+            'penalty_paid': completed == len(tasks) - 1,
+            'distraction_day': rng.random(rows) < 0.2
+        }, columns=EXPORT_COLUMNS)
+
+def benchmark_checkin_export(total_rows=1000000, chunk_rows=50000):
+    """Stream synthetic check-ins through both writers, reporting time and peak traced memory"""
+    results = []
+    for export_format in ("CSV", "Parquet"):
+        path = os.path.join("exports", f"benchmark.{export_format.lower()}")
+        os.makedirs("exports", exist_ok=True)
+        tracemalloc.start()
+        started = time.perf_counter()
+        with open(path, "wb") as output:
+            frames = iter_synthetic_checkin_frames(total_rows, chunk_rows)
+            if export_format == "Parquet":
+                rows = write_parquet_stream(frames, output)
+            else:
+                rows = write_csv_stream(frames, output)
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({
+            'Format': export_format,
+            'Rows': rows,
+            'Seconds': round(seconds, 2),
+            'Rows/s': int(rows / seconds) if seconds else 0,
+            'Peak Memory (MB)': round(peak / 1024 / 1024, 1),
+            'File Size (MB)': round(os.path.getsize(path) / 1024 / 1024, 1)
+        })
+        os.remove(path)
+    return results
+
+# Bulk check-in import
+IMPORT_BATCH_WRITE_LIMIT = 500
+# Each user writes their challenge document and leaderboard entry; each chunk
+# also merges the histogram deltas and records its progress in the same batch
+IMPORT_WRITES_PER_USER = 2
+IMPORT_USERS_PER_CHUNK = (IMPORT_BATCH_WRITE_LIMIT - len(LEADERBOARD_METRICS) - 1) // IMPORT_WRITES_PER_USER
+IMPORT_COMMIT_ATTEMPTS = 5
+
+def parse_checkin_import(file_name, raw_bytes):
+    """Read an uploaded CSV or JSONL file into username, date, tasks and savings columns"""
+    if file_name.lower().endswith((".jsonl", ".json")):
+        frame = pd.read_json(BytesIO(raw_bytes), lines=True, dtype=False)
+    else:
+        frame = pd.read_csv(BytesIO(raw_bytes), dtype={'username': str, 'date': str})
+    missing = {'username', 'date', 'tasks_completed'} - set(frame.columns)
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+    if 'savings' not in frame.columns:
+        frame['savings'] = 0.0
+    frame = frame[['username', 'date', 'tasks_completed', 'savings']].copy()
+    frame['tasks_completed'] = frame['tasks_completed'].map(
+        lambda value: [task.strip() for task in value] if isinstance(value, list)
+        else [task.strip() for task in str(value).split(";") if task.strip()] if pd.notna(value) else []
+    )
+    frame['savings'] = pd.to_numeric(frame['savings'], errors='coerce').fillna(0.0)
+    frame['username'] = frame['username'].astype(str).str.strip()
+    return frame.reset_index(drop=True)
+
+def validate_checkin_import(frame, stages, start_dates=None):
+    """Validate rows against each user's stage tasks and encode them as history columns.
+
+    Returns the valid rows with ordinal, mask, missed and flag columns, and a
+    list of row errors. Rows that would not count under the challenge rules
+    are rejected the same way the daily check-in form rejects them.
+    """
+    errors = []
+    frame = frame.copy()
+    frame['row'] = frame.index + 2
+    frame['stage'] = frame['username'].map(stages)
+    dates = pd.to_datetime(frame['date'], format="%Y-%m-%d", errors='coerce')
+    
+    def reject(mask, message):
+        for _, row in frame[mask].iterrows():
+            errors.append({'Row': row['row'], 'Username': row['username'], 'Date': row['date'], 'Error': message})
+        return ~mask
+    
+    keep = reject(frame['stage'].isna(), "Unknown user or no challenge started")
+    keep &= reject(keep & dates.isna(), "Invalid date, expected YYYY-MM-DD")
+    keep &= reject(keep & (dates.dt.date >= datetime.now().date()), "Only past days can be imported")
+    start_dates = start_dates or {}
+    before_start = pd.Series([
+        start_dates.get(username) is not None and day.date() < start_dates[username]
+        for username, day in zip(frame['username'], dates.fillna(pd.Timestamp.max))
+    ], index=frame.index)
+    keep &= reject(keep & before_start, "Before the user's challenge started")
+    keep &= reject(keep & frame.duplicated(['username', 'date'], keep='first'), "Duplicate day in file")
+    
+    exploded = frame[keep][['stage', 'tasks_completed']].explode('tasks_completed').dropna()
+    bit_lookup = {
+        (stage, task): 1 << i
+        for stage in exploded['stage'].unique()
+        for i, task in enumerate(get_task_catalogue(TASK_CATALOGUE_VERSION, stage))
+    }
+    bits = pd.Series(
+        [bit_lookup.get(key, -1) for key in zip(exploded['stage'], exploded['tasks_completed'])],
+        index=exploded.index,
+        dtype=np.int64
+    )
+    unknown_rows = bits[bits < 0].index.unique()
+    keep &= reject(frame.index.isin(unknown_rows), "Task not in this user's stage")
+    
+    valid = frame[keep].copy()
+    valid_bits = bits[bits.index.isin(valid.index)]
+    valid['mask'] = valid_bits.groupby(level=0).agg(lambda values: int(np.bitwise_or.reduce(values.to_numpy()))).reindex(valid.index, fill_value=0)
+    valid['completed'] = count_bits(valid['mask'].to_numpy())
+    valid['missed'] = valid['stage'].map(lambda stage: len(get_stage_tasks(stage))) - valid['completed']
+    
+    keep_valid = pd.Series(True, index=valid.index)
+    for mask, message in (
+        (valid['missed'] >= 2, "Missed 2+ tasks, day does not count"),
+        ((valid['missed'] == 1) & (valid['savings'] <= 0), "Missed 1 task without penalty, day does not count")
+    ):
+        for _, row in valid[mask & keep_valid].iterrows():
+            errors.append({'Row': row['row'], 'Username': row['username'], 'Date': row['date'], 'Error': message})
+        keep_valid &= ~mask
+    
+    valid = valid[keep_valid].copy()
+    valid['ordinal'] = dates[valid.index].map(lambda value: value.date().toordinal()).astype(np.int32)
+    valid['flags'] = np.where(valid['missed'] == 0, CHECKIN_PERFECT_DAY, CHECKIN_PENALTY_PAID).astype(np.uint8)
+    return valid, errors
+
+def challenge_start_day(data):
+    start_date = data.get('start_date')
+    return start_date.date() if hasattr(start_date, 'date') else None
+
+def merge_imported_checkins(data, rows):
+    """Merge imported rows into a challenge document and recompute its counters.
+
+    New days past the stage length are not merged; they are returned as the
+    last element so the caller can report them.
+    """
+    history = read_challenge_history(data)
+    new_rows = rows[~rows['ordinal'].isin(history.ordinals)].sort_values('ordinal', kind='stable')
+    room = max(0, get_stage_days(data.get('current_stage') or history.stage) - len(history))
+    overflow = new_rows.iloc[room:]
+    new_rows = new_rows.iloc[:room]
+    ordinals = np.concatenate((history.ordinals, new_rows['ordinal'].to_numpy(dtype=np.int32)))
+    order = np.argsort(ordinals, kind='stable')
+    merged = ChallengeHistory(
+        history.stage,
+        ordinals[order],
+        np.concatenate((history.task_masks, new_rows['mask'].to_numpy(dtype=np.uint32)))[order],
+        np.concatenate((history.missed, new_rows['missed'].to_numpy(dtype=np.int8)))[order],
+        np.concatenate((history.savings, new_rows['savings'].to_numpy(dtype=np.float64)))[order],
+        np.concatenate((history.flags, new_rows['flags'].to_numpy(dtype=np.uint8)))[order],
+        dict(history.extra_tasks),
+        catalogue_version=history.catalogue_version
+    )
+    data = dict(data)
+    data['daily_checkins'] = merged
+    data['completed_days'] = len(merged)
+    data['current_day'] = len(merged) + 1
+    data['total_savings'] = float(merged.savings.sum())
+    data['streak_days'] = streak_summary(merged)['current_streak']
+    # Imported days can land before the last folded one, so the badge
+    # counters are replayed on the next check-in or backfill
+    data.pop('badge_state', None)
+    return data, len(new_rows), len(rows) - len(new_rows) - len(overflow), overflow
+
+def run_checkin_import(file_name, raw_bytes, dry_run=True, workers=4):
+    """Validate and apply a bulk check-in file with chunked batch commits.
+
+    Each chunk is one batch: the users' merged challenge documents, their
+    leaderboard entries, the summed histogram increments and the chunk's
+    progress under imports/<file hash>. Every document write carries the
+    update time it was merged from, so a check-in made meanwhile fails the
+    commit and only that chunk is re-read and merged again. Re-running the
+    same file after a failure skips finished chunks, and rows for days that
+    already exist are skipped, which keeps reruns idempotent.
+    """
+    import_id = hashlib.sha256(raw_bytes).hexdigest()[:32]
+    frame = parse_checkin_import(file_name, raw_bytes)
+    usernames = sorted(frame['username'].unique())
+    
+    snapshots = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunks = [usernames[i:i + 100] for i in range(0, len(usernames), 100)]
+        for chunk in executor.map(
+            lambda names: db.get_all([db.collection('challenge_progress').document(name) for name in names]),
+            chunks
+        ):
+            for doc in chunk:
+                if doc.exists:
+                    snapshots[doc.id] = doc
+    documents = {username: doc.to_dict() for username, doc in snapshots.items()}
+    stages = {username: data.get('current_stage') for username, data in documents.items() if data.get('current_stage')}
+    start_dates = {username: challenge_start_day(data) for username, data in documents.items()}
+    
+    valid, errors = validate_checkin_import(frame, stages, start_dates)
+    
+    updates = {}
+    summary = []
+    overflow_rows = 0
+    for username, rows in valid.groupby('username'):
+        data, added, skipped, overflow = merge_imported_checkins(documents[username], rows)
+        for _, row in overflow.iterrows():
+            errors.append({'Row': row['row'], 'Username': username, 'Date': row['date'], 'Error': "Beyond the stage length"})
+        overflow_rows += len(overflow)
+        if added:
+            updates[username] = rows
+        summary.append({
+            'Username': username,
+            'Imported Days': added,
+            'Already Present': skipped,
+            'Completed Days': data['completed_days'],
+            'Streak Days': data['streak_days'],
+            'Total Savings': data['total_savings']
+        })
+    
+    result = {
+        'import_id': import_id,
+        'rows': len(frame),
+        'valid_rows': len(valid) - overflow_rows,
+        'errors': errors,
+        'summary': summary,
+        'committed_chunks': 0,
+        'skipped_chunks': 0,
+        'retried_chunks': 0
+    }
+    if dry_run or not updates:
+        return result
+    
+    progress_ref = db.collection('imports').document(import_id)
+    progress_doc = progress_ref.get()
+    done_chunks = set(progress_doc.to_dict().get('committed_chunks', [])) if progress_doc.exists else set()
+    if not progress_doc.exists:
+        progress_ref.set({'file_name': file_name, 'rows': len(frame), 'committed_chunks': [], 'started_at': datetime.now()})
+    
+    ordered_users = sorted(updates)
+    chunks = [ordered_users[i:i + IMPORT_USERS_PER_CHUNK] for i in range(0, len(ordered_users), IMPORT_USERS_PER_CHUNK)]
+    
+    def write_chunk(index, docs, entries):
+        batch = db.batch()
+        deltas = {}
+        changed = {}
+        for username in chunks[index]:
+            doc = docs[username]
+            if not doc.exists:
+                continue
+            stored = doc.to_dict()
+            data, added, _, _ = merge_imported_checkins(stored, updates[username])
+            if not added:
+                continue
+            fields = serializable_challenge_data(data)
+            fields.update({key: firestore.DELETE_FIELD for key in stored if key not in fields})
+            batch.update(doc.reference, fields, option=db.write_option(last_update_time=doc.update_time))
+            
+            entry = entries[username]
+            values = leaderboard_values(data)
+            old_values = entry.to_dict() if entry.exists else None
+            if entry.exists:
+                batch.update(entry.reference, leaderboard_entry(data), option=db.write_option(last_update_time=entry.update_time))
+            else:
+                batch.create(entry.reference, leaderboard_entry(data))
+            add_histogram_deltas(deltas, old_values, values)
+            changed[username] = (values, old_values)
+        for metric, counts in deltas.items():
+            histogram_update = histogram_increments(counts)
+            if histogram_update is not None:
+                batch.set(db.collection('leaderboard_histograms').document(metric), histogram_update, merge=True)
+        batch.update(progress_ref, {'committed_chunks': firestore.ArrayUnion([index])})
+        with trace_span("firestore.batch_commit", collection="challenge_progress"):
+            batch.commit()
+        return changed
+    
+    def commit_chunk(index):
+        names = chunks[index]
+        entry_refs = [db.collection('leaderboard_entries').document(username) for username in names]
+        docs = {username: snapshots[username] for username in names}
+        retries = 0
+        while True:
+            with trace_span("firestore.get_all", collection="leaderboard_entries"):
+                entries = {doc.id: doc for doc in db.get_all(entry_refs)}
+            try:
+                changed = write_chunk(index, docs, entries)
+                break
+            except (google_exceptions.FailedPrecondition, google_exceptions.Conflict) as e:
+                retries += 1
+                if retries >= IMPORT_COMMIT_ATTEMPTS:
+                    raise
+            with trace_span("firestore.get_all", collection="challenge_progress"):
+                docs = {doc.id: doc for doc in db.get_all([db.collection('challenge_progress').document(username) for username in names])}
+        for username, (values, old_values) in changed.items():
+            top_writes = 0
+            try:
+                top_writes = update_leaderboard_tops(username, values, old_values)
+                get_leaderboard_stats().record(top_writes)
+            except Exception as e:
+                get_leaderboard_stats().record(top_writes, e)
+        return retries
+    
+    pending = [index for index in range(len(chunks)) if index not in done_chunks]
+    result['skipped_chunks'] = len(chunks) - len(pending)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for retries in executor.map(commit_chunk, pending):
+            result['committed_chunks'] += 1
+            result['retried_chunks'] += int(retries > 0)
+    progress_ref.update({'finished_at': datetime.now()})
+    return result
+
+# Check-in history paging
+HISTORY_PAGE_DAYS = 14
+
+@st.cache_resource
+def get_history_prefetch_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="brain-app-history")
+
+def fetch_checkin_window(username, start_day, end_day):
+    """Read only the check-ins between two dates, newest first, using a field mask"""
+    days = [end_day - timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    field_paths = ['current_stage', 'schema_version', 'task_catalogue_stage', 'task_catalogue_version']
+    field_paths += [f"daily_checkins.`{day.strftime('%Y-%m-%d')}`" for day in days]
+    with trace_span("firestore.get", collection="challenge_progress", window_days=len(days)):
+        doc = db.collection('challenge_progress').document(username).get(field_paths=field_paths)
+    history = read_challenge_history(doc.to_dict() or {}) if doc.exists else ChallengeHistory('')
+    
+    rows = []
+    for day in reversed(history.keys()):
+        checkin = history[day]
+        missed = [task for task in history.tasks if task not in checkin['tasks_completed']]
+        rows.append({
+            'Date': day,
+            'Tasks Done': ", ".join(checkin['tasks_completed']) or "-",
+            'Missed Tasks': ", ".join(missed) or "-",
+            'Savings': checkin['savings_added'],
+            'Perfect Day': checkin['perfect_day'],
+            'Penalty Paid': checkin.get('penalty_paid', False)
+        })
+    return rows
+
+def history_page_window(range_start, range_end, page):
+    window_end = range_end - timedelta(days=page * HISTORY_PAGE_DAYS)
+    window_start = max(range_start, window_end - timedelta(days=HISTORY_PAGE_DAYS - 1))
+    return window_start, window_end, window_start > range_start
+
+def get_history_page(username, range_start, range_end, page):
+    """Return one page of rows and prefetch the following page in the background"""
+    prefetched = st.session_state.setdefault('history_prefetch', {})
+    window_start, window_end, has_next = history_page_window(range_start, range_end, page)
+    
+    future = prefetched.pop((username, window_start, window_end), None)
+    if future is not None:
+        try:
+            rows = future.result()
+        except Exception as e:
+            rows = fetch_checkin_window(username, window_start, window_end)
+    else:
+        rows = fetch_checkin_window(username, window_start, window_end)
+    
+    prefetched.clear()
+    if has_next:
+        next_start, next_end, _ = history_page_window(range_start, range_end, page + 1)
+        prefetched[(username, next_start, next_end)] = get_history_prefetch_executor().submit(
+            fetch_checkin_window, username, next_start, next_end
+        )
+    return rows, window_start, window_end, has_next
+
+def send_sms_reminder(phone_number, message):
+    try:
+        twilio_config = st.secrets.get("twilio", {})
+        twilio_account_sid = twilio_config.get("ACCOUNT_SID", "")
+        twilio_auth_token = twilio_config.get("AUTH_TOKEN", "")
+        twilio_phone_number = twilio_config.get("PHONE_NUMBER", "")
+        
+        if not twilio_account_sid or not twilio_auth_token or not twilio_phone_number:
+            return False, "SMS service configuration incomplete."
+        
+        if not phone_number.startswith('+'):
+            return False, "Phone number must include country code (e.g., +1234567890)"
+        
+        try:
+            from twilio.rest import Client
+            client = Client(twilio_account_sid, twilio_auth_token)
+            message = client.messages.create(
+                body=message,
+                from_=twilio_phone_number,
+                to=phone_number
+            )
+            return True, "SMS reminder sent successfully"
+        except ImportError:
+            return False, "Twilio package not installed"
+        except Exception as e:
+            return False, f"SMS service error: {str(e)}"
+            
+    except Exception as e:
+        return False, f"SMS service unavailable: {str(e)}"
+
+def generate_certificate(username, user_profile, challenge_data):
+    try:
+        pdf = FPDF()
+        pdf.add_page()
+        
+        pdf.set_font('Arial', 'B', 24)
+        pdf.cell(0, 20, 'CERTIFICATE OF ACHIEVEMENT', 0, 1, 'C')
+        pdf.ln(10)
+        
+        pdf.set_font('Arial', 'B', 18)
+        pdf.cell(0, 10, 'This certifies that', 0, 1, 'C')
+        pdf.ln(5)
+        
+        pdf.set_font('Arial', 'B', 22)
+        safe_username = username.encode('latin-1', 'replace').decode('latin-1')
+        pdf.cell(0, 10, safe_username, 0, 1, 'C')
+        pdf.ln(5)
+        
+        pdf.set_font('Arial', 'B', 16)
+        pdf.cell(0, 10, 'has successfully completed the', 0, 1, 'C')
+        pdf.ln(5)
+        
+        current_stage = challenge_data.get('current_stage', 'Brain App Challenge')
+        safe_stage = current_stage.encode('latin-1', 'replace').decode('latin-1')
+        pdf.set_font('Arial', 'B', 18)
+        pdf.cell(0, 10, safe_stage, 0, 1, 'C')
+        pdf.ln(10)
+        
+        pdf.set_font('Arial', '', 12)
+        field = user_profile.get("field", "Not specified")
+        safe_field = field.encode('latin-1', 'replace').decode('latin-1')
+        pdf.cell(0, 8, f'Field: {safe_field}', 0, 1, 'C')
+        
+        goal = user_profile.get("goal", "Not specified")
+        safe_goal = goal.encode('latin-1', 'replace').decode('latin-1')
+        pdf.cell(0, 8, f'Goal: {safe_goal}', 0, 1, 'C')
+        
+        pdf.cell(0, 8, f'Completed Days: {challenge_data.get("completed_days", 0)}', 0, 1, 'C')
+        pdf.cell(0, 8, f'Total Savings: ${challenge_data.get("total_savings", 0)}', 0, 1, 'C')
+        pdf.ln(10)
+        
+        badges = challenge_data.get('badges', [])
+        if badges:
+            pdf.set_font('Arial', 'B', 14)
+            pdf.cell(0, 10, 'Badges Earned:', 0, 1, 'C')
+            pdf.set_font('Arial', '', 12)
+            for badge in badges:
+                safe_badge = badge.encode('latin-1', 'replace').decode('latin-1')
+                pdf.cell(0, 8, f'- {safe_badge}', 0, 1, 'C')
+            pdf.ln(10)
+        
+        pdf.set_font('Arial', 'I', 10)
+        pdf.cell(0, 10, f'Generated on: {datetime.now().strftime("%Y-%m-%d")}', 0, 1, 'C')
+        
+        try:
+            return pdf.output(dest='S').encode('latin-1')
+        except:
+            return pdf.output()
+            
+    except Exception as e:
+        st.error(f"PDF Generation Error: {str(e)}")
+        return None
+
+def generate_certificate_limited(username, user_profile, challenge_data):
+    """generate_certificate for on-demand builds, charged to the user's certificate bucket"""
+    wait = take_rate_limit('certificate', username)
+    if wait:
+        raise RateLimitExceeded('certificate', wait)
+    return generate_certificate(username, user_profile, challenge_data)
+
+# Simple Analytics Visualizations
+def figure_png(fig):
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+    return buffer.getvalue()
+
+def set_day_ticks(ax, count):
+    if count > 10:
+        step = max(1, count//10)
+        ax.set_xticks(range(0, count, step))
+    else:
+        ax.set_xticks(range(count))
+
+def distraction_trend_png(history):
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+    
+    distraction_trend = np.cumsum(history.distraction_days())
+    ax.plot(range(len(history)), distraction_trend, 'navy', linewidth=2, label='Total Distraction Days')
+    ax.set_xlabel('Days')
+    ax.set_ylabel('Cumulative Distraction Days')
+    ax.set_title('Distraction Trend Over Time')
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+    set_day_ticks(ax, len(history))
+    return figure_png(fig)
+
+def savings_progress_png(history):
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+    
+    ax.plot(range(len(history)), history.cumulative_savings(), 'b-', linewidth=2)
+    ax.set_xlabel('Days')
+    ax.set_ylabel('Total Savings ($)')
+    ax.set_title('Savings Progress')
+    ax.grid(True, alpha=0.3)
+    set_day_ticks(ax, len(history))
+    return figure_png(fig)
+
+def calendar_period_range(period, today):
+    if period == "Last 12 Months":
+        return today - timedelta(weeks=CALENDAR_WEEKS - 1), today
+    return date(int(period), 1, 1), min(date(int(period), 12, 31), today)
+
+def checkin_heatmap_png(history, first_day, last_day):
+    grid, first_monday = calendar_grid(history, first_day, last_day)
+    
+    fig = Figure(figsize=(12, 2.4))
+    ax = fig.subplots()
+    cmap = plt.get_cmap('Greens').copy()
+    cmap.set_bad('#ebedf0')
+    ax.imshow(np.ma.masked_invalid(grid), cmap=cmap, vmin=0, vmax=100, aspect='equal')
+    
+    week_starts = [first_monday + timedelta(weeks=week) for week in range(grid.shape[1])]
+    month_ticks = [week for week, day in enumerate(week_starts) if week == 0 or day.month != week_starts[week - 1].month]
+    ax.set_xticks(month_ticks)
+    ax.set_xticklabels([week_starts[week].strftime('%b') for week in month_ticks])
+    ax.set_yticks([0, 2, 4])
+    ax.set_yticklabels(['Mon', 'Wed', 'Fri'])
+    ax.tick_params(length=0)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.set_title('Task Completion Rate by Day')
+    return figure_png(fig)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def period_heatmap_png(username, fingerprint, period, _history):
+    """Calendar heatmap for a past year, cached per user and history version"""
+    return checkin_heatmap_png(_history, *calendar_period_range(period, date.today()))
+
+def analytics_fingerprint(history):
+    if not history:
+        return (0, date.today().toordinal())
+    return (
+        len(history),
+        int(history.ordinals[-1]),
+        int(history.task_masks.sum()),
+        float(history.savings.sum()),
+        int(history.flags.sum()),
+        date.today().toordinal()
+    )
+
+def build_analytics_artifacts(history):
+    """Aggregates and default charts for the analytics page; safe to run off the script thread"""
+    first_day, last_day = calendar_period_range("Last 12 Months", date.today())
+    return {
+        'summary': streak_summary(history),
+        'perfect_days': int(history.perfect_days().sum()),
+        'distraction_days': int(history.distraction_days().sum()),
+        'total_savings': float(history.savings.sum()),
+        'checkin_heatmap': checkin_heatmap_png(history, first_day, last_day),
+        'distraction_trend': distraction_trend_png(history) if len(history) > 1 else None,
+        'savings_progress': savings_progress_png(history) if len(history) > 1 else None
+    }
+
+@st.fragment
+def create_checkin_heatmap(history, artifacts):
+    """GitHub-style calendar of daily completion rates; picking a period reruns only this fragment"""
+    summary = artifacts['summary']
+    
+    st.markdown("#### Check-in Calendar")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Current Streak", f"{summary['current_streak']} days")
+    with col2:
+        st.metric("Longest Streak", f"{summary['longest_streak']} days")
+    with col3:
+        st.metric("Longest Gap", f"{summary['longest_gap']} days")
+    
+    today = date.today()
+    first_year = date.fromordinal(int(history.ordinals[0])).year
+    periods = ["Last 12 Months"] + [str(year) for year in range(today.year, first_year - 1, -1)]
+    period = st.selectbox("Calendar Period", periods, key="calendar_period")
+    if period == "Last 12 Months":
+        st.image(artifacts['checkin_heatmap'], use_container_width=True)
+    else:
+        with trace_span("matplotlib.render", chart="checkin_heatmap"):
+            png = period_heatmap_png(st.session_state.user['username'], analytics_fingerprint(history), period, history)
+        st.image(png, use_container_width=True)
+
+def create_advanced_analytics(challenge_data, user_profile):
+    try:
+        history = get_challenge_history(challenge_data)
+        if not history:
+            st.info("Complete more days to see analytics!")
+            return
+        
+        with trace_span("matplotlib.render", chart="analytics"):
+            artifacts = get_prefetched('analytics', analytics_fingerprint(history), build_analytics_artifacts, history.copy())
+        
+        st.markdown("### Performance Analytics")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Days", len(history))
+        with col2:
+            st.metric("Perfect Days", artifacts['perfect_days'])
+        with col3:
+            st.metric("Distraction Days", artifacts['distraction_days'])
+        with col4:
+            st.metric("Total Savings", f"${artifacts['total_savings']}")
+        
+        create_checkin_heatmap(history, artifacts)
+        
+        if artifacts['distraction_trend'] is not None:
+            st.markdown("#### Distraction Trend")
+            st.image(artifacts['distraction_trend'], use_container_width=True)
+        
+        if artifacts['savings_progress'] is not None:
+            st.markdown("#### Progress Over Time")
+            st.image(artifacts['savings_progress'], use_container_width=True)
+        
+    except Exception as e:
+        st.info("Analytics will be available after you complete more challenge days")
+
+# Prefetching
+def get_prefetch_config():
+    prefetch_config = st.secrets.get("prefetch", {})
+    return {
+        'enabled': str(prefetch_config.get("ENABLED", "true")).lower() == "true",
+        'workers': int(prefetch_config.get("WORKERS", 2)),
+        'max_users': int(prefetch_config.get("MAX_USERS", 100)),
+        'artifacts': [artifact.strip() for artifact in str(prefetch_config.get("ARTIFACTS", "analytics,certificate")).split(",") if artifact.strip()]
+    }
+
+class PrefetchCache:
+    """Artifacts warmed on a small thread pool and kept per user in a bounded LRU.
+
+    Entries are keyed by a fingerprint of the data they were built from, so a
+    stale artifact is just a miss. The first use of each entry is counted as a
+    hit, a wait (still building) or a miss, and entries evicted or replaced
+    before use are counted as unused.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.users = OrderedDict()
+        self.stats = {}
+        self.executor = ThreadPoolExecutor(max_workers=config['workers'], thread_name_prefix="brain-app-prefetch")
+
+    def count(self, artifact, outcome):
+        stats = self.stats.setdefault(artifact, {'scheduled': 0, 'hits': 0, 'waits': 0, 'misses': 0, 'unused': 0, 'errors': 0})
+        stats[outcome] += 1
+
+    def user_entries(self, username):
+        entries = self.users.get(username)
+        if entries is None:
+            entries = self.users[username] = {}
+        self.users.move_to_end(username)
+        while len(self.users) > self.config['max_users']:
+            _, evicted = self.users.popitem(last=False)
+            for artifact, entry in evicted.items():
+                if not entry['used']:
+                    self.count(artifact, 'unused')
+        return entries
+
+    def schedule(self, username, artifact, fingerprint, build, *args):
+        with self.lock:
+            entries = self.user_entries(username)
+            entry = entries.get(artifact)
+            if entry is not None and entry['fingerprint'] == fingerprint:
+                return
+            if entry is not None and not entry['used']:
+                self.count(artifact, 'unused')
+            entries[artifact] = {'fingerprint': fingerprint, 'future': self.executor.submit(build, *args), 'used': False}
+            self.count(artifact, 'scheduled')
+
+    def get(self, username, artifact, fingerprint, build, *args):
+        with self.lock:
+            entry = self.user_entries(username).get(artifact)
+            if entry is not None and entry['fingerprint'] != fingerprint:
+                entry = None
+            if entry is not None:
+                outcome = None if entry['used'] else ('hits' if entry['future'].done() else 'waits')
+                entry['used'] = True
+        if entry is not None:
+            try:
+                result = entry['future'].result()
+                if outcome:
+                    with self.lock:
+                        self.count(artifact, outcome)
+                return result
+            except Exception as e:
+                with self.lock:
+                    self.count(artifact, 'errors')
+        
+        result = build(*args)
+        future = Future()
+        future.set_result(result)
+        with self.lock:
+            self.count(artifact, 'misses')
+            self.user_entries(username)[artifact] = {'fingerprint': fingerprint, 'future': future, 'used': True}
+        return result
+
+    def snapshot(self):
+        with self.lock:
+            rows = []
+            for artifact, stats in sorted(self.stats.items()):
+                served = stats['hits'] + stats['waits'] + stats['misses']
+                rows.append({
+                    'Artifact': artifact,
+                    'Scheduled': stats['scheduled'],
+                    'Hits': stats['hits'],
+                    'Waits': stats['waits'],
+                    'Misses': stats['misses'],
+                    'Unused': stats['unused'],
+                    'Errors': stats['errors'],
+                    'Hit Rate': f"{(stats['hits'] + stats['waits']) / served:.0%}" if served else "-"
+                })
+            return rows, len(self.users)
+
+@st.cache_resource
+def get_prefetch_cache():
+    return PrefetchCache(get_prefetch_config())
+
+def get_prefetched(artifact, fingerprint, build, *args):
+    """Serve an artifact from the prefetch cache, building it now on a miss"""
+    if not get_prefetch_config()['enabled'] or not st.session_state.user:
+        return build(*args)
+    return get_prefetch_cache().get(st.session_state.user['username'], artifact, fingerprint, build, *args)
+
+def stage_complete(user_profile, challenge_data):
+    stage = user_profile.get('stage')
+    return bool(stage) and challenge_data.get('completed_days', 0) >= get_stage_days(stage)
+
+def certificate_inputs(username, user_profile, challenge_data):
+    profile = {key: user_profile.get(key) for key in ('field', 'goal') if key in user_profile}
+    data = {key: challenge_data.get(key) for key in ('current_stage', 'completed_days', 'total_savings') if key in challenge_data}
+    data['badges'] = list(challenge_data.get('badges', []))
+    fingerprint = (json.dumps([profile, data], sort_keys=True, default=str), date.today().toordinal())
+    return fingerprint, (username, profile, data)
+
+def schedule_prefetch():
+    """Warm the artifacts the signed-in user is most likely to open next"""
+    try:
+        config = get_prefetch_config()
+        if not config['enabled'] or not st.session_state.user or not st.session_state.user_profile:
+            return
+        cache = get_prefetch_cache()
+        username = st.session_state.user['username']
+        challenge_data = st.session_state.challenge_data
+        
+        history = get_challenge_history(challenge_data)
+        if 'analytics' in config['artifacts'] and history:
+            cache.schedule(username, 'analytics', analytics_fingerprint(history), build_analytics_artifacts, history.copy())
+        
+        if 'certificate' in config['artifacts'] and stage_complete(st.session_state.user_profile, challenge_data):
+            fingerprint, args = certificate_inputs(username, st.session_state.user_profile, challenge_data)
+            cache.schedule(username, 'certificate', fingerprint, generate_certificate, *args)
+    except Exception as e:
+        pass
+
+# Firebase setup
+class EmulatorCredential(credentials.Base):
+    """Anonymous credential for the local Firestore emulator (FIRESTORE_EMULATOR_HOST)"""
+    def get_credential(self):
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+
+try:
+    if 'firebase' in st.secrets:
+        firebase_secrets = st.secrets["firebase"]
+        
+        if not firebase_admin._apps:
+            cred = credentials.Certificate({
+                "type": firebase_secrets["type"],
+                "project_id": firebase_secrets["project_id"],
+                "private_key_id": firebase_secrets["private_key_id"],
+                "private_key": firebase_secrets["private_key"].replace("\\n", "\n"),
+                "client_email": firebase_secrets["client_email"],
+                "client_id": firebase_secrets["client_id"],
+                "auth_uri": firebase_secrets["auth_uri"],
+                "token_uri": firebase_secrets["token_uri"],
+                "auth_provider_x509_cert_url": firebase_secrets["auth_provider_x509_cert_url"],
+                "client_x509_cert_url": firebase_secrets["client_x509_cert_url"]
+            })
+            firebase_admin.initialize_app(cred)
+        
+        db = firestore.client()
+    elif os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(EmulatorCredential(), {
+                'projectId': os.environ.get("GOOGLE_CLOUD_PROJECT", "demo-brain-app")
+            })
+        
+        db = firestore.client()
+    else:
+        st.error("Firebase configuration not found.")
+        st.stop()
+except Exception as e:
+    st.error("Database connection failed.")
+    st.stop()
+
+# ML Model loading
+@st.cache_resource
+def load_ml_model():
+    try:
+        with open('model.pkl', 'rb') as f:
+            model_data = pickle.load(f)
+        st.session_state.ml_model_loaded = True
+        return model_data
+    except FileNotFoundError:
+        st.session_state.ml_model_loaded = False
+        return None
+    except Exception as e:
+        st.session_state.ml_model_loaded = False
+        return None
+
+model_data = load_ml_model()
+
+def model_input_frame(input_df):
+    """Order, fill and scale raw inputs the way the model was trained"""
+    input_df = input_df.reindex(columns=model_data.get('feature_columns', []), fill_value=0)
+    if 'scaler' in model_data:
+        numeric_cols = model_data.get('numeric_columns', ['hours', 'distraction_count'])
+        input_df[numeric_cols] = model_data['scaler'].transform(input_df[numeric_cols])
+    return input_df
+
+def predict_performance(hours, distraction_count, habits):
+    try:
+        if model_data is None:
+            return 75.0
+            
+        input_data = {}
+        input_data['hours'] = hours
+        input_data['distraction_count'] = distraction_count
+        
+        for col, value in habits.items():
+            input_data[col] = value
+        
+        input_df = model_input_frame(pd.DataFrame([input_data]))
+        
+        with trace_span("model.predict"):
+            prediction = model_data['model'].predict(input_df)[0]
+        prediction = max(1, min(100, prediction))
+        
+        return prediction
+        
+    except Exception as e:
+        return 75.0
+
+# Live cohort percentiles
+class KLLSketch:
+    """Mergeable KLL quantile sketch with a cached CDF for fast rank queries"""
+    __slots__ = ('k', 'compactors', 'size', 'max_size', 'count', 'cdf')
+
+    def __init__(self, k=200):
+        self.k = k
+        self.compactors = []
+        self.size = 0
+        self.max_size = 0
+        self.count = 0
+        self.cdf = None
+        self.grow()
+
+    def grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self.capacity(h) for h in range(len(self.compactors)))
+
+    def capacity(self, height):
+        depth = len(self.compactors) - height - 1
+        return int(np.ceil((2 / 3) ** depth * self.k)) + 1
+
+    def update(self, value):
+        self.compactors[0].append(float(value))
+        self.size += 1
+        self.count += 1
+        self.cdf = None
+        if self.size >= self.max_size:
+            self.compress()
+
+    def compress(self):
+        for height in range(len(self.compactors)):
+            compactor = self.compactors[height]
+            if len(compactor) >= self.capacity(height):
+                if height + 1 >= len(self.compactors):
+                    self.grow()
+                compactor.sort()
+                keep_last = len(compactor) % 2
+                leftover = compactor[-1:] if keep_last else []
+                paired = compactor[:len(compactor) - keep_last]
+                self.compactors[height + 1].extend(paired[random.randint(0, 1)::2])
+                self.compactors[height] = leftover
+                self.size = sum(len(c) for c in self.compactors)
+                break
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.grow()
+        for height, compactor in enumerate(other.compactors):
+            self.compactors[height].extend(compactor)
+        self.count += other.count
+        self.size = sum(len(c) for c in self.compactors)
+        self.cdf = None
+        while self.size >= self.max_size:
+            self.compress()
+
+    def build_cdf(self):
+        values = []
+        weights = []
+        for height, compactor in enumerate(self.compactors):
+            values.extend(compactor)
+            weights.extend([2 ** height] * len(compactor))
+        order = np.argsort(values, kind='stable')
+        self.cdf = (np.asarray(values)[order], np.cumsum(np.asarray(weights, dtype=np.float64)[order]))
+        return self.cdf
+
+    def fractions(self, value):
+        """Fractions of observed values below, equal to and above value"""
+        values, cumulative = self.cdf or self.build_cdf()
+        if len(values) == 0:
+            return None
+        total = cumulative[-1]
+        below_index = int(np.searchsorted(values, value, side='left'))
+        through_index = int(np.searchsorted(values, value, side='right'))
+        below = cumulative[below_index - 1] / total if below_index else 0.0
+        through = cumulative[through_index - 1] / total if through_index else 0.0
+        return below, through - below, 1.0 - through
+
+    def to_dict(self):
+        return {
+            'k': self.k,
+            'count': self.count,
+            'levels': {str(height): list(compactor) for height, compactor in enumerate(self.compactors)}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get('k', 200))
+        levels = data.get('levels', {})
+        while len(sketch.compactors) < len(levels):
+            sketch.grow()
+        for height, compactor in levels.items():
+            sketch.compactors[int(height)] = [float(v) for v in compactor]
+        sketch.count = data.get('count', 0)
+        sketch.size = sum(len(c) for c in sketch.compactors)
+        return sketch
+
+@st.cache_resource
+def get_live_cohort_config():
+    cohort_config = st.secrets.get("live_cohort", {})
+    return {
+        'enabled': str(cohort_config.get("ENABLED", "true")).lower() == "true",
+        'k': int(cohort_config.get("SKETCH_K", 200)),
+        'min_count': int(cohort_config.get("MIN_COUNT", 50)),
+        'flush_seconds': float(cohort_config.get("FLUSH_SECONDS", 30)),
+        'refresh_seconds': float(cohort_config.get("REFRESH_SECONDS", 120)),
+        'per_field': str(cohort_config.get("PER_FIELD", "true")).lower() == "true"
+    }
+
+# Check-in tasks that count as a day of the matching predictor habit
+CHECKIN_HABIT_TASKS = {
+    'avoid_sugar': "Avoid sugar",
+    'avoid_junk_food': "Avoid junk food",
+    'drink_5L_water': "Drink 5 liters of water",
+    'sleep_early': "Sleep before 11 PM",
+    'wakeup_early': "Wake up before 7 AM"
+}
+
+def sketch_key(metric, field=None):
+    return f"{field}|{metric}" if field else metric
+
+class LiveCohort:
+    """Per-metric quantile sketches fed by predictions and check-ins.
+
+    Local updates go into a delta that is periodically merged into the shared
+    Firestore copy inside a transaction, so every process converges on the
+    same cohort without rescanning users. Flushes and refreshes run on a
+    background thread so a page render never waits on Firestore.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.view = {}
+        self.delta = {}
+        self.last_flush = time.time()
+        self.last_refresh = 0
+        self.running = set()
+
+    def run_in_background(self, name, task):
+        """Start task on a daemon thread unless the previous run of name is still going"""
+        with self.lock:
+            if name in self.running:
+                return
+            self.running.add(name)
+        
+        def run():
+            try:
+                task()
+            finally:
+                with self.lock:
+                    self.running.discard(name)
+        
+        threading.Thread(target=run, name=f"live-cohort-{name}", daemon=True).start()
+
+    def record(self, metrics, field=None):
+        keys = [None, field] if field and self.config['per_field'] else [None]
+        with self.lock:
+            for metric, value in metrics.items():
+                for key_field in keys:
+                    key = sketch_key(metric, key_field)
+                    for sketches in (self.view, self.delta):
+                        if key not in sketches:
+                            sketches[key] = KLLSketch(self.config['k'])
+                        sketches[key].update(value)
+        if time.time() - self.last_flush >= self.config['flush_seconds']:
+            self.run_in_background('flush', self.flush)
+
+    def fractions(self, metric, value, field=None):
+        if time.time() - self.last_refresh >= self.config['refresh_seconds']:
+            self.run_in_background('refresh', self.refresh)
+        with self.lock:
+            for key in ([sketch_key(metric, field)] if field else []) + [metric]:
+                sketch = self.view.get(key)
+                if sketch is not None and sketch.count >= self.config['min_count']:
+                    return sketch.fractions(value)
+        return None
+
+    def flush(self):
+        with self.lock:
+            delta = self.delta
+            self.delta = {}
+            self.last_flush = time.time()
+        for key, sketch in delta.items():
+            try:
+                merge_sketch_into_store(key, sketch)
+            except Exception as e:
+                with self.lock:
+                    if key in self.delta:
+                        sketch.merge(self.delta[key])
+                    self.delta[key] = sketch
+
+    def refresh(self):
+        self.last_refresh = time.time()
+        try:
+            with trace_span("firestore.query", collection="quantile_sketches"):
+                docs = list(db.collection('quantile_sketches').stream())
+        except Exception as e:
+            return
+        view = {}
+        for doc in docs:
+            data = doc.to_dict()
+            view[data.get('key', doc.id)] = KLLSketch.from_dict(data)
+        with self.lock:
+            for key, sketch in self.delta.items():
+                if key in view:
+                    view[key].merge(sketch)
+                else:
+                    view[key] = KLLSketch.from_dict(sketch.to_dict())
+            self.view = view
+
+def merge_sketch_into_store(key, sketch):
+    doc_ref = db.collection('quantile_sketches').document(key.replace('/', '_'))
+
+    @firestore.transactional
+    def merge_in_transaction(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        merged = KLLSketch.from_dict(snapshot.to_dict()) if snapshot.exists else KLLSketch(sketch.k)
+        merged.merge(sketch)
+        transaction.set(doc_ref, {**merged.to_dict(), 'key': key, 'updated_at': datetime.now()})
+
+    with trace_span("firestore.transaction", collection="quantile_sketches"):
+        merge_in_transaction(db.transaction())
+
+@st.cache_resource
+def get_live_cohort():
+    return LiveCohort(get_live_cohort_config())
+
+def record_cohort_metrics(metrics, field=None):
+    try:
+        if get_live_cohort_config()['enabled']:
+            get_live_cohort().record(metrics, field)
+    except Exception as e:
+        pass
+
+def score_cohort_rank(score, field=None):
+    """Share of recent predictions in the live cohort that scored worse (higher) than score"""
+    try:
+        if not get_live_cohort_config()['enabled']:
+            return None
+        score_fractions = get_live_cohort().fractions('score', score, field)
+        return score_fractions[2] * 100 if score_fractions else None
+    except Exception as e:
+        return None
+
+def checkin_cohort_metrics(completed_tasks, tasks, savings_amount):
+    metrics = {'daily_savings': savings_amount}
+    for habit, task in CHECKIN_HABIT_TASKS.items():
+        if task in tasks:
+            metrics[habit] = 1 if task in completed_tasks else 0
+    exercise_tasks = [task for task in tasks if "pushups" in task]
+    if exercise_tasks:
+        metrics['exercise_daily'] = 1 if exercise_tasks[0] in completed_tasks else 0
+    return metrics
+
+def calculate_feature_percentiles(hours, distractions, habit_inputs, field=None):
+    try:
+        live_cohort = get_live_cohort() if get_live_cohort_config()['enabled'] else None
+        df = model_data['df'] if model_data is not None else None
+        
+        def fractions(metric, value):
+            if live_cohort is not None:
+                live = live_cohort.fractions(metric, value, field)
+                if live is not None:
+                    return live
+            if df is None:
+                return None
+            column = df[metric]
+            return (column < value).mean(), (column == value).mean(), (column > value).mean()
+        
+        feature_percentiles = {}
+        
+        hours_fractions = fractions('hours', hours)
+        feature_percentiles['Study Hours'] = max(1, hours_fractions[2] * 100) if hours_fractions else 50
+        
+        dist_fractions = fractions('distraction_count', distractions)
+        feature_percentiles['Distraction Control'] = max(1, dist_fractions[0] * 100) if dist_fractions else 50
+        
+        habit_mapping = {
+            'avoid_sugar': 'Sugar Avoidance',
+            'avoid_junk_food': 'Junk Food Avoidance',
+            'drink_5L_water': 'Water Intake',
+            'sleep_early': 'Sleep Schedule',
+            'exercise_daily': 'Exercise Routine',
+            'wakeup_early': 'Wake-up Time'
+        }
+        
+        for col, friendly_name in habit_mapping.items():
+            habit_value = habit_inputs[col]
+            habit_fractions = fractions(col, habit_value)
+            if habit_fractions is None:
+                feature_percentiles[friendly_name] = 50
+            elif habit_value == 1:
+                feature_percentiles[friendly_name] = max(1, 100 - habit_fractions[1] * 100)
+            else:
+                feature_percentiles[friendly_name] = max(1, habit_fractions[1] * 100)
+        
+        return feature_percentiles
+    except Exception as e:
+        return {
+            'Study Hours': 50,
+            'Distraction Control': 50,
+            'Sugar Avoidance': 50,
+            'Junk Food Avoidance': 50,
+            'Water Intake': 50,
+            'Sleep Schedule': 50,
+            'Exercise Routine': 50,
+            'Wake-up Time': 50
+        }
+
+# What-if optimizer
+WHAT_IF_HABITS = {
+    'avoid_sugar': "Avoid sugar",
+    'avoid_junk_food': "Avoid junk food",
+    'drink_5L_water': "Drink 5L water",
+    'sleep_early': "Sleep before 11 PM",
+    'exercise_daily': "Exercise daily",
+    'wakeup_early': "Wake up before 7 AM"
+}
+WHAT_IF_HOUR_STEPS = 2
+WHAT_IF_DISTRACTION_STEPS = 3
+WHAT_IF_MAX_HOURS = 12
+WHAT_IF_MAX_DISTRACTIONS = 20
+
+def what_if_candidates(hours, distraction_count, habit_values):
+    """Every combination of habit flips and nearby hours/distraction values around the current inputs"""
+    habits = np.array(habit_values, dtype=np.int64)
+    flips = (np.arange(1 << len(habits))[:, None] >> np.arange(len(habits))) & 1
+    hour_values = np.arange(max(0, hours - WHAT_IF_HOUR_STEPS), min(WHAT_IF_MAX_HOURS, hours + WHAT_IF_HOUR_STEPS) + 1)
+    distraction_values = np.arange(
+        max(0, distraction_count - WHAT_IF_DISTRACTION_STEPS),
+        min(WHAT_IF_MAX_DISTRACTIONS, distraction_count + WHAT_IF_DISTRACTION_STEPS) + 1
+    )
+    
+    flip_index, hour_index, distraction_index = np.meshgrid(
+        np.arange(len(flips)), np.arange(len(hour_values)), np.arange(len(distraction_values)), indexing='ij'
+    )
+    flip_index = flip_index.ravel()
+    candidates = pd.DataFrame(habits ^ flips[flip_index], columns=list(WHAT_IF_HABITS))
+    candidates['hours'] = hour_values[hour_index.ravel()]
+    candidates['distraction_count'] = distraction_values[distraction_index.ravel()]
+    candidates['cost'] = (
+        flips.sum(axis=1)[flip_index]
+        + np.abs(candidates['hours'].to_numpy() - hours)
+        + np.abs(candidates['distraction_count'].to_numpy() - distraction_count)
+    )
+    return candidates
+
+def describe_what_if_change(row, hours, distraction_count, habit_values):
+    changes = []
+    for (habit, label), current in zip(WHAT_IF_HABITS.items(), habit_values):
+        if row[habit] != current:
+            changes.append(f"Start: {label}" if row[habit] else f"Stop: {label}")
+    hour_change = int(row['hours']) - hours
+    if hour_change:
+        changes.append(f"{hour_change:+d} study hour{'s' if abs(hour_change) > 1 else ''}")
+    distraction_change = int(row['distraction_count']) - distraction_count
+    if distraction_change:
+        changes.append(f"{distraction_change:+d} distraction{'s' if abs(distraction_change) > 1 else ''}")
+    return ", ".join(changes)
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def what_if_search(hours, distraction_count, habit_values, limit=5):
+    """Score all neighbouring inputs in one batch and rank the cheapest improvements.
+    
+    Scores are "top X%" so lower is better; gain is the drop in predicted score.
+    Returns the baseline score, the best single-step changes and the cheapest
+    change found for each level of gain.
+    """
+    if model_data is None:
+        return None
+    
+    candidates = what_if_candidates(hours, distraction_count, habit_values)
+    features = model_input_frame(candidates)
+    
+    with trace_span("model.predict", rows=len(features)):
+        scores = np.clip(model_data['model'].predict(features), 1, 100)
+    candidates['score'] = scores
+    baseline = float(scores[candidates['cost'].to_numpy() == 0][0])
+    candidates['gain'] = baseline - scores
+    improving = candidates[candidates['gain'] > 0]
+    
+    def ranked(rows):
+        return pd.DataFrame({
+            'Change': [describe_what_if_change(row, hours, distraction_count, habit_values) for _, row in rows.iterrows()],
+            'Steps': rows['cost'].to_numpy(),
+            'Predicted Score': rows['score'].astype(float).round(1).to_numpy(),
+            'Gain': rows['gain'].astype(float).round(1).to_numpy()
+        })
+    
+    single_changes = improving[improving['cost'] == 1].sort_values('gain', ascending=False).head(limit)
+    
+    best_per_cost = improving.loc[improving.groupby('cost')['gain'].idxmax()].sort_values('cost')
+    frontier = best_per_cost[best_per_cost['gain'] > best_per_cost['gain'].cummax().shift(fill_value=0)]
+    
+    return {
+        'baseline': baseline,
+        'candidates': len(candidates),
+        'single_changes': ranked(single_changes),
+        'frontier': ranked(frontier.head(limit))
+    }
+
+# Prediction explanations
+EXPLANATION_CACHE_SIZE = 4096
+EXPLANATION_BACKGROUND_ROWS = 64
+FEATURE_LABELS = {
+    'hours': 'Study Hours',
+    'distraction_count': 'Distractions',
+    'avoid_sugar': 'Sugar Avoidance',
+    'avoid_junk_food': 'Junk Food Avoidance',
+    'drink_5L_water': 'Water Intake',
+    'sleep_early': 'Sleep Schedule',
+    'exercise_daily': 'Exercise Routine',
+    'wakeup_early': 'Wake-up Time'
+}
+
+def tree_path_contributions(model, features):
+    """Exact per-feature contributions from the tree paths, or None if the model has no tree booster"""
+    get_booster = getattr(model, 'get_booster', None)
+    if get_booster is None:
+        return None
+    try:
+        from xgboost import DMatrix
+        contributions = get_booster().predict(DMatrix(features), pred_contribs=True)[0]
+    except Exception as e:
+        return None
+    return float(contributions[-1]), dict(zip(features.columns, contributions[:-1].astype(float))), float(contributions.sum())
+
+def perturbation_contributions(model, raw_inputs):
+    """Contribution of each feature as the expected prediction change from replacing it with training values.
+    
+    Every (feature, background row) replacement is scored in a single batch.
+    The contributions need not add up to prediction - base; the remainder
+    comes from feature interactions.
+    """
+    columns = list(raw_inputs.columns)
+    values = raw_inputs.iloc[0].to_numpy(dtype=float)
+    df = model_data.get('df')
+    if df is not None and all(col in df for col in columns):
+        background = df[columns].sample(min(len(df), EXPLANATION_BACKGROUND_ROWS), random_state=0).to_numpy(dtype=float)
+    else:
+        background = np.zeros((1, len(columns)))
+    
+    batch = np.tile(values, (len(columns), len(background), 1))
+    feature_index = np.arange(len(columns))
+    batch[feature_index, :, feature_index] = background.T
+    batch = np.concatenate((batch.reshape(-1, len(columns)), background, values[None, :]))
+    
+    predictions = model.predict(model_input_frame(pd.DataFrame(batch, columns=columns)))
+    replaced = predictions[:len(columns) * len(background)].reshape(len(columns), len(background)).mean(axis=1)
+    base = float(predictions[-len(background) - 1:-1].mean())
+    prediction = float(predictions[-1])
+    return base, {col: prediction - float(replaced[i]) for i, col in enumerate(columns)}, prediction
+
+@st.cache_data(max_entries=EXPLANATION_CACHE_SIZE, show_spinner=False)
+def explain_prediction(hours, distraction_count, habit_values):
+    """Per-feature contributions to the raw model output for one input tuple"""
+    if model_data is None:
+        return None
+    
+    raw_inputs = pd.DataFrame([{'hours': hours, 'distraction_count': distraction_count, **dict(zip(WHAT_IF_HABITS, habit_values))}])
+    raw_inputs = raw_inputs.reindex(columns=model_data.get('feature_columns', []), fill_value=0)
+    model = model_data['model']
+    
+    with trace_span("model.explain"):
+        explanation = tree_path_contributions(model, model_input_frame(raw_inputs))
+        method = 'tree_path'
+        if explanation is None:
+            explanation = perturbation_contributions(model, raw_inputs)
+            method = 'perturbation'
+    
+    base, contributions, prediction = explanation
+    return {
+        'method': method,
+        'base': base,
+        'interactions': prediction - base - sum(contributions.values()),
+        'output': float(max(1, min(100, prediction))),
+        'contributions': {FEATURE_LABELS.get(col, col): value for col, value in contributions.items()}
+    }
+
+def create_contribution_waterfall(explanation):
+    """Waterfall from the average prediction to this prediction, one bar per feature.
+
+    Whatever the features do not account for is shown as an Interactions bar,
+    and Your Score is the clamped score predict_performance returns.
+    """
+    contributions = sorted(explanation['contributions'].items(), key=lambda item: abs(item[1]), reverse=True)
+    if abs(explanation['interactions']) >= 0.05:
+        contributions.append(('Interactions', explanation['interactions']))
+    labels = ['Average User'] + [label for label, _ in contributions] + ['Your Score']
+    
+    with trace_span("matplotlib.render", chart="contribution_waterfall"):
+        fig, ax = plt.subplots(figsize=(12, 6))
+        
+        running = explanation['base']
+        ax.bar(0, running, color='gray', alpha=0.7)
+        for i, (_, value) in enumerate(contributions, start=1):
+            ax.bar(i, value, bottom=running, color='green' if value < 0 else 'red', alpha=0.7)
+            ax.text(i, max(running, running + value) + 0.5, f'{value:+.1f}', ha='center', va='bottom')
+            running += value
+        ax.bar(len(labels) - 1, explanation['output'], color='navy', alpha=0.7)
+        
+        ax.set_xticks(range(len(labels)))
+        ax.set_xticklabels(labels)
+        ax.set_ylabel('Predicted Score (%)')
+        ax.set_title('What Moved Your Score (Green = Better, Red = Worse)')
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        st.pyplot(fig)
+
+# Prediction history
+PREDICTION_TREND_PAGE_SIZE = 50
+
+def get_prediction_log_config():
+    log_config = st.secrets.get("prediction_log", {})
+    return {
+        'enabled': str(log_config.get("ENABLED", "true")).lower() == "true",
+        'flush_size': int(log_config.get("FLUSH_SIZE", 50)),
+        'flush_seconds': float(log_config.get("FLUSH_SECONDS", 10)),
+        'max_buffer': int(log_config.get("MAX_BUFFER", 5000))
+    }
+
+@st.cache_resource
+def get_model_version():
+    try:
+        with open('model.pkl', 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except Exception as e:
+        return "unknown"
+
+def prediction_log_ref(username):
+    return db.collection('prediction_logs').document(username).collection('predictions')
+
+class PredictionLogBuffer:
+    """Per-process buffer of prediction log entries written in batches.
+
+    A background thread flushes when FLUSH_SIZE entries are waiting or every
+    FLUSH_SECONDS, so a prediction click costs no Firestore round-trip.
+    Document ids are assigned on append, which makes a retried batch
+    overwrite rather than duplicate entries.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = []
+        self.in_flight = []
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name="brain-app-prediction-log", daemon=True)
+        self.thread.start()
+
+    def append(self, username, entry):
+        doc_id = f"{entry['created_at'].strftime('%Y%m%d%H%M%S%f')}-{secrets.token_hex(4)}"
+        with self.lock:
+            self.pending.append((username, doc_id, entry))
+            overflow = len(self.pending) - self.config['max_buffer']
+            if overflow > 0:
+                del self.pending[:overflow]
+                self.dropped += overflow
+            full = len(self.pending) >= self.config['flush_size']
+        if full:
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.config['flush_seconds'])
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                entries = self.pending
+                self.pending = []
+                self.in_flight = entries
+            try:
+                for start in range(0, len(entries), IMPORT_BATCH_WRITE_LIMIT):
+                    chunk = entries[start:start + IMPORT_BATCH_WRITE_LIMIT]
+                    batch = db.batch()
+                    for username, doc_id, entry in chunk:
+                        batch.set(prediction_log_ref(username).document(doc_id), entry)
+                    try:
+                        with trace_span("firestore.batch_commit", collection="prediction_logs", writes=len(chunk)):
+                            batch.commit()
+                    except Exception as e:
+                        with self.lock:
+                            self.pending[:0] = entries[start:]
+                        return
+                    self.flushed += len(chunk)
+                    self.batches += 1
+            finally:
+                with self.lock:
+                    self.in_flight = []
+
+    def unflushed(self, username):
+        with self.lock:
+            return [(doc_id, entry) for user, doc_id, entry in self.in_flight + self.pending if user == username]
+
+@st.cache_resource
+def get_prediction_log():
+    return PredictionLogBuffer(get_prediction_log_config())
+
+def log_prediction(username, results, field=None):
+    try:
+        if not get_prediction_log_config()['enabled']:
+            return
+        get_prediction_log().append(username, {
+            'created_at': datetime.now(),
+            'hours': results['hours'],
+            'distraction_count': results['distractions'],
+            'habits': dict(results['habits']),
+            'distraction_types': list(results['distraction_types']),
+            'score': float(results['score']),
+            'model_version': get_model_version(),
+            'field': field
+        })
+    except Exception as e:
+        pass
+
+def load_prediction_page(username, cursor=None, page_size=PREDICTION_TREND_PAGE_SIZE):
+    """Return one page of predictions, newest first, and the cursor for the next page.
+    
+    The first page also includes entries still waiting in this process's buffer.
+    """
+    query = prediction_log_ref(username).order_by('created_at', direction=firestore.Query.DESCENDING).limit(page_size)
+    if cursor is not None:
+        query = query.start_after({'created_at': cursor})
+    with trace_span("firestore.query", collection="prediction_logs"):
+        entries = [(doc.id, doc.to_dict()) for doc in query.stream()]
+    next_cursor = entries[-1][1]['created_at'] if len(entries) == page_size else None
+    
+    if cursor is None and get_prediction_log_config()['enabled']:
+        stored_ids = {doc_id for doc_id, _ in entries}
+        unflushed = [item for item in get_prediction_log().unflushed(username) if item[0] not in stored_ids]
+        entries = sorted(unflushed, key=lambda item: item[1]['created_at'], reverse=True) + entries
+    return [entry for _, entry in entries], next_cursor
+
+def show_prediction_trend(username):
+    st.markdown("### Your Prediction Trend")
+    cursors = st.session_state.setdefault('prediction_trend_cursors', [None])
+    
+    try:
+        entries, next_cursor = load_prediction_page(username, cursors[-1])
+    except Exception as e:
+        st.error("Could not load prediction history. Please try again.")
+        return
+    
+    if not entries:
+        st.info("Your predictions will appear here once you make them.")
+        return
+    
+    entries = entries[::-1]
+    times = [entry['created_at'] for entry in entries]
+    scores = [entry['score'] for entry in entries]
+    
+    with trace_span("matplotlib.render", chart="prediction_trend"):
+        fig, ax = plt.subplots(figsize=(10, 4))
+        ax.plot(times, scores, 'navy', marker='o', linewidth=2)
+        ax.set_ylabel('Predicted Score (%)')
+        ax.set_title('Predicted Score Over Time (Lower = Better)')
+        ax.set_ylim(0, 100)
+        ax.grid(True, alpha=0.3)
+        fig.autofmt_xdate()
+        st.pyplot(fig)
+    
+    st.caption(f"Showing {times[0].strftime('%b %d, %Y %H:%M')} - {times[-1].strftime('%b %d, %Y %H:%M')}")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(cursors) > 1 and st.button("Newer Predictions", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if next_cursor is not None and st.button("Older Predictions", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def get_distraction_trend(challenge_data):
+    """Calculate distraction trend from challenge data"""
+    try:
+        history = get_challenge_history(challenge_data)
+        if not history:
+            return "No data yet"
+        
+        total_days = len(history)
+        distraction_days = int(history.distraction_days().sum())
+        
+        if total_days == 0:
+            return "No data"
+        
+        distraction_rate = (distraction_days / total_days) * 100
+        if distraction_rate <= 20:
+            return f"Excellent ({distraction_rate:.1f}% distraction days)"
+        elif distraction_rate <= 40:
+            return f"Good ({distraction_rate:.1f}% distraction days)"
+        elif distraction_rate <= 60:
+            return f"Average ({distraction_rate:.1f}% distraction days)"
+        else:
+            return f"Needs Improvement ({distraction_rate:.1f}% distraction days)"
+            
+    except Exception as e:
+        return "Calculating..."
+
+def show_sidebar_content():
+    load_user_data()
+    if st.session_state.user:
+        with st.sidebar:
+            sidebar_content()
+
+@st.fragment
+def sidebar_content():
+    """Navigation and the user's summary; sidebar widgets rerun only this fragment, navigation reruns the app"""
+    with fragment_rerun():
+        sidebar_panel()
+
+def sidebar_panel():
+    if st.session_state.user:
+        st.markdown("### Navigation")
+        
+        if st.button("Performance Predictor", use_container_width=True):
+            st.session_state.page = "ml_dashboard"
+            st.rerun()
+            
+        if st.button("Life Vision", use_container_width=True):
+            st.session_state.page = "life_vision"
+            st.rerun()
+            
+        if st.button("Challenge Rules", use_container_width=True):
+            st.session_state.page = "challenge_rules"
+            st.rerun()
+        
+        if st.session_state.user_profile:
+            if st.button("Daily Challenge", use_container_width=True):
+                st.session_state.page = "daily_challenge"
+                st.rerun()
+            
+            if st.button("Advanced Analytics", use_container_width=True):
+                st.session_state.page = "analytics"
+                st.rerun()
+            
+            if st.button("Check-in History", use_container_width=True):
+                st.session_state.page = "history"
+                st.rerun()
+            
+            if st.button("Leaderboard", use_container_width=True):
+                st.session_state.page = "leaderboard"
+                st.rerun()
+            
+            if st.button("Partners", use_container_width=True):
+                st.session_state.page = "partners"
+                st.rerun()
+            
+            if stage_complete(st.session_state.user_profile, st.session_state.challenge_data):
+                if st.button("My Certificate", use_container_width=True):
+                    st.session_state.page = "certificate"
+                    st.rerun()
+        
+        if not st.session_state.user_profile:
+            if st.button("Setup Profile", use_container_width=True):
+                st.session_state.page = "setup_profile"
+                st.rerun()
+        
+        if st.session_state.user_profile:
+            if st.button("Edit Profile", use_container_width=True):
+                st.session_state.page = "edit_profile"
+                st.rerun()
+        
+        st.markdown("---")
+        st.markdown("### My Profile")
+        st.write(f"**Username:** {st.session_state.user['username']}")
+        st.write(f"**Email:** {st.session_state.user['email']}")
+        
+        if st.session_state.user_profile:
+            st.markdown("---")
+            st.markdown("### My Goals")
+            st.write(f"**Field:** {st.session_state.user_profile.get('field', 'Not set')}")
+            st.write(f"**Goal:** {st.session_state.user_profile.get('goal', 'Not set')}")
+            st.write(f"**Stage:** {st.session_state.user_profile.get('stage', 'Not set')}")
+            
+            if st.session_state.challenge_data:
+                distraction_trend = get_distraction_trend(st.session_state.challenge_data)
+                st.write(f"**Distraction Trend:** {distraction_trend}")
+            
+        if st.session_state.challenge_data:
+            st.markdown("---")
+            st.markdown("### My Progress")
+            st.write(f"**Current Day:** {st.session_state.challenge_data.get('current_day', 1)}")
+            st.write(f"**Streak Days:** {st.session_state.challenge_data.get('streak_days', 0)}")
+            st.write(f"**Total Savings:** ${st.session_state.challenge_data.get('total_savings', 0)}")
+        
+        if st.session_state.user.get('role') == 'admin':
+            st.markdown("---")
+            st.markdown("### Admin")
+            profiling_config = get_profiling_config()
+            profile_reruns = st.number_input(
+                "Reruns to profile",
+                min_value=1,
+                max_value=profiling_config['max_reruns'],
+                value=min(profiling_config['default_reruns'], profiling_config['max_reruns'])
+            )
+            if st.button("Profile Next Reruns", use_container_width=True):
+                st.session_state.profile_reruns_remaining = int(profile_reruns)
+                st.rerun()
+            if st.session_state.profile_reruns_remaining > 0:
+                st.caption(f"Profiling active: {st.session_state.profile_reruns_remaining} reruns left")
+            if st.button("Admin Dashboard", use_container_width=True):
+                st.session_state.page = "admin"
+                st.rerun()
+            if st.button("Cohort Analytics", use_container_width=True):
+                st.session_state.page = "cohort_analytics"
+                st.rerun()
+        
+        st.markdown("---")
+        if st.button("Logout", use_container_width=True):
+            st.session_state.user = None
+            st.session_state.user_profile = {}
+            st.session_state.challenge_data = {}
+            st.session_state.loaded_user_data = set()
+            st.session_state.page = "signin"
+            st.session_state.prediction_results = None
+            clear_persistent_login()
+            st.rerun()
+
+# FIXED: Improved persistent login check - NO MORE LOGOUT ON REFRESH
+def check_persistent_login():
+    if st.session_state.user is None and not st.session_state.initialized:
+        try:
+            token = st.query_params.get(SESSION_QUERY_KEY)
+            user = verify_session_token(token) if token else None
+            if user is not None:
+                st.session_state.user = user
+                st.session_state.loaded_user_data = set()
+                st.session_state.initialized = True
+                if not restore_external_session(token, user):
+                    st.session_state.page = "life_vision"  # Redirect to main page
+            else:
+                for key in (SESSION_QUERY_KEY,) + LEGACY_LOGIN_QUERY_KEYS:
+                    if key in st.query_params:
+                        del st.query_params[key]
+        except Exception as e:
+            pass
+
+def load_user_data():
+    """Load the signed-in user's profile and challenge data the first time a page needs them"""
+    if not st.session_state.user:
+        return
+    loaded = st.session_state.loaded_user_data
+    username = st.session_state.user['username']
+    try:
+        if 'user_profile' not in loaded:
+            profile_doc = cached_live_document('user_profiles', username)
+            if profile_doc is None:
+                with trace_span("firestore.get", collection="user_profiles"):
+                    profile_doc = db.collection('user_profiles').document(username).get()
+            st.session_state.user_profile = profile_doc.to_dict() if profile_doc.exists else {}
+            loaded.add('user_profile')
+        if 'challenge_data' not in loaded:
+            st.session_state.challenge_data = load_challenge_data(username)
+            loaded.add('challenge_data')
+    except Exception as e:
+        pass
@@ -0,0 +1 @@
+"""Page modules, each imported by app.py the first time its page is visited"""
@@ -0,0 +1,244 @@
+"""Admin dashboard page"""
+import streamlit as st
+import pandas as pd
+import os
+
+from core import (
+    CHECKIN_MIGRATION_ID,
+    backfill_badges,
+    benchmark_checkin_export,
+    benchmark_partner_feeds,
+    db,
+    export_all_checkins,
+    get_leaderboard_stats,
+    get_listener_config,
+    get_live_document_hub,
+    get_prefetch_cache,
+    get_prefetch_config,
+    get_rate_limit_stats,
+    get_runtime_session_manager,
+    get_session_memory_config,
+    get_session_memory_registry,
+    get_session_store,
+    get_session_store_config,
+    get_unit_of_work_stats,
+    migrate_challenge_documents,
+    persistent_login_enabled,
+    rebuild_leaderboards,
+    run_checkin_import,
+    session_state_sizes,
+    show_sidebar_content
+)
+
+# Admin Page
+def admin_page():
+    if not st.session_state.user or st.session_state.user.get('role') != 'admin':
+        st.session_state.page = "life_vision"
+        st.rerun()
+        return
+    
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Admin Dashboard</h1>", unsafe_allow_html=True)
+    
+    st.markdown("### Session Memory")
+    if get_runtime_session_manager() is None:
+        st.warning("This Streamlit version does not expose the session manager the app relies on. Idle session eviction and live document pushes are disabled.")
+    registry = get_session_memory_registry()
+    sessions = registry.snapshot()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Tracked Sessions", len(sessions))
+    with col2:
+        st.metric("Total Memory", f"{sum(row['Total (KB)'] for row in sessions) / 1024:.1f} MB")
+    with col3:
+        st.metric("Evictions", registry.evictions)
+    
+    if sessions:
+        st.dataframe(pd.DataFrame(sessions), use_container_width=True, hide_index=True)
+    
+    st.markdown("#### This Session")
+    key_sizes = session_state_sizes()
+    sizes_df = pd.DataFrame(
+        sorted(key_sizes.items(), key=lambda item: item[1], reverse=True),
+        columns=['Key', 'Bytes']
+    )
+    st.dataframe(sizes_df, use_container_width=True, hide_index=True)
+    
+    if st.button("Evict Idle Sessions Now", use_container_width=True, disabled=get_runtime_session_manager() is None):
+        config = get_session_memory_config()
+        registry.sweep(config['idle_seconds'], config['max_total_bytes'])
+        st.rerun()
+    
+    st.markdown("---")
+    st.markdown("### Live Listeners")
+    listener_stats = get_live_document_hub().snapshot()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Open Listeners", f"{listener_stats['listeners']} / {get_listener_config()['max_listeners']}")
+    with col2:
+        st.metric("Watched Users", listener_stats['users'])
+    with col3:
+        st.metric("Updates Received", listener_stats['updates'])
+    with col4:
+        st.metric("Reruns Pushed", listener_stats['reruns_requested'])
+    
+    st.markdown("---")
+    st.markdown("### Session Store")
+    store_config = get_session_store_config()
+    if get_session_store() is None:
+        st.info("Sessions are kept in this process only. Set [session_store] BACKEND to sqlite or redis to share them across replicas.")
+    else:
+        if not persistent_login_enabled():
+            st.warning("[session] SECRET_KEY is empty, so sign-ins are not kept across reloads. Set it to enable the shared session store.")
+        saved = st.session_state.get('session_store_saved')
+        st.caption(f"Backend: {store_config['backend']} · TTL {store_config['ttl_seconds'] / 3600:.0f} h · this session's record {saved[2] if saved else 0} bytes")
+    
+    st.markdown("---")
+    st.markdown("### Rate Limits")
+    limit_stats = get_rate_limit_stats()
+    limit_rows = limit_stats.snapshot()
+    if limit_rows:
+        st.metric("Requests Throttled", sum(row['Throttled (user)'] + row['Throttled (IP)'] for row in limit_rows))
+        st.dataframe(pd.DataFrame(limit_rows), use_container_width=True, hide_index=True)
+    else:
+        st.info("No rate-limited operations have run in this process yet.")
+    if limit_stats.shared_errors:
+        st.warning(f"The shared bucket store failed {limit_stats.shared_errors} times; local buckets were used instead.")
+    
+    st.markdown("---")
+    st.markdown("### Prefetching")
+    prefetch_rows, prefetch_users = get_prefetch_cache().snapshot()
+    st.caption(f"{prefetch_users} users cached (limit {get_prefetch_config()['max_users']})")
+    if prefetch_rows:
+        st.dataframe(pd.DataFrame(prefetch_rows), use_container_width=True, hide_index=True)
+    else:
+        st.info("Nothing has been prefetched in this process yet.")
+    
+    st.markdown("---")
+    st.markdown("### Write Batching")
+    unit_stats = get_unit_of_work_stats().snapshot()
+    if unit_stats:
+        st.metric("Round-trips Saved", sum(stats['Round-trips Saved'] for stats in unit_stats))
+        st.dataframe(pd.DataFrame(unit_stats), use_container_width=True, hide_index=True)
+    else:
+        st.info("No batched handlers have committed in this process yet.")
+    
+    st.markdown("---")
+    st.markdown("### Check-in Export")
+    col1, col2 = st.columns(2)
+    with col1:
+        all_export_format = st.selectbox("Export format", ["CSV", "Parquet"], key="all_export_format")
+    with col2:
+        st.write("")
+        run_export = st.button("Export All Users", use_container_width=True)
+    if run_export:
+        with st.spinner("Streaming all check-ins to disk..."):
+            export = export_all_checkins(all_export_format)
+        st.success(f"Wrote {export['rows']} rows ({export['bytes'] / 1024 / 1024:.1f} MB) to {export['path']} in {export['seconds']:.1f}s")
+        if export['bytes'] <= 50 * 1024 * 1024:
+            with open(export['path'], "rb") as export_file:
+                st.download_button(
+                    label="Download Export",
+                    data=export_file,
+                    file_name=os.path.basename(export['path']),
+                    use_container_width=True
+                )
+    if st.button("Benchmark Export (1M synthetic check-ins)", use_container_width=True):
+        with st.spinner("Running export benchmark..."):
+            st.dataframe(pd.DataFrame(benchmark_checkin_export()), use_container_width=True, hide_index=True)
+    
+    st.markdown("---")
+    st.markdown("### Bulk Check-in Import")
+    st.caption("CSV or JSONL with username, date (YYYY-MM-DD), tasks_completed (task names separated by ';') and optional savings.")
+    import_file = st.file_uploader("Check-in file", type=["csv", "jsonl", "json"], key="import_file")
+    dry_run = st.checkbox("Dry run (validate only)", value=True)
+    if import_file is not None and st.button("Run Import", use_container_width=True):
+        try:
+            with st.spinner("Importing check-ins..."):
+                result = run_checkin_import(import_file.name, import_file.getvalue(), dry_run=dry_run)
+            st.info(f"{result['valid_rows']} of {result['rows']} rows valid.")
+            if result['errors']:
+                st.warning(f"{len(result['errors'])} rows rejected")
+                st.dataframe(pd.DataFrame(result['errors']), use_container_width=True, hide_index=True)
+            if result['summary']:
+                st.dataframe(pd.DataFrame(result['summary']), use_container_width=True, hide_index=True)
+            if not dry_run:
+                st.success(f"Imported {result['committed_chunks']} chunks of users ({result['skipped_chunks']} already done, {result['retried_chunks']} retried after concurrent check-ins).")
+        except Exception as e:
+            st.error(f"Import failed: {str(e)}. Run it again to resume.")
+    
+    st.markdown("---")
+    st.markdown("### Leaderboards")
+    leaderboard_stats = get_leaderboard_stats().snapshot()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Updates", leaderboard_stats['updates'])
+    with col2:
+        st.metric("Top-K Writes", leaderboard_stats['top_writes'])
+    with col3:
+        st.metric("Failed Updates", leaderboard_stats['failures'])
+    if leaderboard_stats['last_error']:
+        st.warning(f"Last leaderboard update failed ({leaderboard_stats['last_error']}). Rebuild to repair the rankings.")
+    if st.button("Rebuild Leaderboards", use_container_width=True):
+        with st.spinner("Rebuilding leaderboards from challenge documents..."):
+            rebuilt = rebuild_leaderboards()
+        st.success(f"Rebuilt leaderboards for {rebuilt} users.")
+    
+    st.markdown("---")
+    st.markdown("### Badges")
+    if st.button("Backfill Badges", use_container_width=True):
+        with st.spinner("Evaluating badge rules for every user..."):
+            backfill = backfill_badges()
+        st.success(f"Checked {backfill['users']} users, updated {backfill['updated']} in {backfill['commits']} batches ({backfill['retries']} retried after concurrent check-ins).")
+        st.dataframe(
+            pd.DataFrame([{'Badge': badge, 'Awarded': count} for badge, count in backfill['awards'].items()]),
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    st.markdown("---")
+    st.markdown("### Partner Feeds")
+    if st.button("Load Test Partner Feeds (synthetic graphs)", use_container_width=True):
+        with st.spinner("Simulating partner check-ins..."):
+            st.dataframe(pd.DataFrame(benchmark_partner_feeds()), use_container_width=True, hide_index=True)
+    
+    st.markdown("---")
+    st.markdown("### Check-in Storage Migration")
+    migration_doc = db.collection('migrations').document(CHECKIN_MIGRATION_ID).get()
+    migration = migration_doc.to_dict() if migration_doc.exists else None
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_size = st.number_input("Documents per batch", min_value=1, max_value=500, value=100)
+    with col2:
+        max_batches = st.number_input("Batches per run", min_value=1, max_value=1000, value=10)
+    
+    if st.button("Run Migration", use_container_width=True):
+        with st.spinner("Migrating challenge documents..."):
+            migration = migrate_challenge_documents(int(batch_size), int(max_batches))
+    
+    if migration:
+        migrated = max(1, migration['migrated'])
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Migrated", migration['migrated'], help=f"{migration['skipped']} already current")
+        with col2:
+            st.metric(
+                "Avg Document Size",
+                f"{migration['bytes_after'] / migrated / 1024:.1f} KB",
+                f"{(migration['bytes_after'] - migration['bytes_before']) / migrated / 1024:.1f} KB",
+                delta_color="inverse"
+            )
+        with col3:
+            st.metric(
+                "Avg Decode Time",
+                f"{migration['decode_ms_after'] / migrated:.2f} ms",
+                f"{(migration['decode_ms_after'] - migration['decode_ms_before']) / migrated:.2f} ms",
+                delta_color="inverse"
+            )
+        if migration['done']:
+            st.success("Migration complete.")
+        else:
+            st.info(f"Migration paused after document '{migration['cursor']}'. Run again to resume.")
@@ -0,0 +1,255 @@
+"""Analytics, check-in history, leaderboard and cohort pages"""
+import streamlit as st
+import time
+import pandas as pd
+import matplotlib.pyplot as plt
+from datetime import datetime, timedelta, date
+import os
+
+from core import (
+    LEADERBOARD_METRICS,
+    LEADERBOARD_PAGE_SIZE,
+    cohort_completion_by_stage,
+    cohort_distraction_by_field,
+    cohort_retention,
+    create_advanced_analytics,
+    expire_leaderboard_streaks,
+    export_user_checkins,
+    get_challenge_history,
+    get_history_page,
+    get_leaderboard_page,
+    get_leaderboard_rank,
+    get_snapshot_config,
+    get_snapshot_scheduler,
+    load_checkin_snapshot,
+    show_sidebar_content,
+    trace_span
+)
+
+# Analytics Page
+def analytics_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Advanced Analytics</h1>", unsafe_allow_html=True)
+    
+    if not st.session_state.user_profile:
+        st.error("Please complete your profile setup first.")
+        if st.button("Setup Profile", use_container_width=True):
+            st.session_state.page = "setup_profile"
+            st.rerun()
+        return
+    
+    challenge_data = st.session_state.challenge_data
+    
+    st.markdown("### Progress Overview")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Current Stage", st.session_state.user_profile.get('stage', 'Not set'))
+    with col2:
+        st.metric("Current Day", challenge_data.get('current_day', 1))
+    with col3:
+        st.metric("Streak Days", challenge_data.get('streak_days', 0))
+    with col4:
+        st.metric("Total Savings", f"${challenge_data.get('total_savings', 0)}")
+    
+    create_advanced_analytics(challenge_data, st.session_state.user_profile)
+    
+    badges = challenge_data.get('badges', [])
+    if badges:
+        st.markdown("---")
+        st.markdown("### Earned Badges")
+        for badge in badges:
+            st.success(f"**{badge}**")
+    
+    history = get_challenge_history(challenge_data)
+    if history:
+        checkin_export(history)
+
+@st.fragment
+def checkin_export(history):
+    """Format picker and export; changing them reruns only this fragment"""
+    st.markdown("---")
+    st.markdown("### Download My Data")
+    col1, col2 = st.columns(2)
+    with col1:
+        export_format = st.selectbox("Format", ["CSV", "Parquet"], key="export_format")
+    with col2:
+        st.write("")
+        prepare = st.button("Prepare Export", use_container_width=True)
+    if prepare:
+        username = st.session_state.user['username']
+        extension = "parquet" if export_format == "Parquet" else "csv"
+        st.download_button(
+            label=f"Download {export_format}",
+            data=export_user_checkins(username, history, export_format),
+            file_name=f"brain_app_checkins_{username}.{extension}",
+            mime="application/octet-stream" if export_format == "Parquet" else "text/csv",
+            use_container_width=True
+        )
+
+# Check-in History Page
+def history_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Check-in History</h1>", unsafe_allow_html=True)
+    
+    if not st.session_state.user_profile:
+        st.error("Please complete your profile setup first.")
+        if st.button("Setup Profile", use_container_width=True):
+            st.session_state.page = "setup_profile"
+            st.rerun()
+        return
+    
+    today = datetime.now().date()
+    start_date = st.session_state.challenge_data.get('start_date')
+    default_start = start_date.date() if hasattr(start_date, 'date') else today - timedelta(days=30)
+    date_range = st.date_input("Date range", value=(default_start, today), max_value=today)
+    if not isinstance(date_range, (list, tuple)) or len(date_range) != 2:
+        st.info("Select a start and end date.")
+        return
+    range_start, range_end = date_range
+    
+    range_key = (range_start, range_end)
+    if st.session_state.get('history_range') != range_key:
+        st.session_state.history_range = range_key
+        st.session_state.history_page_index = 0
+    page = st.session_state.history_page_index
+    
+    try:
+        rows, window_start, window_end, has_next = get_history_page(
+            st.session_state.user['username'], range_start, range_end, page
+        )
+    except Exception as e:
+        st.error("Could not load check-in history. Please try again.")
+        return
+    
+    st.caption(f"Showing {window_start.strftime('%b %d, %Y')} - {window_end.strftime('%b %d, %Y')}")
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    else:
+        st.info("No check-ins in this period.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if page > 0 and st.button("Newer", use_container_width=True):
+            st.session_state.history_page_index -= 1
+            st.rerun()
+    with col2:
+        if has_next and st.button("Older", use_container_width=True):
+            st.session_state.history_page_index += 1
+            st.rerun()
+
+# Leaderboard Page
+def leaderboard_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Leaderboard</h1>", unsafe_allow_html=True)
+    
+    metric = st.radio(
+        "Rank by",
+        list(LEADERBOARD_METRICS),
+        format_func=lambda key: LEADERBOARD_METRICS[key],
+        horizontal=True
+    )
+    if st.session_state.get('leaderboard_metric') != metric:
+        st.session_state.leaderboard_metric = metric
+        st.session_state.leaderboard_cursors = [None]
+    
+    try:
+        expire_leaderboard_streaks(date.today().toordinal())
+        user_value = st.session_state.challenge_data.get(metric, 0)
+        rank, total_users = get_leaderboard_rank(metric, user_value)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric(f"Your {LEADERBOARD_METRICS[metric]}", f"${user_value}" if metric == 'total_savings' else user_value)
+        with col2:
+            prefix = "~" if metric == 'total_savings' else ""
+            st.metric("Your Rank", f"{prefix}#{rank}" + (f" of {total_users}" if total_users else ""))
+        
+        cursors = st.session_state.leaderboard_cursors
+        page, next_cursor = get_leaderboard_page(metric, cursors[-1])
+        
+        if page:
+            first_rank = (len(cursors) - 1) * LEADERBOARD_PAGE_SIZE + 1
+            leaderboard_df = pd.DataFrame({
+                'Rank': range(first_rank, first_rank + len(page)),
+                'User': [entry['username'] for entry in page],
+                LEADERBOARD_METRICS[metric]: [entry['value'] for entry in page]
+            })
+            st.dataframe(leaderboard_df, use_container_width=True, hide_index=True)
+        else:
+            st.info("No entries yet. Complete a daily check-in to join the leaderboard!")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(cursors) > 1 and st.button("Previous Page", use_container_width=True):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            if next_cursor and st.button("Next Page", use_container_width=True):
+                cursors.append(next_cursor)
+                st.rerun()
+    except Exception as e:
+        st.error("Leaderboard is temporarily unavailable.")
+
+# Cohort Analytics Page
+def cohort_analytics_page():
+    if not st.session_state.user or st.session_state.user.get('role') != 'admin':
+        st.session_state.page = "life_vision"
+        st.rerun()
+        return
+    
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Cohort Analytics</h1>", unsafe_allow_html=True)
+    
+    config = get_snapshot_config()
+    scheduler = get_snapshot_scheduler()
+    
+    if st.button("Refresh Snapshot Now", use_container_width=True):
+        with st.spinner("Materializing check-in snapshot..."):
+            scheduler.refresh()
+    if scheduler.last_error:
+        st.error(f"Last snapshot refresh failed: {scheduler.last_error}")
+    
+    if not os.path.exists(config['path']):
+        st.info("The first snapshot is being built. Check back in a moment.")
+        return
+    
+    modified_time = os.path.getmtime(config['path'])
+    snapshot = load_checkin_snapshot(config['path'], modified_time)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Users", snapshot['username'].nunique())
+    with col2:
+        st.metric("Check-ins", len(snapshot))
+    with col3:
+        st.metric("Snapshot Age", f"{(time.time() - modified_time) / 60:.0f} min")
+    
+    if snapshot.empty:
+        st.info("No check-ins recorded yet.")
+        return
+    
+    st.markdown("### Completion Rates by Stage")
+    st.dataframe(cohort_completion_by_stage(snapshot), use_container_width=True, hide_index=True)
+    
+    st.markdown("### Distraction-Day Rates by Field")
+    st.dataframe(cohort_distraction_by_field(snapshot), use_container_width=True, hide_index=True)
+    
+    st.markdown("### Retention Curves")
+    retention = cohort_retention(snapshot)
+    with trace_span("matplotlib.render", chart="cohort_retention"):
+        fig, ax = plt.subplots(figsize=(10, 4))
+        for stage in retention.columns:
+            ax.plot(retention.index, retention[stage], linewidth=2, label=stage)
+        ax.set_xlabel('Days Since First Check-in')
+        ax.set_ylabel('Users Still Active (%)')
+        ax.set_title('Retention by Stage')
+        ax.set_ylim(0, 100)
+        ax.grid(True, alpha=0.3)
+        ax.legend()
+        st.pyplot(fig)
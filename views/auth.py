@@ -0,0 +1,297 @@
+"""Sign-in, sign-up and password reset pages"""
+import streamlit as st
+import time
+from datetime import datetime
+
+from core import (
+    check_password,
+    db,
+    generate_reset_token,
+    get_user_by_email,
+    hash_password,
+    mark_token_used,
+    send_password_reset_email,
+    set_persistent_login,
+    show_rate_limit_error,
+    store_reset_token,
+    take_rate_limit,
+    trace_span,
+    unit_of_work,
+    validate_password,
+    validate_reset_token
+)
+
+# Sign In Page
+def sign_in_page():
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>The Brain App</h1>", unsafe_allow_html=True)
+    st.markdown("<h3 style='text-align: center;'>Sign In to Your Account</h3>", unsafe_allow_html=True)
+    
+    with st.form("signin_form"):
+        username = st.text_input("Username", placeholder="Enter your username")
+        password = st.text_input("Password", type="password", placeholder="Enter your password")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            submitted = st.form_submit_button("Sign In", use_container_width=True)
+        with col2:
+            if st.form_submit_button("Forgot Password?", use_container_width=True):
+                st.session_state.page = "forgot_password"
+                st.rerun()
+        
+        if submitted:
+            if not username or not password:
+                st.error("Please enter both username and password")
+                return
+            
+            wait = take_rate_limit('signin', username)
+            if wait:
+                show_rate_limit_error('signin', wait)
+                return
+            
+            try:
+                with trace_span("firestore.get", collection="users"):
+                    user_doc = db.collection('users').document(username).get()
+                if user_doc.exists:
+                    user_data = user_doc.to_dict()
+                    if check_password(password, user_data['password']):
+                        st.session_state.user = {
+                            "username": username,
+                            "email": user_data.get("email", ""),
+                            "role": user_data.get("role", "student")
+                        }
+                        st.session_state.loaded_user_data = set()
+                        set_persistent_login(st.session_state.user)
+                        st.session_state.initialized = True
+                        
+                        st.success(f"Welcome back, {username}!")
+                        st.session_state.page = "life_vision"
+                        time.sleep(1)
+                        st.rerun()
+                    else:
+                        st.error("Invalid password")
+                else:
+                    st.error("Username not found")
+            except Exception as e:
+                st.error("Login failed. Please try again.")
+    
+    st.markdown("---")
+    st.markdown("Don't have an account?")
+    if st.button("Sign Up", use_container_width=True):
+        st.session_state.page = "signup"
+        st.rerun()
+
+# Sign Up Page
+def sign_up_page():
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Create Your Account</h1>", unsafe_allow_html=True)
+    
+    with st.form("signup_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            username = st.text_input("Username", placeholder="Choose a username")
+            email = st.text_input("Email Address", placeholder="Enter your email")
+        
+        with col2:
+            password = st.text_input("Password", type="password", placeholder="Create a password")
+            confirm_password = st.text_input("Confirm Password", type="password", placeholder="Confirm your password")
+        
+        if password:
+            is_valid, message = validate_password(password)
+            if not is_valid:
+                st.warning(f"Password requirements: {message}")
+        
+        agreed = st.checkbox("I agree to the Terms of Service and Privacy Policy")
+        
+        submitted = st.form_submit_button("Create Account", use_container_width=True)
+        
+        if submitted:
+            if not all([username, email, password, confirm_password]):
+                st.error("Please fill in all fields")
+                return
+            
+            if password != confirm_password:
+                st.error("Passwords do not match")
+                return
+            
+            if not agreed:
+                st.error("Please agree to the Terms of Service")
+                return
+            
+            with trace_span("firestore.get", collection="users"):
+                user_doc = db.collection('users').document(username).get()
+            if user_doc.exists:
+                st.error("Username already taken. Please choose another.")
+                return
+            
+            _, existing_user = get_user_by_email(email)
+            if existing_user:
+                st.error("Email already registered. Please use a different email or sign in.")
+                return
+            
+            try:
+                hashed_password = hash_password(password)
+                if not hashed_password:
+                    st.error("Error creating account. Please try again.")
+                    return
+                
+                user_data = {
+                    'username': username,
+                    'email': email,
+                    'password': hashed_password,
+                    'created_at': datetime.now()
+                }
+                
+                with trace_span("firestore.set", collection="users"):
+                    db.collection('users').document(username).set(user_data)
+                st.success("Account created successfully!")
+                st.info("You can now sign in with your credentials.")
+                time.sleep(2)
+                st.session_state.page = "signin"
+                st.rerun()
+                
+            except Exception as e:
+                st.error("Error creating account. Please try again.")
+    
+    st.markdown("---")
+    st.markdown("Already have an account?")
+    if st.button("Sign In", use_container_width=True):
+        st.session_state.page = "signin"
+        st.rerun()
+
+# Forgot Password Page
+def forgot_password_page():
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Reset Your Password</h1>", unsafe_allow_html=True)
+    
+    st.info("Enter your email address to receive a password reset token")
+    
+    with st.form("forgot_password_form"):
+        email = st.text_input("Email Address", placeholder="Enter your registered email")
+        submitted = st.form_submit_button("Generate Reset Token", use_container_width=True)
+        
+        if submitted:
+            if not email:
+                st.error("Please enter your email address")
+                return
+            
+            wait = take_rate_limit('password_reset', email)
+            if wait:
+                show_rate_limit_error('password_reset', wait)
+                return
+            
+            user_id, user_data = get_user_by_email(email)
+            if user_data:
+                reset_token = generate_reset_token()
+                
+                if store_reset_token(user_id, reset_token):
+                    success, message, token = send_password_reset_email(email, reset_token)
+                    
+                    if success:
+                        if message == "development":
+                            st.success("🔧 Development Mode - Email service not configured")
+                            st.info("**Your Reset Token (copy this):**")
+                            st.code(reset_token, language="text")
+                            st.info("👉 Use this token on the reset password page")
+                            
+                            st.session_state.reset_token = reset_token
+                            st.session_state.reset_username = user_id
+                            st.success("Auto-redirecting to reset page...")
+                            time.sleep(2)
+                            st.session_state.page = "reset_password"
+                            st.rerun()
+                        else:
+                            st.success("✅ Reset token sent to your email!")
+                    else:
+                        st.error(f"❌ {message}")
+                else:
+                    st.error("❌ Error generating reset token. Please try again.")
+            else:
+                st.error("❌ No account found with this email address")
+    
+    st.markdown("---")
+    st.markdown("### Already have a reset token?")
+    if st.button("Enter Reset Token Manually", use_container_width=True):
+        st.session_state.page = "reset_password"
+        st.rerun()
+    
+    st.markdown("---")
+    if st.button("Back to Sign In", use_container_width=True):
+        st.session_state.page = "signin"
+        st.rerun()
+
+# Reset Password Page
+def reset_password_page():
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Reset Your Password</h1>", unsafe_allow_html=True)
+    
+    if st.session_state.reset_username:
+        st.success(f"Reset authorized for user: {st.session_state.reset_username}")
+        
+        with st.form("reset_password_form"):
+            new_password = st.text_input("New Password", type="password", placeholder="Enter new password")
+            confirm_password = st.text_input("Confirm New Password", type="password", placeholder="Confirm new password")
+            
+            submitted = st.form_submit_button("Reset Password", use_container_width=True)
+            
+            if submitted:
+                if not new_password or not confirm_password:
+                    st.error("Please fill in all fields")
+                    return
+                
+                if new_password != confirm_password:
+                    st.error("Passwords do not match")
+                    return
+                
+                is_valid, message = validate_password(new_password)
+                if not is_valid:
+                    st.error(f"Password requirements: {message}")
+                    return
+                
+                try:
+                    hashed_password = hash_password(new_password)
+                    if not hashed_password:
+                        st.error("Error resetting password. Please try again.")
+                        return
+                    
+                    with unit_of_work("reset_password") as unit:
+                        unit.update(db.collection('users').document(st.session_state.reset_username), {
+                            'password': hashed_password,
+                            'updated_at': datetime.now()
+                        })
+                        if st.session_state.reset_token:
+                            mark_token_used(st.session_state.reset_token, unit)
+                    
+                    st.success("✅ Password reset successfully! You can now sign in with your new password.")
+                    time.sleep(3)
+                    
+                    st.session_state.reset_token = None
+                    st.session_state.reset_username = None
+                    st.session_state.page = "signin"
+                    st.rerun()
+                    
+                except Exception as e:
+                    st.error(f"Error resetting password: {str(e)}")
+    
+    else:
+        st.info("Please enter the reset token you received")
+        
+        with st.form("enter_token_form"):
+            reset_token = st.text_input("Reset Token", placeholder="Paste your reset token here")
+            
+            submitted = st.form_submit_button("Verify Token", use_container_width=True)
+            
+            if submitted:
+                if not reset_token:
+                    st.error("Please enter a reset token")
+                    return
+                
+                username = validate_reset_token(reset_token)
+                if username:
+                    st.session_state.reset_token = reset_token
+                    st.session_state.reset_username = username
+                    st.rerun()
+                else:
+                    st.error("❌ Invalid or expired reset token. Please request a new one.")
+    
+    st.markdown("---")
+    if st.button("Back to Sign In", use_container_width=True):
+        st.session_state.page = "signin"
+        st.rerun()
@@ -0,0 +1,55 @@
+"""Certificate page"""
+import streamlit as st
+
+from core import (
+    RateLimitExceeded,
+    certificate_inputs,
+    generate_certificate_limited,
+    get_prefetched,
+    show_rate_limit_error,
+    show_sidebar_content,
+    trace_span
+)
+
+# Certificate Page
+def certificate_page():
+    try:
+        if "user" not in st.session_state or st.session_state.user is None:
+            st.session_state.page = "signin"
+            st.rerun()
+            return
+        
+        show_sidebar_content()
+        
+        st.markdown("<h1 style='text-align: center; color: darkblue;'>Your Achievement Certificate</h1>", unsafe_allow_html=True)
+        
+        if st.button("Back to Dashboard", use_container_width=False):
+            st.session_state.page = "daily_challenge"
+            st.rerun()
+        
+        with st.spinner("Generating your certificate..."):
+            with trace_span("pdf.certificate"):
+                fingerprint, certificate_args = certificate_inputs(
+                    st.session_state.user['username'],
+                    st.session_state.user_profile,
+                    st.session_state.challenge_data
+                )
+                pdf_bytes = get_prefetched('certificate', fingerprint, generate_certificate_limited, *certificate_args)
+        
+        if pdf_bytes:
+            st.success("Your certificate is ready!")
+            
+            st.download_button(
+                label="Download PDF Certificate",
+                data=pdf_bytes,
+                file_name=f"brain_app_certificate_{st.session_state.user['username']}.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
+        else:
+            st.error("Failed to generate certificate. Please try again.")
+            
+    except RateLimitExceeded as e:
+        show_rate_limit_error(e.operation, e.wait)
+    except Exception as e:
+        st.error("Something went wrong with certificate generation.")
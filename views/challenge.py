@@ -0,0 +1,328 @@
+"""Life vision, challenge rules and daily check-in pages"""
+import streamlit as st
+from datetime import datetime
+
+from core import (
+    award_checkin_badges,
+    checkin_cohort_metrics,
+    fragment_rerun,
+    get_challenge_history,
+    get_distraction_trend,
+    get_stage_days,
+    get_stage_tasks,
+    publish_partner_activity,
+    record_cohort_metrics,
+    save_challenge_data,
+    show_sidebar_content,
+    streak_summary,
+    update_leaderboards
+)
+
+# Life Vision Page
+def life_vision_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>My Life Vision</h1>", unsafe_allow_html=True)
+    
+    if not st.session_state.user_profile:
+        st.info("Please complete your profile setup to access the full Life Vision features.")
+        if st.button("Setup Profile", use_container_width=True):
+            st.session_state.page = "setup_profile"
+            st.rerun()
+        return
+    
+    st.markdown("### My Vision Board")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("#### Current Status")
+        st.write(f"**Field:** {st.session_state.user_profile.get('field', 'Not set')}")
+        st.write(f"**Goal:** {st.session_state.user_profile.get('goal', 'Not set')}")
+        st.write(f"**Stage:** {st.session_state.user_profile.get('stage', 'Not set')}")
+        
+        if st.session_state.challenge_data:
+            distraction_trend = get_distraction_trend(st.session_state.challenge_data)
+            st.write(f"**Distraction Trend:** {distraction_trend}")
+            
+        if st.session_state.challenge_data:
+            st.write(f"**Current Day:** {st.session_state.challenge_data.get('current_day', 1)}")
+            st.write(f"**Streak:** {st.session_state.challenge_data.get('streak_days', 0)} days")
+            st.write(f"**Total Savings:** ${st.session_state.challenge_data.get('total_savings', 0)}")
+    
+    with col2:
+        st.markdown("#### Progress Visualization")
+        if st.session_state.challenge_data:
+            current_day = st.session_state.challenge_data.get('current_day', 1)
+            stage = st.session_state.user_profile.get('stage', 'Silver (15 Days - Easy)')
+            total_days = get_stage_days(stage)
+            
+            progress = min(current_day / total_days, 1.0) * 100
+            st.progress(progress/100, text=f"Stage Progress: {current_day}/{total_days} days ({progress:.1f}%)")
+            
+            if progress < 25:
+                st.info("Getting started! Every great journey begins with a single step.")
+            elif progress < 50:
+                st.info("Making progress! Keep building momentum.")
+            elif progress < 75:
+                st.info("Halfway there! You are doing amazing.")
+            else:
+                st.info("Almost there! Finish strong!")
+    
+    st.markdown("---")
+    st.markdown("### Daily Motivation")
+    
+    motivational_quotes = [
+        "The only way to do great work is to love what you do. - Steve Jobs",
+        "Success is not final, failure is not fatal: it is the courage to continue that counts. - Winston Churchill",
+        "The future depends on what you do today. - Mahatma Gandhi",
+        "Do not watch the clock; do what it does. Keep going. - Sam Levenson",
+        "The harder you work for something, the greater you will feel when you achieve it.",
+    ]
+    
+    import random
+    daily_quote = random.choice(motivational_quotes)
+    st.success(f"**Today's Motivation:** {daily_quote}")
+    
+    st.markdown("---")
+    st.markdown("### Quick Actions")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        if st.button("Start Today's Challenge", use_container_width=True):
+            st.session_state.page = "daily_challenge"
+            st.rerun()
+    
+    with col2:
+        if st.button("View Analytics", use_container_width=True):
+            st.session_state.page = "analytics"
+            st.rerun()
+    
+    with col3:
+        if st.button("Edit Profile", use_container_width=True):
+            st.session_state.page = "edit_profile"
+            st.rerun()
+
+# Challenge Rules Page
+def challenge_rules_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Challenge Rules & Guidelines</h1>", unsafe_allow_html=True)
+    
+    st.markdown("""
+    ## The Brain App Challenge System
+    
+    ### Challenge Stages
+    """)
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown("""
+        ### Silver Stage
+        **Duration:** 15 Days (Easy)
+        
+        **Daily Tasks:**
+        - 2 hours of focused work
+        - No distractions
+        - Fill daily routine form
+        """)
+    
+    with col2:
+        st.markdown("""
+        ### Platinum Stage  
+        **Duration:** 30 Days (Medium)
+        
+        **Daily Tasks:**
+        - 4 hours of focused work
+        - No distractions
+        - 30 pushups exercise
+        - Drink 5L water
+        - Avoid junk food
+        - Fill daily form
+        """)
+    
+    with col3:
+        st.markdown("""
+        ### Gold Stage
+        **Duration:** 60 Days (Hard)
+        
+        **Daily Tasks:**
+        - 6 hours of focused work
+        - No distractions
+        - 50 pushups exercise
+        - Drink 5L water
+        - Avoid junk food & sugar
+        - Wake up before 7 AM
+        - Sleep before 11 PM
+        - Fill daily form
+        """)
+    
+    st.markdown("---")
+    
+    st.markdown("""
+    ## Challenge Rules
+    
+    ### Task Completion Rules:
+    1. **Perfect Day (All tasks completed):**
+       - Day counts toward progress
+       - Streak increases by 1
+       - Savings added to total
+    
+    2. **Miss 1 Task:**
+       - **With Penalty Payment:** Day counts but streak does not increase
+       - **Without Penalty:** Day does not count toward progress
+    
+    3. **Miss 2+ Tasks:**
+       - Day does not count (even with penalty)
+       - No progress made
+    """)
+    
+    if st.button("Back to Dashboard", use_container_width=True):
+        st.session_state.page = "life_vision"
+        st.rerun()
+
+# Daily Challenge Page
+def daily_challenge_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Daily Challenge</h1>", unsafe_allow_html=True)
+    
+    # Set by the check-in that just reran the page
+    for badge in st.session_state.pop('earned_badges', []):
+        st.success(f"Badge earned: {badge}!")
+    
+    if not st.session_state.user_profile:
+        st.error("Please complete your profile setup first.")
+        if st.button("Setup Profile", use_container_width=True):
+            st.session_state.page = "setup_profile"
+            st.rerun()
+        return
+    
+    challenge_data = st.session_state.challenge_data
+    current_stage = st.session_state.user_profile.get('stage', 'Silver (15 Days - Easy)')
+    current_day = challenge_data.get('current_day', 1)
+    total_days = get_stage_days(current_stage)
+    
+    st.markdown(f"### {current_stage} - Day {current_day}/{total_days}")
+    
+    progress = min(current_day / total_days, 1.0) * 100
+    st.progress(progress/100, text=f"Stage Progress: {progress:.1f}%")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Current Streak", f"{challenge_data.get('streak_days', 0)} days")
+    with col2:
+        st.metric("Completed Days", challenge_data.get('completed_days', 0))
+    with col3:
+        st.metric("Total Savings", f"${challenge_data.get('total_savings', 0)}")
+    
+    st.markdown("---")
+    
+    today = datetime.now().strftime("%Y-%m-%d")
+    if today in get_challenge_history(challenge_data):
+        st.success("You have already completed today's check-in! Great job!")
+        st.info("Come back tomorrow for your next challenge.")
+        return
+    
+    daily_checklist(current_stage, today)
+
+@st.fragment
+def daily_checklist(current_stage, today):
+    """Today's tasks and penalty/savings; ticking a task reruns only this fragment"""
+    with fragment_rerun():
+        st.markdown("### Today's Tasks")
+        tasks = get_stage_tasks(current_stage)
+    
+        completed_tasks = []
+        for task in tasks:
+            if st.checkbox(task, key=f"task_{task}"):
+                completed_tasks.append(task)
+    
+        st.markdown("---")
+        st.markdown("### Penalty & Savings")
+    
+        missed_tasks = len(tasks) - len(completed_tasks)
+        if missed_tasks == 1:
+            savings_amount = st.number_input("Penalty Amount", min_value=0.0, value=5.0, step=1.0)
+        else:
+            savings_amount = st.number_input("Savings to Add", min_value=0.0, value=10.0, step=1.0)
+    
+        if st.button("Submit Daily Check-in", use_container_width=True, type="primary"):
+            process_daily_submission(completed_tasks, savings_amount, today, tasks)
+
+def process_daily_submission(completed_tasks, savings_amount, today, tasks):
+    try:
+        user = st.session_state.user
+        challenge_data = st.session_state.challenge_data
+        stage = st.session_state.user_profile.get('stage', 'Silver (15 Days - Easy)')
+        
+        missed_tasks = len(tasks) - len(completed_tasks)
+        
+        if missed_tasks == 0:
+            challenge_data['completed_days'] += 1
+            challenge_data['current_day'] += 1
+            challenge_data['total_savings'] += savings_amount
+            
+            history = get_challenge_history(challenge_data)
+            history[today] = {
+                'tasks_completed': completed_tasks,
+                'missed_tasks': 0,
+                'savings_added': savings_amount,
+                'perfect_day': True
+            }
+            challenge_data['streak_days'] = streak_summary(history)['current_streak']
+            earned_badges = award_checkin_badges(challenge_data, history, today, completed_tasks, True, stage)
+            
+            save_challenge_data(user['username'], challenge_data)
+            st.session_state.challenge_data = challenge_data
+            st.session_state.form_submitted = True
+            record_cohort_metrics(
+                checkin_cohort_metrics(completed_tasks, tasks, savings_amount),
+                st.session_state.user_profile.get('field')
+            )
+            update_leaderboards(user['username'], challenge_data)
+            publish_partner_activity(user['username'], today, True, challenge_data['streak_days'], earned_badges)
+            
+            st.success("Perfect day! All tasks completed!")
+            st.session_state.earned_badges = earned_badges
+            
+        elif missed_tasks == 1:
+            if savings_amount > 0:
+                challenge_data['completed_days'] += 1
+                challenge_data['current_day'] += 1
+                challenge_data['total_savings'] += savings_amount
+                
+                history = get_challenge_history(challenge_data)
+                history[today] = {
+                    'tasks_completed': completed_tasks,
+                    'missed_tasks': 1,
+                    'savings_added': savings_amount,
+                    'perfect_day': False,
+                    'penalty_paid': True
+                }
+                challenge_data['streak_days'] = streak_summary(history)['current_streak']
+                earned_badges = award_checkin_badges(challenge_data, history, today, completed_tasks, False, stage)
+                
+                save_challenge_data(user['username'], challenge_data)
+                st.session_state.challenge_data = challenge_data
+                st.session_state.form_submitted = True
+                record_cohort_metrics(
+                    checkin_cohort_metrics(completed_tasks, tasks, savings_amount),
+                    st.session_state.user_profile.get('field')
+                )
+                update_leaderboards(user['username'], challenge_data)
+                publish_partner_activity(user['username'], today, False, challenge_data['streak_days'], earned_badges)
+                
+                st.warning(f"You missed 1 task but paid ${savings_amount} penalty. Day counted.")
+                st.session_state.earned_badges = earned_badges
+                
+            else:
+                st.error("You missed 1 task but did not pay penalty. This day does not count.")
+        else:
+            st.error(f"You missed {missed_tasks} tasks. This day does not count.")
+        
+        st.rerun()
+    except Exception as e:
+        st.error("Error processing submission. Please try again.")
@@ -0,0 +1,98 @@
+"""Accountability partners and their activity feed"""
+import streamlit as st
+from datetime import date
+
+from core import (
+    change_partner_link,
+    decline_partner_invite,
+    get_partner_config,
+    invite_partner,
+    load_partner_feed,
+    partner_activity_lines,
+    show_sidebar_content
+)
+
+PARTNER_INVITE_MESSAGES = {
+    'invalid': ("error", "Enter another user's username."),
+    'unknown': ("error", "No user with that username."),
+    'already': ("info", "You are already partners."),
+    'invited': ("success", "Invite sent! You will be linked once they accept."),
+    'linked': ("success", "They had already invited you, so you are now partners!"),
+    'full': ("error", "One of you already has the maximum number of partners.")
+}
+
+# Partners Page
+def partners_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Accountability Partners</h1>", unsafe_allow_html=True)
+    
+    username = st.session_state.user['username']
+    config = get_partner_config()
+    try:
+        partner_feed = load_partner_feed(username)
+    except Exception as e:
+        st.error("Partners are temporarily unavailable.")
+        return
+    
+    with st.form("invite_partner_form", clear_on_submit=True):
+        other = st.text_input("Partner username", placeholder="Who keeps you accountable?")
+        if st.form_submit_button("Send Invite", use_container_width=True):
+            try:
+                level, message = PARTNER_INVITE_MESSAGES[invite_partner(username, other)]
+                getattr(st, level)(message)
+            except Exception as e:
+                st.error("Could not send the invite. Please try again.")
+    
+    if partner_feed['invites']:
+        st.markdown("### Invites")
+        for other in partner_feed['invites']:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                st.write(f"**{other}** wants to be your partner")
+            with col2:
+                if st.button("Accept", key=f"accept_{other}", use_container_width=True):
+                    if change_partner_link(username, other, True) == 'linked':
+                        st.rerun()
+                    st.error(PARTNER_INVITE_MESSAGES['full'][1])
+            with col3:
+                if st.button("Decline", key=f"decline_{other}", use_container_width=True):
+                    decline_partner_invite(username, other)
+                    st.rerun()
+    
+    st.markdown("---")
+    st.markdown(f"### My Partners ({len(partner_feed['partners'])}/{config['max_partners']})")
+    if not partner_feed['partners']:
+        st.info("Invite a friend to see each other's check-ins, streaks and badges.")
+    for other in partner_feed['partners']:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.write(f"**{other}**")
+        with col2:
+            if st.button("Remove", key=f"remove_{other}", use_container_width=True):
+                change_partner_link(username, other, False)
+                st.rerun()
+    
+    st.markdown("---")
+    st.markdown("### Partner Activity")
+    feed = partner_feed['feed']
+    if not feed:
+        st.info(f"No partner check-ins in the last {config['feed_days']} days.")
+        return
+    
+    page_count = (len(feed) - 1) // config['page_size'] + 1
+    page = min(st.session_state.get('partner_feed_page', 0), page_count - 1)
+    for item in feed[page * config['page_size']:(page + 1) * config['page_size']]:
+        day = date.fromordinal(item['o']).strftime('%b %d')
+        for line in partner_activity_lines(item):
+            st.markdown(f"{day} · {line}")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if page > 0 and st.button("Newer", use_container_width=True):
+            st.session_state.partner_feed_page = page - 1
+            st.rerun()
+    with col2:
+        if page + 1 < page_count and st.button("Older", use_container_width=True):
+            st.session_state.partner_feed_page = page + 1
+            st.rerun()
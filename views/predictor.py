@@ -0,0 +1,229 @@
+"""Performance predictor page"""
+import streamlit as st
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from core import (
+    WHAT_IF_HABITS,
+    calculate_feature_percentiles,
+    create_contribution_waterfall,
+    explain_prediction,
+    log_prediction,
+    predict_performance,
+    record_cohort_metrics,
+    score_cohort_rank,
+    show_prediction_trend,
+    show_rate_limit_error,
+    show_sidebar_content,
+    take_rate_limit,
+    trace_span,
+    what_if_search
+)
+
+# ML Dashboard Page
+def ml_dashboard_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Performance Predictor</h1>", unsafe_allow_html=True)
+    st.markdown("### Predict your performance based on your daily habits")
+    
+    with st.form("prediction_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            hours = st.slider("Study Hours", 0, 12, 4)
+            distraction_count = st.slider("Distractions Count", 0, 20, 5)
+            
+            st.markdown("#### Distraction Types")
+            social_media = st.checkbox("Social Media", value=False)
+            phone_calls = st.checkbox("Phone Calls", value=False)
+            entertainment = st.checkbox("Entertainment", value=False)
+            people_interruptions = st.checkbox("People Interruptions", value=False)
+            other_distractions = st.checkbox("Other Distractions", value=False)
+        
+        with col2:
+            st.markdown("#### Daily Habits")
+            avoid_sugar = st.checkbox("Avoided Sugar", value=True)
+            avoid_junk_food = st.checkbox("Avoided Junk Food", value=True)
+            drink_5L_water = st.checkbox("Drank 5L Water", value=False)
+            sleep_early = st.checkbox("Slept Before 11 PM", value=False)
+            exercise_daily = st.checkbox("Daily Exercise", value=False)
+            wakeup_early = st.checkbox("Woke Up Before 7 AM", value=False)
+        
+        submitted = st.form_submit_button("Predict My Performance", use_container_width=True)
+        
+        if submitted:
+            habit_inputs = {
+                'avoid_sugar': 1 if avoid_sugar else 0,
+                'avoid_junk_food': 1 if avoid_junk_food else 0,
+                'drink_5L_water': 1 if drink_5L_water else 0,
+                'sleep_early': 1 if sleep_early else 0,
+                'exercise_daily': 1 if exercise_daily else 0,
+                'wakeup_early': 1 if wakeup_early else 0
+            }
+            
+            distraction_types = []
+            if social_media:
+                distraction_types.append("Social Media")
+            if phone_calls:
+                distraction_types.append("Phone Calls")
+            if entertainment:
+                distraction_types.append("Entertainment")
+            if people_interruptions:
+                distraction_types.append("People Interruptions")
+            if other_distractions:
+                distraction_types.append("Other")
+            
+            wait = take_rate_limit('predict', st.session_state.user['username'])
+            if wait:
+                show_rate_limit_error('predict', wait)
+            else:
+                field = st.session_state.user_profile.get('field')
+                prediction = predict_performance(hours, distraction_count, habit_inputs)
+                percentiles = calculate_feature_percentiles(hours, distraction_count, habit_inputs, field)
+                cohort_rank = score_cohort_rank(float(prediction), field)
+                record_cohort_metrics({
+                    'hours': hours,
+                    'distraction_count': distraction_count,
+                    'score': float(prediction),
+                    **habit_inputs
+                }, field)
+                
+                st.session_state.prediction_results = {
+                    'score': prediction,
+                    'percentiles': percentiles,
+                    'cohort_rank': cohort_rank,
+                    'hours': hours,
+                    'distractions': distraction_count,
+                    'distraction_types': distraction_types,
+                    'habits': habit_inputs
+                }
+                log_prediction(st.session_state.user['username'], st.session_state.prediction_results, field)
+                st.session_state.prediction_trend_cursors = [None]
+    
+    if st.session_state.prediction_results:
+        results = st.session_state.prediction_results
+        
+        st.markdown("---")
+        st.markdown("### Prediction Results")
+        
+        col1, col2, col3 = st.columns([1,2,1])
+        with col2:
+            score = results['score']
+            if score <= 20:
+                color = "green"
+                status = "Elite Performer"
+                interpretation = f"You're in the top {score}% of users! Excellent!"
+            elif score <= 40:
+                color = "blue"
+                status = "Great Performer"
+                interpretation = f"You're in the top {score}% - Great job!"
+            elif score <= 60:
+                color = "orange"
+                status = "Good Performer"
+                interpretation = f"You're in the top {score}% - Good work!"
+            else:
+                color = "red"
+                status = "Needs Improvement"
+                interpretation = f"You're in the top {score}% - Room to grow"
+            
+            st.markdown(f"<h1 style='text-align: center; color: {color};'>Performance Score: {score:.1f}%</h1>", unsafe_allow_html=True)
+            st.markdown(f"<h3 style='text-align: center; color: {color};'>{status}</h3>", unsafe_allow_html=True)
+            st.markdown(f"<p style='text-align: center;'>{interpretation}</p>", unsafe_allow_html=True)
+            if results.get('cohort_rank') is not None:
+                st.markdown(
+                    f"<p style='text-align: center;'>Better than {results['cohort_rank']:.0f}% of predictions in the live cohort</p>",
+                    unsafe_allow_html=True
+                )
+        
+        if results['distraction_types']:
+            st.markdown("#### Your Distractions Today")
+            for distraction in results['distraction_types']:
+                st.write(f"- {distraction}")
+        
+        st.markdown("#### Feature Analysis - Percentile Ranking")
+        features_df = pd.DataFrame(list(results['percentiles'].items()), columns=['Feature', 'Percentile'])
+        
+        with trace_span("matplotlib.render", chart="feature_percentiles"):
+            fig, ax = plt.subplots(figsize=(12, 6))
+            features = features_df['Feature']
+            percentiles = features_df['Percentile']
+        
+            bars = ax.bar(features, percentiles, color='navy', alpha=0.7)
+            ax.set_ylabel('Percentile Score (%)')
+            ax.set_title('Feature Performance (Lower % = Better Ranking)')
+            ax.set_ylim(0, 100)
+        
+            for bar, value in zip(bars, percentiles):
+                ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 1,
+                       f'{value:.0f}%', ha='center', va='bottom')
+        
+            plt.xticks(rotation=45)
+            plt.tight_layout()
+            st.pyplot(fig)
+        
+        explanation = explain_prediction(
+            results['hours'],
+            results['distractions'],
+            tuple(results['habits'][habit] for habit in WHAT_IF_HABITS)
+        )
+        if explanation is not None:
+            st.markdown("#### Feature Contributions to Your Score")
+            create_contribution_waterfall(explanation)
+        
+        st.markdown("#### Detailed Feature Breakdown")
+        for _, row in features_df.iterrows():
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                st.write(f"{row['Feature']}:")
+            with col2:
+                percentile = row['Percentile']
+                progress_value = max(0, 100 - percentile) / 100
+                st.progress(progress_value, text=f"Top {percentile:.0f}%")
+        
+        st.markdown("#### Recommendations")
+        excellent_features = [f for f, p in results['percentiles'].items() if p <= 20]
+        good_features = [f for f, p in results['percentiles'].items() if p <= 40]
+        needs_work_features = [f for f, p in results['percentiles'].items() if p > 60]
+        
+        if excellent_features:
+            st.success("**Your Strengths (Elite Level):**")
+            for feature in excellent_features:
+                percentile = results['percentiles'][feature]
+                st.write(f"- {feature} (Top {percentile:.0f}%)")
+        
+        if good_features:
+            st.info("**Good Performance:**")
+            for feature in good_features:
+                if feature not in excellent_features:
+                    percentile = results['percentiles'][feature]
+                    st.write(f"- {feature} (Top {percentile:.0f}%)")
+        
+        if needs_work_features:
+            st.warning("**Areas for Improvement:**")
+            for feature in needs_work_features:
+                percentile = results['percentiles'][feature]
+                st.write(f"- {feature} (Top {percentile:.0f}%)")
+        
+        what_if = what_if_search(
+            results['hours'],
+            results['distractions'],
+            tuple(results['habits'][habit] for habit in WHAT_IF_HABITS)
+        )
+        if what_if is not None:
+            st.markdown("#### What-If: Changes That Improve Your Score")
+            st.caption(f"Compared {what_if['candidates']:,} nearby combinations of habits, study hours and distractions.")
+            if what_if['single_changes'].empty and what_if['frontier'].empty:
+                st.success("No nearby change is predicted to improve your score. Keep it up!")
+            else:
+                st.markdown("**Best single changes**")
+                st.dataframe(what_if['single_changes'], use_container_width=True, hide_index=True)
+                st.markdown("**Cheapest way to each bigger gain**")
+                st.dataframe(what_if['frontier'], use_container_width=True, hide_index=True)
+        
+        if st.button("Make Another Prediction", use_container_width=True):
+            st.session_state.prediction_results = None
+            st.rerun()
+    
+    st.markdown("---")
+    show_prediction_trend(st.session_state.user['username'])
@@ -0,0 +1,231 @@
+"""Profile setup and editing pages"""
+import streamlit as st
+import time
+from datetime import datetime
+
+from core import (
+    db,
+    note_local_write,
+    save_challenge_data,
+    show_sidebar_content,
+    unit_of_work,
+    update_leaderboards
+)
+
+# Setup Profile Page
+def setup_profile_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Setup Your Profile</h1>", unsafe_allow_html=True)
+    
+    with st.form("profile_setup"):
+        st.markdown("### Tell Us About Yourself")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            field = st.selectbox(
+                "Your Field/Interest",
+                [
+                    "Student - Computer Science", 
+                    "Student - Engineering",
+                    "Student - Medicine", 
+                    "Student - Business",
+                    "Student - Arts & Humanities",
+                    "Software Developer",
+                    "Data Scientist",
+                    "Web Developer",
+                    "Mobile App Developer",
+                    "AI/ML Engineer",
+                    "Entrepreneur",
+                    "Researcher",
+                    "Teacher/Educator",
+                    "Digital Marketer",
+                    "Content Creator",
+                    "Other"
+                ]
+            )
+        with col2:
+            goal = st.text_input("I want to become...", placeholder="e.g., a successful entrepreneur")
+        
+        st.markdown("### Choose Your Challenge Stage")
+        stage = st.selectbox(
+            "Challenge Difficulty",
+            ["Silver (15 Days - Easy)", "Platinum (30 Days - Medium)", "Gold (60 Days - Hard)"]
+        )
+        
+        submitted = st.form_submit_button("Save Profile & Start Challenge", use_container_width=True)
+        
+        if submitted:
+            if not goal:
+                st.error("Please tell us what you want to become!")
+                return
+            
+            profile_data = {
+                'field': field,
+                'goal': goal,
+                'stage': stage,
+                'created_at': datetime.now()
+            }
+            
+            try:
+                challenge_data = {
+                    'current_stage': stage,
+                    'start_date': datetime.now(),
+                    'current_day': 1,
+                    'streak_days': 0,
+                    'total_savings': 0,
+                    'completed_days': 0,
+                    'penalty_history': [],
+                    'daily_checkins': {},
+                    'badges': []
+                }
+                note_local_write('user_profiles', st.session_state.user['username'])
+                with unit_of_work("setup_profile") as unit:
+                    unit.set(db.collection('user_profiles').document(st.session_state.user['username']), profile_data)
+                    save_challenge_data(st.session_state.user['username'], challenge_data, unit)
+                st.session_state.user_profile = profile_data
+                st.session_state.challenge_data = challenge_data
+                update_leaderboards(st.session_state.user['username'], challenge_data)
+                
+                st.success("Profile setup complete! Welcome to The Brain App Challenge!")
+                time.sleep(2)
+                st.session_state.page = "life_vision"
+                st.rerun()
+                
+            except Exception as e:
+                st.error("Error saving profile. Please try again.")
+
+# Edit Profile Page
+def edit_profile_page():
+    show_sidebar_content()
+    
+    st.markdown("<h1 style='text-align: center; color: darkblue;'>Edit Your Profile</h1>", unsafe_allow_html=True)
+    
+    if not st.session_state.user_profile:
+        st.error("No profile found. Please setup your profile first.")
+        if st.button("Setup Profile", use_container_width=True):
+            st.session_state.page = "setup_profile"
+            st.rerun()
+        return
+    
+    with st.form("edit_profile"):
+        st.markdown("### Update Your Information")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            current_field = st.session_state.user_profile.get('field', 'Student - Computer Science')
+            field_options = [
+                "Student - Computer Science", 
+                "Student - Engineering",
+                "Student - Medicine", 
+                "Student - Business",
+                "Student - Arts & Humanities",
+                "Software Developer",
+                "Data Scientist",
+                "Web Developer",
+                "Mobile App Developer",
+                "AI/ML Engineer",
+                "Entrepreneur",
+                "Researcher",
+                "Teacher/Educator",
+                "Digital Marketer",
+                "Content Creator",
+                "Other"
+            ]
+            
+            field_index = field_options.index(current_field) if current_field in field_options else 0
+            field = st.selectbox("Your Field/Interest", field_options, index=field_index)
+            
+        with col2:
+            goal = st.text_input("I want to become...", value=st.session_state.user_profile.get('goal', ''))
+        
+        current_stage = st.session_state.user_profile.get('stage', 'Silver (15 Days - Easy)')
+        stage_options = ["Silver (15 Days - Easy)", "Platinum (30 Days - Medium)", "Gold (60 Days - Hard)"]
+        stage_index = stage_options.index(current_stage) if current_stage in stage_options else 0
+        
+        stage = st.selectbox("Challenge Difficulty", stage_options, index=stage_index)
+        
+        st.markdown("### Common Distractions")
+        st.markdown("Select the types of distractions you commonly face:")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            distraction_social_media = st.checkbox("Social Media", value=False)
+            distraction_phone = st.checkbox("Phone/Notifications", value=False)
+            distraction_entertainment = st.checkbox("Entertainment (TV/Games)", value=False)
+            distraction_people = st.checkbox("People Interruptions", value=False)
+            distraction_noise = st.checkbox("Environmental Noise", value=False)
+        
+        with col2:
+            distraction_procrastination = st.checkbox("Procrastination", value=False)
+            distraction_multitasking = st.checkbox("Multitasking", value=False)
+            distraction_mental = st.checkbox("Mental Fatigue", value=False)
+            distraction_physical = st.checkbox("Physical Discomfort", value=False)
+            distraction_other = st.checkbox("Other Distractions", value=False)
+        
+        submitted = st.form_submit_button("Update Profile", use_container_width=True)
+        
+        if submitted:
+            if not goal:
+                st.error("Please tell us what you want to become!")
+                return
+            
+            user_distractions = []
+            if distraction_social_media:
+                user_distractions.append("Social Media")
+            if distraction_phone:
+                user_distractions.append("Phone/Notifications")
+            if distraction_entertainment:
+                user_distractions.append("Entertainment")
+            if distraction_people:
+                user_distractions.append("People Interruptions")
+            if distraction_noise:
+                user_distractions.append("Environmental Noise")
+            if distraction_procrastination:
+                user_distractions.append("Procrastination")
+            if distraction_multitasking:
+                user_distractions.append("Multitasking")
+            if distraction_mental:
+                user_distractions.append("Mental Fatigue")
+            if distraction_physical:
+                user_distractions.append("Physical Discomfort")
+            if distraction_other:
+                user_distractions.append("Other")
+            
+            profile_data = {
+                'field': field,
+                'goal': goal,
+                'stage': stage,
+                'common_distractions': user_distractions,
+                'updated_at': datetime.now()
+            }
+            
+            try:
+                username = st.session_state.user['username']
+                note_local_write('user_profiles', username)
+                with unit_of_work("edit_profile") as unit:
+                    unit.update(db.collection('user_profiles').document(username), profile_data)
+                    if stage != current_stage:
+                        # Badge rules, imports and the certificate read the stage from the challenge document
+                        note_local_write('challenge_progress', username)
+                        unit.update(db.collection('challenge_progress').document(username), {'current_stage': stage})
+                st.session_state.user_profile.update(profile_data)
+                if stage != current_stage and st.session_state.challenge_data:
+                    st.session_state.challenge_data['current_stage'] = stage
+                st.success("Profile updated successfully!")
+                
+                if user_distractions:
+                    st.info(f"**Your common distractions:** {', '.join(user_distractions)}")
+                    if len(user_distractions) >= 3:
+                        st.warning("You have multiple distraction sources. Consider focusing on one at a time for improvement.")
+                    else:
+                        st.success("Good job identifying your distraction sources! Awareness is the first step to improvement.")
+                
+                time.sleep(2)
+                st.session_state.page = "life_vision"
+                st.rerun()
+                
+            except Exception as e:
+                st.error("Error updating profile. Please try again.")